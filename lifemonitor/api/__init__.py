@@ -22,8 +22,8 @@ import logging
 import pathlib
 import re
 
-import connexion
 from lifemonitor.api import models
+from lifemonitor.serializers import Api
 
 from .serializers import ma
 
@@ -45,9 +45,9 @@ def register_testing_services_credentials(conf):
 
 
 def register_api(app, specs_dir):
-    api = connexion.Api(pathlib.Path(specs_dir, 'api.yaml'),
-                        validate_responses=True,
-                        arguments={'global': 'global_value'})
+    api = Api(pathlib.Path(specs_dir, 'api.yaml'),
+              validate_responses=True,
+              arguments={'global': 'global_value'})
     app.register_blueprint(api.blueprint)
     ma.init_app(app)
     register_testing_services_credentials(app.config)
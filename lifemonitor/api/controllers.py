@@ -19,16 +19,20 @@
 # SOFTWARE.
 
 import logging
+from urllib.parse import urlencode
 
 import connexion
 import lifemonitor.exceptions as lm_exceptions
 import werkzeug.exceptions as http_exceptions
-from flask import Response, g
+from flask import Response, current_app, g
+from lifemonitor import utils as lm_utils
 from lifemonitor.api import serializers
+from lifemonitor.api.models import LoadingProfile
 from lifemonitor.api.services import LifeMonitor
 from lifemonitor.auth import authorized, current_registry, current_user
 from lifemonitor.auth.oauth2.client.models import \
     OAuthIdentityNotFoundException
+from lifemonitor.db import read_only
 from lifemonitor.lang import messages
 
 # Initialize a reference to the LifeMonitor instance
@@ -46,25 +50,28 @@ def _row_to_dict(row):
 
 
 # @authorized
+@read_only
 def workflow_registries_get():
     registries = lm.get_workflow_registries()
     logger.debug("registries_get. Got %s registries", len(registries))
-    return serializers.WorkflowRegistrySchema().dump(registries, many=True)
+    return serializers.WorkflowRegistrySchema.get_instance().dump(registries, many=True)
 
 
 # @authorized
+@read_only
 def workflow_registries_get_by_uuid(registry_uuid):
     registry = lm.get_workflow_registry_by_uuid(registry_uuid)
     logger.debug("registries_get. Got %s registry", registry)
-    return serializers.WorkflowRegistrySchema().dump(registry)
+    return serializers.WorkflowRegistrySchema.get_instance().dump(registry)
 
 
 @authorized
+@read_only
 def workflow_registries_get_current():
     if current_registry:
         registry = current_registry
         logger.debug("registries_get. Got %s registry", registry)
-        return serializers.WorkflowRegistrySchema().dump(registry)
+        return serializers.WorkflowRegistrySchema.get_instance().dump(registry)
     return lm_exceptions.report_problem(401, "Unauthorized")
 
 
@@ -134,6 +141,80 @@ def workflows_post(body):
         raise lm_exceptions.LifeMonitorException(title="Internal Error", detail=str(e))
 
 
+def _batch_item_problem(index, e: Exception, registry=None):
+    if isinstance(e, (KeyError, ValueError)):
+        status, title, detail = 400, "Bad Request", messages.input_data_missing
+    elif isinstance(e, lm_exceptions.NotValidROCrateException):
+        status, title, detail = 400, "Bad Request", messages.invalid_ro_crate
+    elif isinstance(e, OAuthIdentityNotFoundException):
+        status, title, detail = 401, "Unauthorized", str(e)
+    elif isinstance(e, lm_exceptions.NotAuthorizedException):
+        status, title = 403, "Forbidden"
+        detail = messages.not_authorized_registry_access.format(registry.name) \
+            if registry else messages.not_authorized_workflow_access
+    elif isinstance(e, lm_exceptions.WorkflowVersionConflictException):
+        status, title, detail = 409, "Workflow version conflict", e.detail
+    else:
+        status, title, detail = 500, "Internal Error", str(e)
+    return {'index': index, 'status': status, 'title': title, 'detail': detail,
+            'extra_info': {"exception": str(e)}}
+
+
+@authorized
+def workflows_post_batch(body):
+    max_items = int(current_app.config.get("WORKFLOW_BATCH_MAX_ITEMS", 100))
+    if len(body['items']) > max_items:
+        return lm_exceptions.report_problem(413, "Payload Too Large",
+                                            detail=messages.too_many_batch_items.format(max_items))
+    registry = current_registry._get_current_object()
+    if registry and 'registry' in body:
+        return lm_exceptions.report_problem(400, "Bad request",
+                                            detail=messages.unexpected_registry_uri)
+    if not registry and 'registry' in body:
+        registry_ref = body.get('registry', None)
+        try:
+            registry = lm.get_workflow_registry_by_generic_reference(registry_ref)
+        except lm_exceptions.EntityNotFoundException:
+            return lm_exceptions.report_problem(404, "Not Found",
+                                                detail=messages.no_registry_found.format(registry_ref))
+    results = {}
+    submissions, indexes = [], []
+    for index, item in enumerate(body['items']):
+        try:
+            submitter = current_user
+            if not current_user or current_user.is_anonymous:  # the client is a registry
+                submitter = lm.find_registry_user_identity(registry,
+                                                           internal_id=current_user.id,
+                                                           external_id=item['submitter_id']).user
+            if not registry and not item.get('roc_link', None):
+                raise ValueError("Missing ROC link")
+            submissions.append({
+                'roc_link': item.get('roc_link', None),
+                'workflow_submitter': submitter,
+                'workflow_version': item['version'],
+                'workflow_uuid': item.get('uuid', None),
+                'workflow_identifier': item.get('identifier', None),
+                'name': item.get('name', None),
+                'authorization': item.get('authorization', None)
+            })
+            indexes.append(index)
+        except Exception as e:
+            results[index] = _batch_item_problem(index, e, registry)
+    max_workers = current_app.config.get("WORKFLOW_BATCH_MAX_WORKERS", None)
+    for index, result in zip(indexes, lm.register_workflows(
+            submissions, workflow_registry=registry,
+            max_workers=int(max_workers) if max_workers else None,
+            chunk_size=int(current_app.config.get("WORKFLOW_BATCH_CHUNK_SIZE", 50)))):
+        if 'error' in result:
+            results[index] = _batch_item_problem(index, result['error'], registry)
+        else:
+            w = result['workflow_version']
+            results[index] = {'index': index, 'status': 201,
+                              'wf_uuid': str(w.workflow.uuid), 'wf_version': w.version}
+    logger.debug("workflows_post_batch. Processed %d submissions", len(results))
+    return {'items': [results[i] for i in sorted(results)]}, 200
+
+
 @authorized
 def workflows_put(wf_uuid, wf_version, body):
     # TODO: to be implemented
@@ -170,26 +251,49 @@ def workflows_delete(wf_uuid, wf_version):
         raise lm_exceptions.LifeMonitorException(title="Internal Error", detail=str(e))
 
 
+def _decode_cursor(cursor, key_types):
+    if not cursor:
+        return None
+    key = lm_utils.decode_cursor(cursor)
+    if not isinstance(key, key_types) or isinstance(key, bool):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return key
+
+
+def _add_page_links(data, page, limit):
+    next_key = getattr(page, 'next_key', None)
+    if next_key is not None:
+        query = urlencode({'limit': limit, 'cursor': lm_utils.encode_cursor(next_key)})
+        context = serializers.SerializationContext.get()
+        data['links'] = {'next': f"{context.base_url.rstrip('/')}{context.path}?{query}"}
+    return data
+
+
 @authorized
-def workflows_get():
-    workflows = []
+@read_only
+def workflows_get(limit=None, cursor=None):
+    try:
+        after = _decode_cursor(cursor, int)
+    except ValueError:
+        return lm_exceptions.report_problem(400, "Bad Request", detail=messages.invalid_cursor)
     if current_user and not current_user.is_anonymous:
-        workflows.extend(lm.get_user_workflows(current_user))
+        workflows = lm.get_user_workflows(current_user, profile=LoadingProfile.LIST, limit=limit, after=after)
     elif current_registry:
-        workflows.extend(lm.get_registry_workflows(current_registry))
+        workflows = lm.get_registry_workflows(current_registry, profile=LoadingProfile.LIST,
+                                              limit=limit, after=after)
     else:
         return lm_exceptions.report_problem(401, "Unauthorized", detail=messages.no_user_in_session)
     logger.debug("workflows_get. Got %s workflows (user: %s)", len(workflows), current_user)
-    return serializers.WorkflowSchema().dump(workflows, many=True)
+    return _add_page_links(serializers.WorkflowSchema.get_instance().dump(workflows, many=True), workflows, limit)
 
 
-def _get_workflow_or_problem(wf_uuid, wf_version):
+def _get_workflow_or_problem(wf_uuid, wf_version, profile=None):
     try:
         wf = None
         if current_user and not current_user.is_anonymous:
-            wf = lm.get_user_workflow_version(current_user, wf_uuid, wf_version)
+            wf = lm.get_user_workflow_version(current_user, wf_uuid, wf_version, profile=profile)
         elif current_registry:
-            wf = lm.get_registry_workflow_version(current_registry, wf_uuid, wf_version)
+            wf = lm.get_registry_workflow_version(current_registry, wf_uuid, wf_version, profile=profile)
         else:
             return lm_exceptions.report_problem(403, "Forbidden",
                                                 detail=messages.no_user_in_session)
@@ -206,31 +310,35 @@ def _get_workflow_or_problem(wf_uuid, wf_version):
 
 
 @authorized
+@read_only
 def workflows_get_by_id(wf_uuid, wf_version):
-    response = _get_workflow_or_problem(wf_uuid, wf_version)
+    response = _get_workflow_or_problem(wf_uuid, wf_version, profile=LoadingProfile.DETAIL)
     return response if isinstance(response, Response) \
-        else serializers.WorkflowVersionSchema().dump(response)
+        else serializers.WorkflowVersionSchema.get_instance().dump(response)
 
 
 @authorized
+@read_only
 def workflows_get_latest_version_by_id(wf_uuid):
-    response = _get_workflow_or_problem(wf_uuid, None)
+    response = _get_workflow_or_problem(wf_uuid, None, profile=LoadingProfile.DETAIL)
     return response if isinstance(response, Response) \
-        else serializers.LatestWorkflowSchema().dump(response)
+        else serializers.LatestWorkflowSchema.get_instance().dump(response)
 
 
 @authorized
+@read_only
 def workflows_get_status(wf_uuid, wf_version):
-    response = _get_workflow_or_problem(wf_uuid, wf_version)
+    response = _get_workflow_or_problem(wf_uuid, wf_version, profile=LoadingProfile.STATUS)
     return response if isinstance(response, Response) \
-        else serializers.WorkflowStatusSchema().dump(response.status)
+        else serializers.WorkflowStatusSchema.get_instance().dump(response.status)
 
 
 @authorized
+@read_only
 def workflows_get_suites(wf_uuid, wf_version):
-    response = _get_workflow_or_problem(wf_uuid, wf_version)
+    response = _get_workflow_or_problem(wf_uuid, wf_version, profile=LoadingProfile.SUITES)
     return response if isinstance(response, Response) \
-        else serializers.SuiteSchema().dump(response.test_suites, many=True)
+        else serializers.SuiteSchema.get_instance().dump(response.test_suites, many=True)
 
 
 def _get_suite_or_problem(suite_uuid):
@@ -262,24 +370,27 @@ def _get_suite_or_problem(suite_uuid):
 
 
 @authorized
+@read_only
 def suites_get_by_uuid(suite_uuid):
     response = _get_suite_or_problem(suite_uuid)
     return response if isinstance(response, Response) \
-        else serializers.SuiteSchema().dump(response)
+        else serializers.SuiteSchema.get_instance().dump(response)
 
 
 @authorized
+@read_only
 def suites_get_status(suite_uuid):
     response = _get_suite_or_problem(suite_uuid)
     return response if isinstance(response, Response) \
-        else serializers.SuiteStatusSchema().dump(response.status)
+        else serializers.SuiteStatusSchema.get_instance().dump(response.status)
 
 
 @authorized
+@read_only
 def suites_get_instances(suite_uuid):
     response = _get_suite_or_problem(suite_uuid)
     return response if isinstance(response, Response) \
-        else serializers.ListOfTestInstancesSchema().dump(response)
+        else serializers.ListOfTestInstancesSchema.get_instance().dump(response)
 
 
 def suites_post(wf_uuid, wf_version, body):
@@ -361,21 +472,33 @@ def _get_instances_or_problem(instance_uuid):
 
 
 @authorized
+@read_only
 def instances_get_by_id(instance_uuid):
     response = _get_instances_or_problem(instance_uuid)
     return response if isinstance(response, Response) \
-        else serializers.TestInstanceSchema().dump(response)
+        else serializers.TestInstanceSchema.get_instance().dump(response)
 
 
 @authorized
-def instances_get_builds(instance_uuid, limit):
+@read_only
+def instances_get_builds(instance_uuid, limit, cursor=None):
     response = _get_instances_or_problem(instance_uuid)
+    if isinstance(response, Response):
+        return response
+    try:
+        # build ids are numeric on all the testing services (even if reported as strings)
+        after = _decode_cursor(cursor, (int, str))
+        after = int(after) if after is not None else None
+    except ValueError:
+        return lm_exceptions.report_problem(400, "Bad Request", detail=messages.invalid_cursor)
     logger.info("Number of builds to load: %r", limit)
-    return response if isinstance(response, Response) \
-        else serializers.ListOfTestBuildsSchema().dump(response.get_test_builds(limit=limit), many=True)
+    builds = response.get_test_builds(limit=limit, after=after)
+    page = lm_utils.Page(builds, next_key=builds[-1].id if builds and len(builds) == limit else None)
+    return _add_page_links(serializers.ListOfTestBuildsSchema.get_instance().dump(page, many=True), page, limit)
 
 
 @authorized
+@read_only
 def instances_builds_get_by_id(instance_uuid, build_id):
     response = _get_instances_or_problem(instance_uuid)
     if isinstance(response, Response):
@@ -384,7 +507,7 @@ def instances_builds_get_by_id(instance_uuid, build_id):
         build = response.get_test_build(build_id)
         logger.debug("The test build: %r", build)
         if build:
-            return serializers.BuildSummarySchema().dump(build)
+            return serializers.BuildSummarySchema.get_instance().dump(build)
         else:
             return lm_exceptions\
                 .report_problem(404, "Not Found",
@@ -398,6 +521,7 @@ def instances_builds_get_by_id(instance_uuid, build_id):
 
 
 @authorized
+@read_only
 def instances_builds_get_logs(instance_uuid, build_id, offset_bytes=0, limit_bytes=131072):
     if not isinstance(offset_bytes, int) or offset_bytes < 0:
         return lm_exceptions.report_problem(400, "Bad Request", detail=messages.invalid_log_offset)
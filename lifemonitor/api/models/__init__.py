@@ -27,7 +27,8 @@ from lifemonitor.auth.models import User
 from .rocrate import ROCrate
 
 # 'status' module
-from .status import Status, AggregateTestStatus, WorkflowStatus, SuiteStatus
+from .status import (Status, AggregateTestStatus, WorkflowStatus, SuiteStatus,
+                     WorkflowHealth, LatestBuild, latest_builds_cache)
 
 # 'registries' package
 from .registries import WorkflowRegistry, WorkflowRegistryClient
@@ -44,15 +45,20 @@ from .services import TestingService, \
     TravisTestingService, TravisTestBuild, \
     TestingServiceToken, TestingServiceTokenManager
 
+# 'loading' profiles
+from .loading import LoadingProfile, get_loading_options
+
 
 __all__ = [
     "db", "User", "ROCrate",
     "Status", "AggregateTestStatus", "WorkflowStatus", "SuiteStatus",
+    "WorkflowHealth", "LatestBuild", "latest_builds_cache",
     "WorkflowRegistry", "WorkflowRegistryClient", "WorkflowVersion", "Workflow",
     "Test", "TestSuite", "TestInstance",
     "BuildStatus", "TestBuild", "JenkinsTestBuild", "TravisTestBuild",
     "TestingService", "JenkinsTestingService", "TravisTestingService",
-    "TestingServiceToken", "TestingServiceTokenManager"
+    "TestingServiceToken", "TestingServiceTokenManager",
+    "LoadingProfile", "get_loading_options"
 ]
 
 # set module level logger
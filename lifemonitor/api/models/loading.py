@@ -0,0 +1,100 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import logging
+from typing import List
+
+from sqlalchemy.orm import (joinedload, load_only, selectinload, undefer_group,
+                            with_polymorphic)
+
+from .services import TestingService
+from .testsuites import TestInstance, TestSuite
+from .workflows import Workflow, WorkflowVersion
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+
+class LoadingProfile:
+    """
+    Loading profiles of the workflow graph
+    (workflow -> versions -> suites -> instances -> testing services)
+    required to serialize the API responses with a constant number of queries
+    """
+    # workflow listings: only the workflow rows
+    LIST = "list"
+    # workflow version details: all the versions with their submitters
+    DETAIL = "detail"
+    # workflow version status: the details plus suites, instances and testing services
+    STATUS = "status"
+    # workflow version suites: the status plus the test definitions of the suites
+    SUITES = "suites"
+
+
+# column-only projections of the list/summary queries
+# (i.e., without the large JSON columns)
+VERSION_SUMMARY_COLUMNS = ("uuid", "name", "version", "uri", "type",
+                           "workflow_id", "submitter_id", "hosting_service_id")
+SUITE_SUMMARY_COLUMNS = ("uuid", "_workflow_version_id", "submitter_id")
+
+
+def _suites_options(path, profile: str) -> list:
+    testing_services = with_polymorphic(TestingService, '*', aliased=True)
+    suites = path.selectinload(WorkflowVersion.test_suites)
+    suites = suites.undefer_group("test_definition") if profile == LoadingProfile.SUITES \
+        else suites.load_only(*SUITE_SUMMARY_COLUMNS)
+    return [suites.selectinload(TestSuite.test_instances)
+            .joinedload(TestInstance.testing_service.of_type(testing_services))]
+
+
+def get_loading_options(entity, profile: str = None) -> List:
+    """ Return the loader options of `profile` for the queries of `entity` """
+    if profile is None:
+        return []
+    if profile not in (LoadingProfile.LIST, LoadingProfile.DETAIL,
+                       LoadingProfile.STATUS, LoadingProfile.SUITES):
+        raise ValueError(f"Unknown loading profile '{profile}'")
+    if profile == LoadingProfile.LIST:
+        if entity is WorkflowVersion:
+            return [load_only(*VERSION_SUMMARY_COLUMNS)]
+        if entity is TestSuite:
+            return [load_only(*SUITE_SUMMARY_COLUMNS)]
+        return []
+    if entity is Workflow:
+        def versions():
+            return selectinload(Workflow.versions).load_only(*VERSION_SUMMARY_COLUMNS)
+        options = [versions().joinedload(WorkflowVersion.submitter)]
+        if profile != LoadingProfile.DETAIL:
+            options.extend(_suites_options(versions(), profile))
+    elif entity is WorkflowVersion:
+        def versions():
+            return joinedload(WorkflowVersion.workflow)\
+                .selectinload(Workflow.versions).load_only(*VERSION_SUMMARY_COLUMNS)
+        options = [joinedload(WorkflowVersion.submitter),
+                   versions().joinedload(WorkflowVersion.submitter)]
+        if profile != LoadingProfile.DETAIL:
+            options.extend(_suites_options(versions(), profile))
+    elif entity is TestSuite:
+        options = [undefer_group("test_definition")] if profile == LoadingProfile.SUITES else []
+    else:
+        raise ValueError(f"No loading profile for {entity}")
+    return options
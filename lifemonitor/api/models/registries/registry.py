@@ -21,32 +21,229 @@
 from __future__ import annotations
 
 import logging
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List, Union
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Union
 
 import lifemonitor.api.models as models
 import lifemonitor.exceptions as lm_exceptions
 import requests
 from authlib.integrations.base_client import RemoteApp
+from authlib.integrations.requests_client import OAuth2Session
+from flask import current_app
 from lifemonitor import utils as lm_utils
 from lifemonitor.api.models import db
 from lifemonitor.auth import models as auth_models
 from lifemonitor.auth.oauth2.client.models import OAuthIdentity
 from lifemonitor.auth.oauth2.client.services import oauth2_registry
+from lifemonitor.db import outbound_io
 from lifemonitor.utils import ClassManager, download_url
+from requests.adapters import HTTPAdapter
+from sqlalchemy import select
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import NoResultFound
 
 # set module level logger
 logger = logging.getLogger(__name__)
 
 
+class UserWorkflowsCache:
+    """
+    Per-(registry, user) cache of the identifiers of the workflows
+    visible to users on workflow registries.
+
+    Entries expire after REGISTRY_USER_WORKFLOWS_CACHE_TTL seconds
+    and are refreshed in background when they are accessed
+    close to their expiration.
+    """
+
+    DEFAULT_TTL = 300
+    # fraction of the TTL after which entries are refreshed in background
+    REFRESH_RATIO = 0.8
+
+    def __init__(self) -> None:
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        return float(current_app.config.get("REGISTRY_USER_WORKFLOWS_CACHE_TTL") or self.DEFAULT_TTL)
+
+    def lookup(self, registry: WorkflowRegistry, user: auth_models.User,
+               loader_factory: Callable[[], Callable[[], set]]) -> Optional[FrozenSet[str]]:
+        """
+        Return the cached identifiers of the workflows visible to `user`
+        or None if they are not cached (or expired).
+        A background refresh is scheduled when the entry is about to expire.
+        """
+        key = (registry.id, user.id)
+        ttl = self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry:
+            workflows, timestamp = entry
+            age = time.monotonic() - timestamp
+            if age < ttl:
+                if age >= ttl * self.REFRESH_RATIO:
+                    self._refresh(key, loader_factory())
+                return workflows
+        return None
+
+    def store(self, key, workflows: Iterable[str]) -> FrozenSet[str]:
+        """ Cache the identifiers of the workflows visible to `key` = (registry_id, user_id) """
+        workflows = frozenset(workflows)
+        with self._lock:
+            self._entries[key] = (workflows, time.monotonic())
+        return workflows
+
+    def get(self, registry: WorkflowRegistry, user: auth_models.User,
+            loader_factory: Callable[[], Callable[[], set]]) -> FrozenSet[str]:
+        """
+        Return the cached identifiers of the workflows visible to `user`.
+        `loader_factory` is called (within the app context) to get a loader
+        of the identifiers which doesn't depend on the app context,
+        so that it can be used by background threads.
+        """
+        workflows = self.lookup(registry, user, loader_factory)
+        if workflows is None:
+            workflows = self.store((registry.id, user.id), loader_factory()())
+        return workflows
+
+    def _refresh(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.store(key, loader())
+            except Exception as e:
+                logger.warning("Unable to refresh the workflows of %r: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def invalidate(self, registry: WorkflowRegistry, user: auth_models.User = None):
+        with self._lock:
+            for key in [k for k in self._entries
+                        if k[0] == registry.id and (user is None or k[1] == user.id)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# cache of the workflows visible to users on registries
+user_workflows_cache = UserWorkflowsCache()
+
+
+class AccessTokenCache:
+    """
+    In-memory cache of the access tokens of users on registries.
+
+    Tokens which are expired (or about to expire) are refreshed
+    and refreshes of the token of a user are single-flight:
+    concurrent requests wait for the first refresh and reuse its result.
+    """
+
+    # seconds before the expiration at which tokens are refreshed
+    EXPIRATION_MARGIN = 60
+
+    def __init__(self) -> None:
+        self._tokens = {}
+        self._refresh_locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_expiring(cls, token: dict) -> bool:
+        expires_at = token.get('expires_at')
+        return expires_at is not None and float(expires_at) - cls.EXPIRATION_MARGIN < time.time()
+
+    def get(self, key, loader: Callable[[], dict], refresher: Callable[[dict], dict]) -> dict:
+        with self._lock:
+            token = self._tokens.get(key)
+        if token is None:
+            token = loader()
+            with self._lock:
+                self._tokens[key] = token
+        if self.is_expiring(token) and 'refresh_token' in token:
+            token = self.refresh(key, token, refresher)
+        return token
+
+    def refresh(self, key, expired_token: dict, refresher: Callable[[dict], dict]) -> dict:
+        with self._lock:
+            lock = self._refresh_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                token = self._tokens.get(key)
+            # the token has been already refreshed by a concurrent request
+            if token and token.get('access_token') != expired_token.get('access_token'):
+                return token
+            token = refresher(expired_token)
+            with self._lock:
+                self._tokens[key] = token
+            return token
+
+    def invalidate(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+# cache of the access tokens of users on registries
+access_token_cache = AccessTokenCache()
+
+# long-lived HTTP sessions (with connection pools) of registries
+__sessions__: Dict[str, requests.Session] = {}
+__sessions_lock__ = threading.Lock()
+
+# max number of connections to a registry kept in the pool
+HTTP_POOL_MAXSIZE = 16
+
+
+class RejectAllCookiesPolicy(DefaultCookiePolicy):
+    """
+    Cookie policy of the registry sessions: they are shared by all the users
+    and must not carry the cookies (e.g., session cookies) set for one of them
+    """
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def get_registry_session(registry: WorkflowRegistry) -> requests.Session:
+    with __sessions_lock__:
+        session = __sessions__.get(registry.uri)
+        if session is None:
+            session = requests.Session()
+            session.cookies.set_policy(RejectAllCookiesPolicy())
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            __sessions__[registry.uri] = session
+        return session
+
+
 class WorkflowRegistryClient(ABC):
 
     client_types = ClassManager('lifemonitor.api.models.registries', class_suffix="WorkflowRegistryClient", skip=["registry"])
 
     def __init__(self, registry: WorkflowRegistry):
         self._registry = registry
+        self._session = get_registry_session(registry)
         try:
             self._oauth2client: RemoteApp = getattr(oauth2_registry, self.registry.name)
         except AttributeError:
@@ -58,21 +255,78 @@ class WorkflowRegistryClient(ABC):
 
     def _get_access_token(self, user_id):
         # get the access token related with the user of this client registry
-        return OAuthIdentity.find_by_user_id(user_id, self.registry.name).token
+        return access_token_cache.get(
+            (self.registry.name, user_id),
+            lambda: OAuthIdentity.find_by_user_id(user_id, self.registry.name).token,
+            lambda token: self._refresh_token(user_id, token))
+
+    def _refresh_access_token(self, user_id, token):
+        if 'refresh_token' not in token:
+            raise lm_exceptions.NotAuthorizedException(detail="The access token cannot be refreshed")
+        return access_token_cache.refresh((self.registry.name, user_id), token,
+                                          lambda t: self._refresh_token(user_id, t))
+
+    def _refresh_token(self, user_id, token):
+        identity = OAuthIdentity.find_by_user_id(user_id, self.registry.name)
+        with db.engine.connect() as connection:
+            stored_token = connection.execute(
+                select([OAuthIdentity.__table__.c.token])
+                .where(OAuthIdentity.__table__.c.id == identity.id)).scalar()
+        # the token has been already updated (e.g., by another process)
+        if stored_token and stored_token.get('access_token') != token.get('access_token') \
+                and not AccessTokenCache.is_expiring(stored_token):
+            return stored_token
+        provider = self.registry.server_credentials
+        logger.debug("Refreshing the token of user %r on %r", user_id, self.registry.name)
+        with OAuth2Session(provider.client_id, provider.client_secret) as session:
+            new_token = dict(session.refresh_token(provider.access_token_url,
+                                                   refresh_token=token['refresh_token']))
+        # store the new token without involving the current ORM transaction
+        with db.engine.begin() as connection:
+            connection.execute(OAuthIdentity.__table__.update()
+                               .where(OAuthIdentity.__table__.c.id == identity.id)
+                               .values(token=new_token))
+        set_committed_value(identity, 'token', new_token)
+        return new_token
+
+    def _get_user_authorization(self, user):
+        auths = user.get_authorization(self.registry)
+        return auths[0] if auths else None
+
+    def _get_http_headers(self, user) -> dict:
+        auth = self._get_user_authorization(user)
+        if isinstance(auth, OAuthIdentity):
+            return {'Authorization': f'Bearer {self._get_access_token(user.id)["access_token"]}'}
+        return {'Authorization': auth.as_http_header()} if auth else {}
+
+    def _request(self, headers, *args, **kwargs):
+        # doesn't depend on the app context: it can be used by worker threads
+        with outbound_io():
+            r = self._session.get(*args, headers=headers, **kwargs)
+        if r.status_code == 401 or r.status_code == 403:
+            raise lm_exceptions.NotAuthorizedException(details=r.content, status=r.status_code)
+        r.raise_for_status()
+        return r
 
     def _get(self, user, *args, **kwargs):
-        with requests.Session() as session:
-            for auth in user.get_authorization(self.registry):
-                session.headers['Authorization'] = auth.as_http_header()
-                r = session.get(*args, **kwargs)
-                if r.status_code == 401 or r.status_code == 403:
-                    raise lm_exceptions.NotAuthorizedException(details=r.content)
-                r.raise_for_status()
-                return r
+        try:
+            return self._request(self._get_http_headers(user), *args, **kwargs)
+        except lm_exceptions.NotAuthorizedException as e:
+            # only an expired token (401) can be fixed by a refresh, not a forbidden resource (403)
+            if e.status != 401 or not isinstance(self._get_user_authorization(user), OAuthIdentity):
+                raise
+            token = self._refresh_access_token(user.id, self._get_access_token(user.id))
+            return self._request({'Authorization': f'Bearer {token["access_token"]}'}, *args, **kwargs)
 
     def download_url(self, url, user, target_path=None):
-        return download_url(url, target_path,
-                            authorization=f'Bearer {self._get_access_token(user.id)["access_token"]}')
+        token = self._get_access_token(user.id)
+        try:
+            return download_url(url, target_path, authorization=f'Bearer {token["access_token"]}')
+        except lm_exceptions.NotAuthorizedException as e:
+            if e.status != 401:
+                raise
+            token = self._refresh_access_token(user.id, token)
+            return download_url(url, target_path, authorization=f'Bearer {token["access_token"]}')
 
     def get_external_id(self, uuid, version, user: auth_models.User) -> str:
         """ Return CSV of uuid and version"""
@@ -82,6 +336,11 @@ class WorkflowRegistryClient(ABC):
         """ Return CSV of identifier and version"""
         return ",".join([str(identifier), str(version)])
 
+    def sync_catalog(self, full=False) -> dict:
+        """ Update the local mirror of the catalog of the registry """
+        raise lm_exceptions.NotImplementedException(
+            detail=f"Catalog sync not supported by the registry {self.registry.name}")
+
     @abstractmethod
     def build_ro_link(self, user, w: Union[models.WorkflowVersion, str]) -> str:
         pass
@@ -98,6 +357,16 @@ class WorkflowRegistryClient(ABC):
     def filter_by_user(workflows: list, user: auth_models.User):
         pass
 
+    def prepare_filter_by_user(self, workflows: list, user: auth_models.User) -> Callable[[], list]:
+        """
+        Return a function which filters `workflows` by `user`
+        and which doesn't require the app context,
+        so that it can run on a worker thread.
+        Clients should override it to defer their remote calls to the returned function.
+        """
+        result = self.filter_by_user(workflows, user)
+        return lambda: result
+
     @classmethod
     def get_client_class(cls, client_type):
         return cls.client_types.get_class(client_type)
@@ -178,6 +447,9 @@ class WorkflowRegistry(auth_models.Resource):
     def download_url(self, url, user, target_path=None):
         return self.client.download_url(url, user, target_path=target_path)
 
+    def sync_catalog(self, full=False) -> dict:
+        return self.client.sync_catalog(full=full)
+
     @property
     def users(self) -> List[auth_models.User]:
         return self.get_users()
@@ -192,36 +464,61 @@ class WorkflowRegistry(auth_models.Resource):
         return auths
 
     def get_user(self, user_id) -> auth_models.User:
-        for u in self.users:
-            logger.debug(f"Checking {u.id} {user_id}")
-            if u.id == user_id:
-                return u
-        return None
+        return auth_models.User.query\
+            .join(OAuthIdentity, OAuthIdentity.user_id == auth_models.User.id)\
+            .filter(OAuthIdentity.provider_id == self._server_id)\
+            .filter(auth_models.User.id == user_id).first()
 
     def get_users(self) -> List[auth_models.User]:
         try:
-            return [i.user for i in OAuthIdentity.query
-                    .filter(OAuthIdentity.provider == self.server_credentials).all()]
+            return auth_models.User.query\
+                .join(OAuthIdentity, OAuthIdentity.user_id == auth_models.User.id)\
+                .filter(OAuthIdentity.provider_id == self._server_id).all()
         except Exception as e:
             raise lm_exceptions.EntityNotFoundException(e)
 
-    def get_workflows(self) -> List[models.Workflow]:
-        return list({w.workflow for w in self.registered_workflow_versions})
+    def _registered_workflow_ids(self):
+        return db.session.query(models.WorkflowVersion.workflow_id)\
+            .filter(models.WorkflowVersion.hosting_service_id == self.id)
+
+    def get_workflows(self, profile: str = None,
+                      limit: int = None, after: int = None) -> List[models.Workflow]:
+        query = models.Workflow.query\
+            .options(*models.get_loading_options(models.Workflow, profile))\
+            .filter(models.Workflow.id.in_(self._registered_workflow_ids().subquery()))
+        return models.Workflow.paginate(query, limit=limit, after=after)
 
-    def get_workflow(self, uuid_or_identifier) -> models.Workflow:
+    def get_workflow(self, uuid_or_identifier, profile: str = None) -> models.Workflow:
         try:
-            w = next((w for w in self.registered_workflow_versions if w.workflow.uuid == lm_utils.uuid_param(uuid_or_identifier)), None)
-            return w.workflow if w is not None else None
+            criterion = models.Workflow.uuid == lm_utils.uuid_param(uuid_or_identifier)
         except ValueError:
-            w = next((w for w in self.registered_workflow_versions if w.workflow.external_id == uuid_or_identifier), None)
-            return w.workflow if w is not None else None
-        except Exception:
-            if models.Workflow.find_by_uuid(uuid_or_identifier) is not None:
-                raise lm_exceptions.NotAuthorizedException()
+            criterion = models.Workflow.uri == f"{models.Workflow.external_ns}{uuid_or_identifier}"
+        return models.Workflow.query\
+            .options(*models.get_loading_options(models.Workflow, profile))\
+            .filter(criterion)\
+            .filter(models.Workflow.id.in_(self._registered_workflow_ids().subquery())).first()
+
+    def has_user_workflow(self, user: auth_models.User, workflow: models.Workflow) -> bool:
+        """ Check whether the workflow is visible to the user on this registry """
+        return len(self.client.filter_by_user([workflow], user)) == 1
+
+    def invalidate_user_workflows(self, user: auth_models.User = None):
+        """ Invalidate the cached workflows visible to the user (or to all users) """
+        user_workflows_cache.invalidate(self, user)
 
     def get_user_workflows(self, user: auth_models.User) -> List[models.Workflow]:
         return self.client.filter_by_user(self.get_workflows(), user)
 
+    def prepare_user_workflows(self, user: auth_models.User,
+                               workflows: List[models.Workflow] = None) -> Callable[[], List[models.Workflow]]:
+        """
+        Return a function which filters the workflows of `user`
+        among `workflows` (default: all the workflows of the registry)
+        and which can run outside the app context.
+        """
+        return self.client.prepare_filter_by_user(
+            self.get_workflows() if workflows is None else workflows, user)
+
     def get_user_workflow_versions(self, user: auth_models.User) -> List[models.WorkflowVersion]:
         return self.client.filter_by_user(self.registered_workflow_versions, user)
 
@@ -239,6 +536,15 @@ class WorkflowRegistry(auth_models.Resource):
         except Exception as e:
             raise lm_exceptions.LifeMonitorException(detail=str(e), stack=str(e))
 
+    @classmethod
+    def find_by_workflow_uuid(cls, workflow_uuid) -> List[WorkflowRegistry]:
+        """ Return the registries hosting (versions of) the workflow with the given UUID """
+        workflow_ids = db.session.query(models.Workflow.id)\
+            .filter(models.Workflow.uuid == lm_utils.uuid_param(workflow_uuid))
+        registry_ids = db.session.query(models.WorkflowVersion.hosting_service_id)\
+            .filter(models.WorkflowVersion.workflow_id.in_(workflow_ids.subquery()))
+        return cls.query.filter(cls.id.in_(registry_ids.subquery())).all()
+
     @classmethod
     def find_by_name(cls, name):
         try:
@@ -21,12 +21,23 @@
 from __future__ import annotations
 
 import logging
-from typing import Union
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Union
+from urllib.parse import urljoin
 
+from flask import current_app
 from lifemonitor.api import models
 from lifemonitor.auth.models import User
 from lifemonitor.exceptions import EntityNotFoundException
-from .registry import WorkflowRegistry, WorkflowRegistryClient
+from lifemonitor.models import UUID
+from sqlalchemy import and_, bindparam, select
+from sqlalchemy.exc import IntegrityError
+
+from .registry import (WorkflowRegistry, WorkflowRegistryClient,
+                       user_workflows_cache)
 
 # set module level logger
 logger = logging.getLogger(__name__)
@@ -44,45 +55,352 @@ class SeekWorkflowRegistry(WorkflowRegistry):
     def __init__(self, client_credentials, server_credentials):
         super().__init__('seek_registry', client_credentials, server_credentials)
 
+    # The index of the workflows of the registry is read on the connection of the session
+    # (Core statements do not flush the ORM session, which may contain not yet complete
+    # objects, e.g., during registrations) and updated through its own connection,
+    # i.e., independently of the transaction of the session.
+
+    def find_indexed_workflow(self, uuid) -> Optional[str]:
+        """ Return the identifier of the indexed workflow with the given UUID """
+        t = SeekWorkflowIndexEntry.__table__
+        return models.db.session.execute(
+            select([t.c.external_id]).where(t.c.registry_id == self.id).where(t.c.uuid == uuid)
+        ).scalar()
+
+    def get_indexed_workflows(self) -> Set[str]:
+        """ Return the identifiers of the indexed workflows """
+        t = SeekWorkflowIndexEntry.__table__
+        return {r[0] for r in models.db.session.execute(
+            select([t.c.external_id]).where(t.c.registry_id == self.id))}
+
+    def index_workflows(self, workflows: Dict[str, str]):
+        """ Add to the index the workflows described by the map identifier -> UUID """
+        if not workflows:
+            return
+        t = SeekWorkflowIndexEntry.__table__
+        try:
+            with models.db.engine.begin() as connection:
+                indexed = {r[0] for r in connection.execute(
+                    select([t.c.external_id])
+                    .where(t.c.registry_id == self.id)
+                    .where(t.c.external_id.in_(list(workflows))))}
+                entries = [{"registry_id": self.id, "external_id": external_id, "uuid": uuid}
+                           for external_id, uuid in workflows.items() if external_id not in indexed]
+                if entries:
+                    connection.execute(t.insert(), entries)
+        except IntegrityError as e:
+            # workflows concurrently indexed by another process
+            logger.debug(e)
+
+    # The index is also a local mirror of the catalog of the registry
+    # (i.e., workflows and their visibility to users),
+    # which is updated by 'sync_catalog' (see SeekWorkflowRegistryClient).
+
+    def get_catalog_entry(self, external_id) -> Optional[dict]:
+        """ Return the mirrored details of the workflow with the given identifier """
+        t = SeekWorkflowIndexEntry.__table__
+        r = models.db.session.execute(
+            select([t.c.uuid, t.c.version, t.c.ro_link])
+            .where(t.c.registry_id == self.id).where(t.c.external_id == str(external_id))).first()
+        return dict(r) if r else None
+
+    def get_catalog(self) -> Dict[str, Optional[datetime]]:
+        """ Return the map identifier -> last sync time of the mirrored workflows """
+        t = SeekWorkflowIndexEntry.__table__
+        return {r[0]: r[1] for r in models.db.session.execute(
+            select([t.c.external_id, t.c.synced_at]).where(t.c.registry_id == self.id))}
+
+    def get_visible_workflows(self, user: User, max_age) -> Optional[Set[str]]:
+        """
+        Return the identifiers of the mirrored workflows visible to the user
+        or None if the visibility of the user has not been synced within `max_age` seconds
+        """
+        s = SeekWorkflowCatalogSync.__table__
+        v = SeekWorkflowVisibility.__table__
+        synced_at = models.db.session.execute(
+            select([s.c.synced_at]).where(s.c.registry_id == self.id).where(s.c.user_id == user.id)).scalar()
+        if not synced_at or synced_at < datetime.utcnow() - timedelta(seconds=max_age):
+            return None
+        return {r[0] for r in models.db.session.execute(
+            select([v.c.external_id]).where(v.c.registry_id == self.id).where(v.c.user_id == user.id))}
+
+    def update_catalog(self, entries: List[dict], visibility: Dict[int, Set[str]], listed: Set[str] = None):
+        """
+        Update the mirror of the catalog with the given workflow `entries`
+        and the `visibility` of workflows to users (i.e., the map user_id -> identifiers).
+        If the complete set of `listed` workflows is given, the other ones are removed.
+        """
+        t = SeekWorkflowIndexEntry.__table__
+        v = SeekWorkflowVisibility.__table__
+        s = SeekWorkflowCatalogSync.__table__
+        now = datetime.utcnow()
+        with models.db.engine.begin() as connection:
+            existing = {r[0] for r in connection.execute(
+                select([t.c.external_id]).where(t.c.registry_id == self.id))}
+            entries = [dict(e, registry_id=self.id, synced_at=now) for e in entries]
+            updated = [dict(e, _registry_id=e['registry_id'], _external_id=e['external_id'])
+                       for e in entries if e['external_id'] in existing]
+            if updated:
+                connection.execute(
+                    t.update().where(and_(t.c.registry_id == bindparam('_registry_id'),
+                                          t.c.external_id == bindparam('_external_id')))
+                    .values(uuid=bindparam('uuid'), version=bindparam('version'),
+                            ro_link=bindparam('ro_link'), synced_at=bindparam('synced_at')), updated)
+            inserted = [e for e in entries if e['external_id'] not in existing]
+            if inserted:
+                connection.execute(t.insert(), inserted)
+            if listed is not None:
+                connection.execute(t.delete().where(t.c.registry_id == self.id)
+                                   .where(t.c.external_id.notin_(list(listed))))
+            for user_id, workflows in visibility.items():
+                connection.execute(v.delete().where(v.c.registry_id == self.id).where(v.c.user_id == user_id))
+                if workflows:
+                    connection.execute(v.insert(), [{"registry_id": self.id, "user_id": user_id, "external_id": _id}
+                                                    for _id in workflows])
+                connection.execute(s.delete().where(s.c.registry_id == self.id).where(s.c.user_id == user_id))
+                connection.execute(s.insert(), {"registry_id": self.id, "user_id": user_id, "synced_at": now})
+
+    def invalidate_user_workflows(self, user: User = None):
+        super().invalidate_user_workflows(user)
+        # the mirrored visibility of the user is not reliable until the next sync
+        s = SeekWorkflowCatalogSync.__table__
+        query = s.delete().where(s.c.registry_id == self.id)
+        if user is not None:
+            query = query.where(s.c.user_id == user.id)
+        with models.db.engine.begin() as connection:
+            connection.execute(query)
+
+
+class SeekWorkflowIndexEntry(models.db.Model):
+    """ Map the UUID of a workflow hosted on a Seek registry to its identifier (and details) """
+    registry_id = models.db.Column(models.db.Integer,
+                                   models.db.ForeignKey(SeekWorkflowRegistry.id, ondelete='CASCADE'),
+                                   primary_key=True)
+    external_id = models.db.Column(models.db.String, primary_key=True)
+    uuid = models.db.Column(UUID, nullable=False)
+    version = models.db.Column(models.db.String, nullable=True)
+    ro_link = models.db.Column(models.db.String, nullable=True)
+    synced_at = models.db.Column(models.db.DateTime, nullable=True)
+
+    __table_args__ = (
+        models.db.Index('ix_seek_workflow_index_entry_uuid', 'registry_id', 'uuid'),
+    )
+
+
+class SeekWorkflowVisibility(models.db.Model):
+    """ Mirrored visibility of the workflows of a Seek registry to users """
+    registry_id = models.db.Column(models.db.Integer,
+                                   models.db.ForeignKey(SeekWorkflowRegistry.id, ondelete='CASCADE'),
+                                   primary_key=True)
+    user_id = models.db.Column(models.db.Integer,
+                               models.db.ForeignKey(User.id, ondelete='CASCADE'), primary_key=True)
+    external_id = models.db.Column(models.db.String, primary_key=True)
+
+
+class SeekWorkflowCatalogSync(models.db.Model):
+    """ Last sync of the visibility of the workflows of a Seek registry to a user """
+    registry_id = models.db.Column(models.db.Integer,
+                                   models.db.ForeignKey(SeekWorkflowRegistry.id, ondelete='CASCADE'),
+                                   primary_key=True)
+    user_id = models.db.Column(models.db.Integer,
+                               models.db.ForeignKey(User.id, ondelete='CASCADE'), primary_key=True)
+    synced_at = models.db.Column(models.db.DateTime, nullable=False)
+
 
 class SeekWorkflowRegistryClient(WorkflowRegistryClient):
 
-    def get_workflows_metadata(self, user, details=False):
-        r = self._get(user, f"{self.registry.uri}/workflows?format=json")
-        if r.status_code != 200:
-            raise RuntimeError(f"ERROR: unable to get workflows (status code: {r.status_code})")
-        workflows = r.json()['data']
-        return workflows if not details \
-            else [self.get_workflow_metadata(user, w['id']) for w in workflows]
+    # max number of workflow details fetched concurrently
+    max_workers = 8
 
-    def get_workflow_metadata(self, user, w: Union[models.WorkflowVersion, str]):
-        _id = w.workflow.external_id if isinstance(w, models.WorkflowVersion) else w
-        r = self._get(user, f"{self.registry.uri}/workflows/{_id}?format=json")
+    def _iter_workflows(self, headers) -> Iterator[dict]:
+        # the URL of the registry is read here and not while iterating:
+        # the iteration may happen on threads without an app context
+        # (e.g., background refreshes of the user_workflows_cache)
+        return self._iter_pages(dict(headers, Accept='application/json'), self._get_workflows_url())
+
+    def _get_workflows_url(self) -> str:
+        return f"{self.registry.uri}/workflows?format=json"
+
+    def _iter_pages(self, headers, url) -> Iterator[dict]:
+        # follow the JSON:API pagination links
+        # (which may not include the 'format' parameter)
+        while url:
+            r = self._request(headers, url)
+            if r.status_code != 200:
+                raise RuntimeError(f"ERROR: unable to get workflows (status code: {r.status_code})")
+            page = r.json()
+            yield from page['data']
+            next_page = (page.get('links') or {}).get('next')
+            url = urljoin(url, next_page) if next_page else None
+
+    def _fetch_workflow(self, headers, _id) -> dict:
+        r = self._request(headers, f"{self.registry.uri}/workflows/{_id}?format=json")
         if r.status_code != 200:
             raise RuntimeError(f"ERROR: unable to get workflow (status code: {r.status_code})")
         return r.json()['data']
 
+    def _iter_workflow_details(self, headers, identifiers: Iterable) -> Iterator[dict]:
+        # fetch details concurrently, preserving the order of identifiers
+        # and submitting only a bounded number of requests in advance
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            try:
+                for _id in identifiers:
+                    pending.append(executor.submit(self._fetch_workflow, headers, _id))
+                    if len(pending) >= 2 * self.max_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for f in pending:
+                    f.cancel()
+
+    def iter_workflows_metadata(self, user, details=False) -> Iterator[dict]:
+        """
+        Iterate over the workflows visible to the user, fetching pages (and details)
+        as needed: stop iterating to avoid unnecessary requests.
+        """
+        headers = self._get_http_headers(user)
+        workflows = self._iter_workflows(headers)
+        if not details:
+            return workflows
+        return self._iter_workflow_details(headers, (w['id'] for w in workflows))
+
+    def get_workflows_metadata(self, user, details=False):
+        return list(self.iter_workflows_metadata(user, details=details))
+
+    @staticmethod
+    def _catalog_max_age() -> float:
+        return float(current_app.config.get("REGISTRY_CATALOG_MAX_AGE") or 3600)
+
+    def _get_mirrored_workflows(self, user) -> Optional[Set[str]]:
+        # workflows visible to the user according to the local mirror (if up to date)
+        return self.registry.get_visible_workflows(user, self._catalog_max_age())
+
+    @staticmethod
+    def _catalog_entry(workflow: dict) -> dict:
+        attributes = workflow.get('attributes') or {}
+        content_blobs = attributes.get('content_blobs') or []
+        latest_version = attributes.get('latest_version')
+        return {
+            'external_id': str(workflow['id']),
+            'uuid': workflow['meta']['uuid'],
+            'version': str(latest_version) if latest_version is not None else None,
+            'ro_link': f"{content_blobs[0]['link']}/download" if content_blobs else None
+        }
+
+    def sync_catalog(self, full=False) -> dict:
+        """
+        Update the local mirror of the catalog of the registry:
+        the visibility of workflows is synced for every user of the registry,
+        while only the details of new workflows (or of all the workflows, if `full`)
+        and of the ones not synced within REGISTRY_CATALOG_MAX_AGE seconds are fetched.
+        """
+        visibility = {}
+        sources = {}
+        synced_users = []
+        complete = True
+        for user in self.registry.get_users():
+            try:
+                headers = self._get_http_headers(user)
+                visibility[user.id] = {str(w['id']) for w in self._iter_workflows(headers)}
+            except Exception as e:
+                logger.warning("Unable to sync the workflows of user %r: %s", user, e)
+                complete = False
+                continue
+            synced_users.append(user)
+            for _id in visibility[user.id]:
+                sources.setdefault(_id, headers)
+        catalog = self.registry.get_catalog()
+        outdated = datetime.utcnow() - timedelta(seconds=self._catalog_max_age())
+        groups = {}
+        for _id, headers in sources.items():
+            synced_at = catalog.get(_id)
+            if full or synced_at is None or synced_at < outdated:
+                groups.setdefault(tuple(headers.items()), []).append(_id)
+        entries = []
+        for headers, identifiers in groups.items():
+            entries.extend(self._catalog_entry(w)
+                           for w in self._iter_workflow_details(dict(headers), identifiers))
+        self.registry.update_catalog(entries, visibility, listed=set(sources) if complete else None)
+        for user in synced_users:
+            user_workflows_cache.invalidate(self.registry, user)
+        logger.info("Catalog of registry '%s' synced: %d users, %d workflows, %d updated",
+                    self.registry.name, len(visibility), len(sources), len(entries))
+        return {"users": len(visibility), "workflows": len(sources), "updated": len(entries)}
+
+    def get_workflow_metadata(self, user, w: Union[models.WorkflowVersion, str]):
+        _id = w.workflow.external_id if isinstance(w, models.WorkflowVersion) else w
+        workflow = self._fetch_workflow(self._get_http_headers(user), _id)
+        self.registry.index_workflows({str(workflow['id']): workflow['meta']['uuid']})
+        return workflow
+
     def build_ro_link(self, user, w: Union[models.WorkflowVersion, str]) -> str:
+        _id = str(w.workflow.external_id if isinstance(w, models.WorkflowVersion) else w)
+        if _id in (self._get_mirrored_workflows(user) or ()):
+            entry = self.registry.get_catalog_entry(_id)
+            if entry and entry['ro_link']:
+                return entry['ro_link']
         workflow = self.get_workflow_metadata(user, w)
         return f'{workflow["attributes"]["content_blobs"][0]["link"]}/download'
 
     def filter_by_user(self, workflows: list, user: User):
-        result = []
-        allowed = [w["id"] for w in self.get_workflows_metadata(user)]
-        for w in workflows:
-            if str(w.workflow.external_id
-                   if isinstance(w, models.WorkflowVersion) else w.external_id) in allowed:
-                result.append(w)
-        return result
+        return self.prepare_filter_by_user(workflows, user)()
+
+    def prepare_filter_by_user(self, workflows: list, user: User) -> Callable[[], list]:
+        def loader_factory():
+            # headers and URL are read within the app context (the loader may run on
+            # a background thread) and a new iteration is started on each call
+            headers = dict(self._get_http_headers(user), Accept='application/json')
+            url = self._get_workflows_url()
+            return lambda: {str(w["id"]) for w in self._iter_pages(headers, url)}
+        candidates = [(w, str(w.workflow.external_id
+                              if isinstance(w, models.WorkflowVersion) else w.external_id))
+                      for w in workflows]
+        allowed = self._get_mirrored_workflows(user)
+        if allowed is None:
+            allowed = user_workflows_cache.lookup(self.registry, user, loader_factory)
+        if allowed is not None:
+            return lambda: [w for w, _id in candidates if _id in allowed]
+        # only the remote listing is left to the returned function
+        key = (self.registry.id, user.id)
+        loader = loader_factory()
+
+        def filter_workflows():
+            visible = user_workflows_cache.store(key, loader())
+            return [w for w, _id in candidates if _id in visible]
+        return filter_workflows
 
     def get_external_id(self, uuid, version, user) -> str:
-        """ Return CSV of uuid and version"""
-        matches = [str(w['id']) for w in self.get_workflows_metadata(user, details=True)
-                   if w['meta']['uuid'] == str(uuid)]
-        if len(matches) != 1:
-            raise EntityNotFoundException(models.WorkflowVersion, f"{uuid}_{version}")
-        return matches[0]
+        """ Return the identifier of the workflow with the given UUID """
+        external_id = self.registry.find_indexed_workflow(uuid)
+        if external_id is not None and external_id in (self._get_mirrored_workflows(user) or ()):
+            return external_id
+        headers = self._get_http_headers(user)
+        allowed = []
+        with closing(self._iter_workflows(headers)) as user_workflows:
+            for w in user_workflows:
+                if str(w['id']) == external_id:
+                    return external_id
+                allowed.append(str(w['id']))
+        # fetch the details of the workflows visible to the user not indexed yet
+        indexed = self.registry.get_indexed_workflows()
+        fetched = {}
+        try:
+            with closing(self._iter_workflow_details(
+                    headers, [_id for _id in allowed if _id not in indexed])) as details:
+                for w in details:
+                    fetched[str(w['id'])] = w['meta']['uuid']
+                    if w['meta']['uuid'] == str(uuid):
+                        return str(w['id'])
+        finally:
+            self.registry.index_workflows(fetched)
+        raise EntityNotFoundException(models.WorkflowVersion, f"{uuid}_{version}")
 
     def get_external_uuid(self, identifier, version, user) -> str:
-        """ Return CSV of uuid and version"""
+        """ Return the UUID of the workflow with the given identifier """
+        if str(identifier) in (self._get_mirrored_workflows(user) or ()):
+            entry = self.registry.get_catalog_entry(identifier)
+            if entry:
+                return str(entry['uuid'])
         return self.get_workflow_metadata(user, identifier)['meta']['uuid']
@@ -23,16 +23,19 @@ from __future__ import annotations
 import json
 import logging
 import os
-import shutil
 import tempfile
+from contextlib import contextmanager
 from pathlib import Path
 
 import lifemonitor.exceptions as lm_exceptions
 from lifemonitor.api.models import db
 from lifemonitor.auth.models import Resource
 from lifemonitor.models import JSON
+from lifemonitor.scratch import scratch_space
 from lifemonitor.test_metadata import get_old_format_tests
-from lifemonitor.utils import download_url, extract_zip
+from lifemonitor.utils import (download_url, extract_local_zip, extract_zip,
+                               forget_authorization, get_local_path,
+                               probe_authorizations, remember_authorization)
 from rocrate.rocrate import ROCrate as ROCrateHelper
 from sqlalchemy.ext.hybrid import hybrid_property
 
@@ -42,13 +45,17 @@ logger = logging.getLogger(__name__)
 
 class ROCrate(Resource):
 
-    id = db.Column(db.Integer, db.ForeignKey(Resource.id), primary_key=True)
-    hosting_service_id = db.Column(db.Integer, db.ForeignKey("resource.id"), nullable=True)
+    id = db.Column(db.Integer, db.ForeignKey(Resource.id, ondelete='CASCADE'), primary_key=True)
+    hosting_service_id = db.Column(db.Integer, db.ForeignKey("resource.id", ondelete='CASCADE'),
+                                   nullable=True, index=True)
     hosting_service = db.relationship("Resource", uselist=False,
-                                      backref=db.backref("ro_crates", cascade="all, delete-orphan"),
+                                      backref=db.backref("ro_crates", cascade="all, delete-orphan",
+                                                         passive_deletes=True),
                                       foreign_keys=[hosting_service_id])
-    _metadata = db.Column("metadata", JSON, nullable=True)
+    # the full crate JSON-LD: loaded only when accessed
+    _metadata = db.deferred(db.Column("metadata", JSON, nullable=True), group="crate_metadata")
     _test_metadata = None
+    _dataset_name = None
     _local_path = None
     _metadata_loaded = False
 
@@ -73,9 +80,11 @@ class ROCrate(Resource):
     def dataset_name(self):
         if not self._metadata_loaded:
             self.load_metadata()
-        if not self._crate_helper:
-            raise RuntimeError("ROCrate not correctly loaded")
-        return self._crate_helper.name
+        if self._dataset_name is None:
+            if not self._crate_helper:
+                raise RuntimeError("ROCrate not correctly loaded")
+            self._dataset_name = self._crate_helper.name
+        return self._dataset_name
 
     @property
     def test_metadata(self):
@@ -88,38 +97,82 @@ class ROCrate(Resource):
         authorizations.append(None)
         return authorizations
 
+    def set_metadata(self, dataset_name, metadata, test_metadata):
+        """ Set metadata which have been already loaded elsewhere (e.g., by a worker process) """
+        self._dataset_name = dataset_name
+        self._metadata = metadata
+        self._test_metadata = test_metadata
+        self._metadata_loaded = True
+
     def load_metadata(self):
+        auth_headers = [a.as_http_header() if a else None for a in self._get_authorizations()]
+        self._crate_helper, self._metadata, self._test_metadata = \
+            self.download_metadata(self.uri, authorization_headers=auth_headers)
+        self._metadata_loaded = True
+        return self._metadata, self._test_metadata
+
+    @classmethod
+    def download_metadata(cls, roc_link, authorization_headers=(None,)):
         errors = []
-        # try either with authorization hedaer and without authorization
-        for authorization in self._get_authorizations():
+        # probe authorization headers to download the crate only once
+        for auth_header in probe_authorizations(roc_link, authorization_headers):
             try:
-                auth_header = authorization.as_http_header() if authorization else None
                 logger.debug(auth_header)
-                self._crate_helper, self._metadata, self._test_metadata = \
-                    self.load_metadata_files(self.uri, authorization_header=auth_header)
-                self._metadata_loaded = True
-                return self._metadata, self._test_metadata
+                result = cls.load_metadata_files(roc_link, authorization_header=auth_header)
+                remember_authorization(roc_link, auth_header)
+                return result
+            except lm_exceptions.ScratchQuotaExceededException:
+                raise
             except Exception as e:
                 errors.append(e)
 
+        forget_authorization(roc_link)
         if len([e for e in errors if isinstance(e, lm_exceptions.NotAuthorizedException)]) == len(errors):
             raise lm_exceptions.NotAuthorizedException()
         raise lm_exceptions.LifeMonitorException("ROCrate download error", errors=errors)
 
     @staticmethod
-    def extract_rocrate(roc_link, target_path=None, authorization_header=None):
-        with tempfile.NamedTemporaryFile(dir="/tmp") as archive_path:
-            zip_archive = download_url(roc_link, target_path=archive_path.name, authorization=authorization_header)
+    def extract_rocrate(roc_link, target_path=None, authorization_header=None, scratch_operation=None):
+        scratch_path = scratch_operation.path if scratch_operation else scratch_space.path
+        roc_path = target_path or Path(tempfile.mkdtemp(dir=scratch_path))
+        local_path = get_local_path(roc_link)
+        if local_path:
+            # read local archives in place, without copying them
+            logger.info("Extracting local RO Crate %s @ %s", local_path, roc_path)
+            extract_local_zip(local_path, target_path=roc_path.as_posix(),
+                              scratch_operation=scratch_operation)
+            return roc_path
+        with tempfile.NamedTemporaryFile(dir=scratch_path) as archive_path:
+            zip_archive = download_url(roc_link, target_path=archive_path.name,
+                                       authorization=authorization_header,
+                                       scratch_operation=scratch_operation)
             logger.debug("ZIP Archive: %s", zip_archive)
-            roc_path = target_path or Path(tempfile.mkdtemp(dir="/tmp"))
             logger.info("Extracting RO Crate @ %s", roc_path)
-            extract_zip(archive_path, target_path=roc_path.as_posix())
+            extract_zip(archive_path, target_path=roc_path.as_posix(),
+                        scratch_operation=scratch_operation)
             return roc_path
 
+    @classmethod
+    @contextmanager
+    def open_rocrate(cls, roc_link, authorization_header=None):
+        """
+        Yield the path of a local directory containing the RO-Crate at `roc_link`.
+        Already unpacked local crates are used in place;
+        otherwise, the crate is extracted to a scratch operation directory
+        which is removed on exit.
+        """
+        local_path = get_local_path(roc_link)
+        if local_path and os.path.isdir(local_path):
+            yield Path(local_path)
+            return
+        with scratch_space.operation() as scratch_operation:
+            yield cls.extract_rocrate(roc_link, target_path=scratch_operation.path / "crate",
+                                      authorization_header=authorization_header,
+                                      scratch_operation=scratch_operation)
+
     @classmethod
     def load_metadata_files(cls, roc_link, authorization_header=None):
-        roc_path = cls.extract_rocrate(roc_link, authorization_header=authorization_header)
-        try:
+        with cls.open_rocrate(roc_link, authorization_header=authorization_header) as roc_path:
             roc_posix_path = roc_path.as_posix()
             logger.debug(os.listdir(roc_posix_path))
             crate = ROCrateHelper(roc_posix_path)
@@ -129,5 +182,13 @@ class ROCrate(Resource):
             # create a new Workflow instance with the loaded metadata
             test_metadata = get_old_format_tests(crate)
             return crate, metadata, test_metadata
-        finally:
-            shutil.rmtree(roc_path, ignore_errors=True)
+
+
+def fetch_rocrate_metadata(roc_link, authorization_headers=(None,)):
+    """
+    Download and parse the RO-Crate available at `roc_link`.
+    Only picklable data are returned, i.e., the tuple (dataset_name, metadata, test_metadata),
+    so that the function can be executed by a worker process.
+    """
+    crate, metadata, test_metadata = ROCrate.download_metadata(roc_link, authorization_headers)
+    return crate.name, metadata, test_metadata
@@ -27,6 +27,7 @@ from typing import Optional
 import jenkins
 import lifemonitor.api.models as models
 import lifemonitor.exceptions as lm_exceptions
+from lifemonitor.db import outbound_io
 from lifemonitor.lang import messages
 
 from .service import TestingService
@@ -51,7 +52,8 @@ class JenkinsTestingService(TestingService):
 
     def check_connection(self) -> bool:
         try:
-            assert '_class' in self.server.get_info()
+            with outbound_io():
+                assert '_class' in self.server.get_info()
         except Exception as e:
             raise lm_exceptions.TestingServiceException(detail=str(e))
 
@@ -103,24 +105,30 @@ class JenkinsTestingService(TestingService):
     def get_project_metadata(self, test_instance: models.TestInstance, fetch_all_builds=False):
         if not hasattr(test_instance, "_raw_metadata") or test_instance._raw_metadata is None:
             try:
-                test_instance._raw_metadata = self.server.get_job_info(
-                    self.get_job_name(test_instance.resource), fetch_all_builds=fetch_all_builds)
+                with outbound_io():
+                    test_instance._raw_metadata = self.server.get_job_info(
+                        self.get_job_name(test_instance.resource), fetch_all_builds=fetch_all_builds)
             except jenkins.JenkinsException as e:
                 raise lm_exceptions.TestingServiceException(f"{self}: {e}")
         return test_instance._raw_metadata
 
-    def get_test_builds(self, test_instance: models.TestInstance, limit=10):
+    def get_test_builds(self, test_instance: models.TestInstance, limit=10, after=None):
         builds = []
-        project_metadata = self.get_project_metadata(test_instance, fetch_all_builds=True if limit > 100 else False)
+        # only the latest 100 builds are listed by default
+        project_metadata = self.get_project_metadata(test_instance,
+                                                     fetch_all_builds=limit > 100 or after is not None)
         for build_info in project_metadata['builds']:
             if len(builds) == limit:
                 break
-            builds.append(self.get_test_build(test_instance, build_info['number']))
+            if after is None or build_info['number'] < int(after):
+                builds.append(self.get_test_build(test_instance, build_info['number']))
         return builds
 
     def get_test_build(self, test_instance: models.TestInstance, build_number: int) -> JenkinsTestBuild:
         try:
-            build_metadata = self.server.get_build_info(self.get_job_name(test_instance.resource), int(build_number))
+            with outbound_io():
+                build_metadata = self.server.get_build_info(self.get_job_name(test_instance.resource),
+                                                            int(build_number))
             return JenkinsTestBuild(self, test_instance, build_metadata)
         except jenkins.NotFoundException as e:
             raise lm_exceptions.EntityNotFoundException(models.TestBuild, entity_id=build_number, detail=str(e))
@@ -137,7 +145,9 @@ class JenkinsTestingService(TestingService):
             if not isinstance(limit_bytes, int) or limit_bytes < 0:
                 raise ValueError(messages.invalid_log_limit)
 
-            output = self.server.get_build_console_output(self.get_job_name(test_instance.resource), build_number)
+            with outbound_io():
+                output = self.server.get_build_console_output(self.get_job_name(test_instance.resource),
+                                                              build_number)
             if len(output) < offset_bytes:
                 raise ValueError(messages.invalid_log_offset)
 
@@ -21,7 +21,7 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+from typing import Dict, List
 
 import lifemonitor.exceptions as lm_exceptions
 from lifemonitor.api import models
@@ -81,8 +81,8 @@ class TestingServiceTokenManager:
 
 
 class TestingService(db.Model, ModelMixin):
-    uuid = db.Column("uuid", UUID, db.ForeignKey(models.TestInstance.uuid), primary_key=True)
-    _type = db.Column("type", db.String, nullable=False)
+    uuid = db.Column("uuid", UUID, db.ForeignKey(models.TestInstance.uuid, ondelete='CASCADE'), primary_key=True)
+    _type = db.Column("type", db.String, nullable=False, index=True)
     url = db.Column(db.Text, nullable=False, unique=True)
     _token = None
 
@@ -137,8 +137,12 @@ class TestingService(db.Model, ModelMixin):
     def get_test_build(self, test_instance: models.TestInstance, build_number) -> models.TestBuild:
         raise lm_exceptions.NotImplementedException()
 
-    def get_test_builds(self, test_instance: models.TestInstance, limit=10) -> list:
-        raise lm_exceptions.ßNotImplementedException()
+    def get_test_builds(self, test_instance: models.TestInstance, limit=10, after=None) -> list:
+        """
+        Return the latest `limit` builds of `test_instance`, newest first:
+        `after` is the id of the last build of the previous page.
+        """
+        raise lm_exceptions.NotImplementedException()
 
     def get_test_builds_as_dict(self, test_instance: models.TestInstance, test_output):
         last_test_build = self.last_test_build
@@ -182,10 +186,28 @@ class TestingService(db.Model, ModelMixin):
             raise lm_exceptions.LifeMonitorException(detail=str(e), stack=str(e))
 
     @classmethod
-    def get_instance(cls, service_type, url: str) -> TestingService:
+    def find_by_urls(cls, urls) -> Dict[str, TestingService]:
+        """ Return the registered services of `urls` (with a single query) indexed by URL """
+        urls = set(urls)
+        if not urls:
+            return {}
+        try:
+            with db.session.no_autoflush:
+                return {s.url: s for s in cls.query.filter(TestingService.url.in_(urls))}
+        except Exception as e:
+            raise lm_exceptions.LifeMonitorException(detail=str(e), stack=str(e))
+
+    @classmethod
+    def get_instance(cls, service_type, url: str,
+                     registered_services: Dict[str, TestingService] = None) -> TestingService:
+        """
+        Return the service of `url` (a new one if it has not been registered yet):
+        `registered_services` (see `find_by_urls`) avoids to query the registered services
+        """
         try:
             # return the service obj if the service has already been registered
-            instance = cls.find_by_url(url)
+            instance = cls.find_by_url(url) if registered_services is None \
+                else registered_services.get(url, None)
             logger.debug("Found service instance: %r", instance)
             if instance:
                 return instance
@@ -28,6 +28,7 @@ from typing import Optional
 
 import lifemonitor.api.models as models
 import requests
+from lifemonitor.db import outbound_io
 from lifemonitor.exceptions import EntityNotFoundException, TestingServiceException
 
 from .service import TestingService
@@ -72,7 +73,9 @@ class TravisTestingService(TestingService):
 
     def _get(self, path, token: models.TestingServiceToken = None, params=None) -> object:
         logger.debug("Getting resource: %r", self._build_url(path, params))
-        response = requests.get(self._build_url(path, params), headers=self._build_headers(token))
+        headers = self._build_headers(token)
+        with outbound_io():
+            response = requests.get(self._build_url(path, params), headers=headers)
         return response.json() if response.status_code == 200 else response
 
     @staticmethod
@@ -124,23 +127,35 @@ class TravisTestingService(TestingService):
         except Exception as e:
             raise TestingServiceException(f"{self}: {e}")
 
-    def get_test_builds(self, test_instance: models.TestInstance, limit=10):
-        try:
-            repo_id = self.get_repo_id(test_instance)
-            response = self._get("/repo/{}/builds".format(repo_id), params={'limit': limit})
-        except Exception as e:
-            raise TestingServiceException(details=f"{e}")
-        if isinstance(response, requests.Response):
-            logger.debug(response)
-            raise TestingServiceException(status=response.status_code,
-                                          detail=str(response.content))
-        try:
-            builds = []
-            for build_info in response['builds']:
-                builds.append(models.TravisTestBuild(self, test_instance, build_info))
-            return builds
-        except Exception as e:
-            raise TestingServiceException(details=f"{e}")
+    def get_test_builds(self, test_instance: models.TestInstance, limit=10, after=None):
+        builds = []
+        offset = 0
+        # Travis doesn't filter builds by id:
+        # the builds newer than `after` are skipped by scanning them by offset
+        while len(builds) < limit:
+            try:
+                repo_id = self.get_repo_id(test_instance)
+                response = self._get("/repo/{}/builds".format(repo_id),
+                                     params={'limit': limit, 'offset': offset, 'sort_by': 'id:desc'})
+            except Exception as e:
+                raise TestingServiceException(details=f"{e}")
+            if isinstance(response, requests.Response):
+                logger.debug(response)
+                raise TestingServiceException(status=response.status_code,
+                                              detail=str(response.content))
+            try:
+                for build_info in response['builds']:
+                    if len(builds) == limit:
+                        break
+                    if after is None or int(build_info['id']) < int(after):
+                        builds.append(models.TravisTestBuild(self, test_instance, build_info))
+                if not response['builds'] or \
+                        response.get('@pagination', {}).get('is_last', len(response['builds']) < limit):
+                    break
+                offset += len(response['builds'])
+            except Exception as e:
+                raise TestingServiceException(details=f"{e}")
+        return builds
 
     def get_test_build(self, test_instance: models.TestInstance, build_number: int) -> models.TravisTestBuild:
         try:
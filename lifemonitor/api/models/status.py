@@ -21,13 +21,100 @@
 from __future__ import annotations
 
 import logging
+import threading
+import time
+from typing import Optional, Union
 
 import lifemonitor.exceptions as lm_exceptions
+from flask import current_app, has_app_context, has_request_context, request
 
 # set module level logger
 logger = logging.getLogger(__name__)
 
 
+class LatestBuild:
+    """ Latest build of a test instance and its outcome (or the issue which prevented to get it) """
+
+    def __init__(self, build=None, passing: Optional[bool] = None, issue: Optional[str] = None) -> None:
+        self.build = build
+        self.passing = passing
+        self.issue = issue
+
+
+class LatestBuildsCache:
+    """
+    Cache of the latest builds of test instances.
+
+    The latest build of a test instance is fetched from its testing service
+    at most once per request and shared by all the health and status checks
+    of the request; its outcome is also kept for TEST_BUILDS_CACHE_TTL seconds
+    to serve the checks which don't query the testing services (`cached_only`).
+    """
+
+    DEFAULT_TTL = 300
+    # key of the builds of the current request in its WSGI environment
+    ENVIRON_KEY = "lifemonitor.latest_builds"
+
+    def __init__(self) -> None:
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        ttl = current_app.config.get("TEST_BUILDS_CACHE_TTL") if has_app_context() else None
+        return float(ttl or self.DEFAULT_TTL)
+
+    @classmethod
+    def _request_builds(cls) -> Optional[dict]:
+        return request.environ.setdefault(cls.ENVIRON_KEY, {}) if has_request_context() else None
+
+    def get(self, test_instance) -> LatestBuild:
+        """ Return the latest build of `test_instance` (fetched once per request) """
+        builds = self._request_builds()
+        latest = builds.get(test_instance.uuid) if builds is not None else None
+        if latest is None:
+            latest = LatestBuild()
+            try:
+                latest.build = test_instance.last_test_build
+                if latest.build is not None:
+                    latest.passing = latest.build.is_successful()
+            except lm_exceptions.TestingServiceException as e:
+                latest.issue = str(e)
+                logger.exception(e)
+            if builds is not None:
+                builds[test_instance.uuid] = latest
+            with self._lock:
+                self._outcomes[test_instance.uuid] = (LatestBuild(passing=latest.passing, issue=latest.issue),
+                                                      time.monotonic())
+        return latest
+
+    def get_cached(self, test_instance) -> Optional[LatestBuild]:
+        """
+        Return the latest build of `test_instance` fetched in the current request
+        or, without the build itself, its last known outcome
+        (None if unknown or expired): testing services are never queried.
+        """
+        builds = self._request_builds()
+        if builds is not None and test_instance.uuid in builds:
+            return builds[test_instance.uuid]
+        with self._lock:
+            entry = self._outcomes.get(test_instance.uuid)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def invalidate(self, test_instance=None):
+        with self._lock:
+            if test_instance is None:
+                self._outcomes.clear()
+            else:
+                self._outcomes.pop(test_instance.uuid, None)
+
+
+# cache of the latest builds of test instances
+latest_builds_cache = LatestBuildsCache()
+
+
 class AggregateTestStatus:
     ALL_PASSING = "all_passing"
     SOME_PASSING = "some_passing"
@@ -87,24 +174,23 @@ class Status:
                     "issue": f"No test instances configured for suite {suite}"
                 })
             for test_instance in suite.test_instances:
-                try:
-                    latest_build = test_instance.last_test_build
-                    if latest_build is None:
-                        availability_issues.append({
-                            "service": test_instance.testing_service.url,
-                            "test_instance": test_instance,
-                            "issue": "No build found"
-                        })
-                    else:
-                        latest_builds.append(latest_build)
-                        status = WorkflowStatus._update_status(status, latest_build.is_successful())
-                except lm_exceptions.TestingServiceException as e:
+                latest = latest_builds_cache.get(test_instance)
+                if latest.build is not None:
+                    latest_builds.append(latest.build)
+                if latest.issue is not None:
                     availability_issues.append({
                         "service": test_instance.testing_service.url,
                         "resource": test_instance.resource,
-                        "issue": str(e)
+                        "issue": latest.issue
+                    })
+                elif latest.build is None:
+                    availability_issues.append({
+                        "service": test_instance.testing_service.url,
+                        "test_instance": test_instance,
+                        "issue": "No build found"
                     })
-                    logger.exception(e)
+                else:
+                    status = WorkflowStatus._update_status(status, latest.passing)
         # update the current status
         return status, latest_builds, availability_issues
 
@@ -121,3 +207,54 @@ class SuiteStatus(Status):
     def __init__(self, suite) -> None:
         self.suite = suite
         self._status, self._latest_builds, self._availability_issues = Status.check_status([suite])
+
+
+class WorkflowHealth:
+    """
+    Health of a workflow version, i.e., whether the latest builds of all its
+    test instances are passing. It is computed on first access and,
+    with `cached_only`, only from the builds already known
+    (see `LatestBuildsCache`) without querying the testing services.
+    """
+
+    UNKNOWN = "Unknown"
+
+    def __init__(self, workflow_version, cached_only: bool = False) -> None:
+        self.workflow_version = workflow_version
+        self.cached_only = cached_only
+        self._healthy = None
+        self._issues = None
+
+    def _check(self):
+        healthy, issues = True, []
+        for suite in self.workflow_version.test_suites:
+            for test_instance in suite.test_instances:
+                latest = latest_builds_cache.get_cached(test_instance) \
+                    if self.cached_only else latest_builds_cache.get(test_instance)
+                if latest is None:
+                    issues.append(f"No cached build of the test instance {test_instance.uuid}")
+                    healthy = self.UNKNOWN
+                elif latest.issue is not None:
+                    issues.append(latest.issue)
+                    healthy = self.UNKNOWN
+                elif latest.passing is None:
+                    issues.append(f"No build found for the test instance {test_instance.uuid}")
+                    healthy = self.UNKNOWN
+                elif not latest.passing:
+                    healthy = False
+        self._healthy, self._issues = healthy, issues
+
+    @property
+    def healthy(self) -> Union[bool, str]:
+        if self._issues is None:
+            self._check()
+        return self._healthy
+
+    @property
+    def issues(self) -> list:
+        if self._issues is None:
+            self._check()
+        return self._issues.copy()
+
+    def to_dict(self) -> dict:
+        return {'healthy': self.healthy, 'issues': self.issues}
@@ -38,7 +38,8 @@ logger = logging.getLogger(__name__)
 class TestInstance(db.Model, ModelMixin):
     uuid = db.Column(UUID, primary_key=True, default=_uuid.uuid4)
     _test_suite_uuid = \
-        db.Column("test_suite_uuid", UUID, db.ForeignKey(TestSuite.uuid), nullable=False)
+        db.Column("test_suite_uuid", UUID, db.ForeignKey(TestSuite.uuid, ondelete='CASCADE'),
+                  nullable=False, index=True)
     name = db.Column(db.Text, nullable=False)
     resource = db.Column(db.Text, nullable=False)
     parameters = db.Column(JSON, nullable=True)
@@ -50,10 +51,13 @@ class TestInstance(db.Model, ModelMixin):
     testing_service = db.relationship("TestingService",
                                       back_populates="test_instances",
                                       uselist=False,
-                                      cascade="save-update, merge, delete, delete-orphan")
+                                      cascade="save-update, merge, delete, delete-orphan",
+                                      passive_deletes=True)
 
     def __init__(self, testing_suite: TestSuite, submitter: models.User,
                  test_name, test_resource, testing_service: models.TestingService) -> None:
+        # set the PK in advance: the ORM can batch the INSERTs of the instances of a suite
+        self.uuid = _uuid.uuid4()
         self.test_suite = testing_suite
         self.submitter = submitter
         self.name = test_name
@@ -73,8 +77,8 @@ class TestInstance(db.Model, ModelMixin):
     def last_test_build(self):
         return self.testing_service.get_last_test_build(self)
 
-    def get_test_builds(self, limit=10):
-        return self.testing_service.get_test_builds(self, limit=limit)
+    def get_test_builds(self, limit=10, after=None):
+        return self.testing_service.get_test_builds(self, limit=limit, after=after)
 
     def get_test_build(self, build_number):
         return self.testing_service.get_test_build(self, build_number)
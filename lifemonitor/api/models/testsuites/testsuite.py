@@ -30,6 +30,8 @@ import lifemonitor.test_metadata as tm
 from lifemonitor.api.models import db
 from lifemonitor.auth.models import User
 from lifemonitor.models import JSON, UUID, ModelMixin
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 
 # set module level logger
 logger = logging.getLogger(__name__)
@@ -37,6 +39,8 @@ logger = logging.getLogger(__name__)
 
 class Test:
 
+    __slots__ = ('name', 'project', 'specification')
+
     def __init__(self,
                  project: TestSuite,
                  name: str, specification: object) -> None:
@@ -56,15 +60,19 @@ class Test:
 class TestSuite(db.Model, ModelMixin):
     uuid = db.Column(UUID, primary_key=True, default=_uuid.uuid4)
     _workflow_version_id = db.Column("workflow_version_id", db.Integer,
-                                     db.ForeignKey(models.workflows.WorkflowVersion.id), nullable=False)
+                                     db.ForeignKey(models.workflows.WorkflowVersion.id, ondelete='CASCADE'),
+                                     nullable=False, index=True)
     workflow_version = db.relationship("WorkflowVersion", back_populates="test_suites")
-    test_definition = db.Column(JSON, nullable=False)
+    # loaded only when accessed (or by the 'suites' loading profile)
+    test_definition = db.deferred(db.Column(JSON, nullable=False), group="test_definition")
     submitter_id = db.Column(db.Integer,
                              db.ForeignKey(User.id), nullable=False)
     submitter = db.relationship("User", uselist=False)
     test_instances = db.relationship("TestInstance",
                                      back_populates="test_suite",
-                                     cascade="all, delete")
+                                     cascade="all, delete", passive_deletes=True)
+    # tests of the current test definition indexed by name
+    _tests = None
 
     def __init__(self,
                  w: models.workflows.WorkflowVersion, submitter: User,
@@ -78,17 +86,28 @@ class TestSuite(db.Model, ModelMixin):
         return '<TestSuite {} of workflow {} (version {})>'.format(
             self.uuid, self.workflow_version.uuid, self.workflow_version.version)
 
+    @validates('test_definition')
+    def _reset_tests(self, key, test_definition):
+        self._tests = None
+        return test_definition
+
     def _parse_test_definition(self):
         try:
-            for test in self.test_definition["test"]:
-                test = tm.Test.from_json(test)
+            tests = tm.compile_test_definition(self.test_definition).tests
+            # resolve the services of all the instances at once
+            registered_services = models.TestingService.find_by_urls(
+                instance.service.url for test in tests for instance in test.instance)
+            for test in tests:
                 for instance in test.instance:
                     logger.debug("Instance: %r", instance)
                     testing_service = models.TestingService.get_instance(
                         instance.service.type,
-                        instance.service.url
+                        instance.service.url,
+                        registered_services=registered_services
                     )
                     assert testing_service, "Testing service not initialized"
+                    # services are unique by URL: reuse the new ones too
+                    registered_services.setdefault(instance.service.url, testing_service)
                     logger.debug("Created TestService: %r", testing_service)
                     test_instance = models.TestInstance(self, self.submitter,
                                                         test.name, instance.service.resource,
@@ -129,12 +148,12 @@ class TestSuite(db.Model, ModelMixin):
             raise lm_exceptions.SpecificationNotDefinedException('Not test definition for the test suite {}'.format(self.uuid))
         if "test" not in self.test_definition:
             raise lm_exceptions.SpecificationNotValidException("'test' property not found")
-        # TODO: implement a caching mechanism: with a custom setter for the test_definition collection
-        result = {}
-        for test in self.test_definition["test"]:
-            result[test["name"]] = Test(self, test["name"],
-                                        test["specification"] if "specification" in test else None)
-        return result
+        if self._tests is None:
+            self._tests = {
+                name: Test(self, name, test.specification)
+                for name, test in tm.compile_test_definition(self.test_definition).by_name.items()
+            }
+        return self._tests
 
     @classmethod
     def all(cls) -> List[TestSuite]:
@@ -143,3 +162,18 @@ class TestSuite(db.Model, ModelMixin):
     @classmethod
     def find_by_uuid(cls, uuid) -> TestSuite:
         return cls.query.get(uuid)
+
+
+# the tests are compiled again when the test definition
+# is reloaded from (or expired to be reloaded from) the database
+
+@event.listens_for(TestSuite, 'refresh')
+def _reset_tests_on_refresh(target, context, attrs):
+    if attrs is None or 'test_definition' in attrs:
+        target._tests = None
+
+
+@event.listens_for(TestSuite, 'expire')
+def _reset_tests_on_expire(target, attrs):
+    if attrs is None or 'test_definition' in attrs:
+        target._tests = None
@@ -31,6 +31,7 @@ from lifemonitor.api.models.registries.registry import WorkflowRegistry
 from lifemonitor.api.models.rocrate import ROCrate
 from lifemonitor.auth.models import Permission, Resource, User
 from lifemonitor.auth.oauth2.client.models import OAuthIdentity
+from sqlalchemy import event
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm.collections import attribute_mapped_collection
@@ -41,7 +42,7 @@ logger = logging.getLogger(__name__)
 
 
 class Workflow(Resource):
-    id = db.Column(db.Integer, db.ForeignKey(Resource.id), primary_key=True)
+    id = db.Column(db.Integer, db.ForeignKey(Resource.id, ondelete='CASCADE'), primary_key=True)
 
     external_ns = "external-id:"
 
@@ -95,23 +96,18 @@ class Workflow(Resource):
             .filter(Permission.user_id == user.id)\
             .all()
 
+    def get_health(self, cached_only: bool = False) -> models.WorkflowHealth:
+        """ Return the health of the latest version of the workflow """
+        return self.latest_version.get_health(cached_only=cached_only)
+
     def check_health(self) -> dict:
-        health = {'healthy': True, 'issues': []}
-        for suite in self.test_suites:
-            for test_instance in suite.test_instances:
-                try:
-                    testing_service = test_instance.testing_service
-                    if not testing_service.last_test_build.is_successful():
-                        health["healthy"] = False
-                except lm_exceptions.TestingServiceException as e:
-                    health["issues"].append(str(e))
-                    health["healthy"] = "Unknown"
-        return health
+        return self.get_health().to_dict()
 
     @classmethod
-    def get_user_workflow(cls, owner: User, uuid) -> Workflow:
+    def get_user_workflow(cls, owner: User, uuid, profile: str = None) -> Workflow:
         try:
             return cls.query\
+                .options(*models.get_loading_options(Workflow, profile))\
                 .join(Permission)\
                 .filter(Permission.resource_id == cls.id, Permission.user_id == owner.id)\
                 .filter(cls.uuid == lm_utils.uuid_param(uuid)).one()
@@ -122,21 +118,54 @@ class Workflow(Resource):
             raise lm_exceptions.LifeMonitorException(detail=str(e), stack=str(e))
 
     @classmethod
-    def get_user_workflows(cls, owner: User) -> List[Workflow]:
-        return cls.query.join(Permission)\
-            .filter(Permission.user_id == owner.id).all()
+    def get_user_workflows(cls, owner: User, profile: str = None,
+                           limit: int = None, after: int = None) -> List[Workflow]:
+        """
+        Return the workflows of `owner` sorted by id:
+        `limit` and `after` (the id of the last workflow of the previous page)
+        paginate them by keyset.
+        """
+        query = cls.query.options(*models.get_loading_options(Workflow, profile))\
+            .join(Permission)\
+            .filter(Permission.user_id == owner.id)
+        return cls.paginate(query, limit=limit, after=after)
+
+    @classmethod
+    def paginate(cls, query, limit: int = None, after: int = None) -> List[Workflow]:
+        if after is not None:
+            query = query.filter(cls.id > after)
+        query = query.order_by(cls.id)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @classmethod
+    def purge(cls, ids: List[int]) -> int:
+        """
+        Delete the workflows identified by `ids` with set-based statements:
+        suites, instances, testing services and permissions are removed
+        by the `ON DELETE CASCADE` foreign keys.
+        Return the number of deleted workflows.
+        """
+        if not ids:
+            return 0
+        delete_version_resources(db.session.connection(), ids)
+        count = db.session.execute(Resource.__table__.delete()
+                                   .where(Resource.id.in_(ids))).rowcount
+        db.session.expire_all()
+        return count
 
 
 class WorkflowVersion(ROCrate):
-    id = db.Column(db.Integer, db.ForeignKey(ROCrate.id), primary_key=True)
-    submitter_id = db.Column(db.Integer, db.ForeignKey(User.id), nullable=False)
+    id = db.Column(db.Integer, db.ForeignKey(ROCrate.id, ondelete='CASCADE'), primary_key=True)
+    submitter_id = db.Column(db.Integer, db.ForeignKey(User.id), nullable=False, index=True)
     workflow_id = \
-        db.Column(db.Integer, db.ForeignKey("workflow.id"), nullable=False)
+        db.Column(db.Integer, db.ForeignKey("workflow.id", ondelete='CASCADE'), nullable=False, index=True)
     workflow = db.relationship("Workflow", foreign_keys=[workflow_id], cascade="all",
-                               backref=db.backref("versions", cascade="all, delete-orphan",
+                               backref=db.backref("versions", cascade="all, delete-orphan", passive_deletes=True,
                                                   collection_class=attribute_mapped_collection('version')))
     test_suites = db.relationship("TestSuite", back_populates="workflow_version",
-                                  cascade="all, delete")
+                                  cascade="all, delete", passive_deletes=True)
     submitter = db.relationship("User", uselist=False)
     roc_link = association_proxy('ro_crate', 'uri')
 
@@ -164,18 +193,15 @@ class WorkflowVersion(ROCrate):
         return '<WorkflowVersion ({}, {}), name: {}, ro_crate link {}>'.format(
             self.uuid, self.version, self.name, self.roc_link)
 
+    def get_health(self, cached_only: bool = False) -> models.WorkflowHealth:
+        """
+        Return the health of the workflow version (lazily computed):
+        with `cached_only`, the testing services are not queried
+        """
+        return models.WorkflowHealth(self, cached_only=cached_only)
+
     def check_health(self) -> dict:
-        health = {'healthy': True, 'issues': []}
-        for suite in self.test_suites:
-            for test_instance in suite.test_instances:
-                try:
-                    testing_service = test_instance.testing_service
-                    if not testing_service.last_test_build.is_successful():
-                        health["healthy"] = False
-                except lm_exceptions.TestingServiceException as e:
-                    health["issues"].append(str(e))
-                    health["healthy"] = "Unknown"
-        return health
+        return self.get_health().to_dict()
 
     @hybrid_property
     def authorizations(self):
@@ -211,7 +237,7 @@ class WorkflowVersion(ROCrate):
 
     @property
     def is_healthy(self) -> Union[bool, str]:
-        return self.check_health()["healthy"]
+        return self.get_health().healthy
 
     def add_test_suite(self, submitter: User, test_suite_metadata):
         return models.TestSuite(self, submitter, test_suite_metadata)
@@ -222,16 +248,18 @@ class WorkflowVersion(ROCrate):
         identity = OAuthIdentity.find_by_user_id(self.submitter.id, self.workflow_registry.name)
         return identity.provider_user_id
 
-    def to_dict(self, test_suite=False, test_build=False, test_output=False):
-        health = self.check_health()
+    def to_dict(self, test_suite=False, test_build=False, test_output=False, health=False, cached_health=False):
         data = {
             'uuid': str(self.uuid),
             'version': self.version,
             'name': self.name,
-            'roc_link': self.roc_link,
-            'isHealthy': health["healthy"],
-            'issues': health["issues"]
+            'roc_link': self.roc_link
         }
+        if health or cached_health:
+            # with `cached_health` only the outcomes of known builds are used
+            workflow_health = self.get_health(cached_only=not health)
+            data['isHealthy'] = workflow_health.healthy
+            data['issues'] = workflow_health.issues
         if test_suite:
             data['test_suite'] = [s.to_dict(test_build=test_build, test_output=test_output)
                                   for s in self.test_suites]
@@ -246,9 +274,10 @@ class WorkflowVersion(ROCrate):
         return cls.query.filter(WorkflowVersion.submitter_id == submitter.id).all()
 
     @classmethod
-    def get_user_workflow_version(cls, owner: User, uuid, version) -> WorkflowVersion:
+    def get_user_workflow_version(cls, owner: User, uuid, version, profile: str = None) -> WorkflowVersion:
         try:
             return cls.query\
+                .options(*models.get_loading_options(WorkflowVersion, profile))\
                 .join(Workflow, Workflow.id == cls.workflow_id)\
                 .join(Permission, Permission.resource_id == cls.id)\
                 .filter(Workflow.uuid == lm_utils.uuid_param(uuid))\
@@ -261,8 +290,9 @@ class WorkflowVersion(ROCrate):
             raise lm_exceptions.LifeMonitorException(detail=str(e), stack=str(e))
 
     @classmethod
-    def get_user_workflow_versions(cls, owner: User) -> List[WorkflowVersion]:
+    def get_user_workflow_versions(cls, owner: User, profile: str = None) -> List[WorkflowVersion]:
         return cls.query\
+            .options(*models.get_loading_options(WorkflowVersion, profile))\
             .join(Permission)\
             .filter(Permission.resource_id == cls.id, Permission.user_id == owner.id).all()
 
@@ -284,9 +314,35 @@ class WorkflowVersion(ROCrate):
             raise lm_exceptions.LifeMonitorException(detail=str(e), stack=str(e))
 
     @classmethod
-    def get_hosted_workflow_versions(cls, hosting_service: Resource) -> List[WorkflowVersion]:
+    def get_hosted_workflow_versions(cls, hosting_service: Resource, profile: str = None) -> List[WorkflowVersion]:
         # TODO: replace WorkflowRegistry with a more general Entity
         return cls.query\
+            .options(*models.get_loading_options(WorkflowVersion, profile))\
             .join(WorkflowRegistry, cls.hosting_service)\
             .filter(WorkflowRegistry.uuid == lm_utils.uuid_param(hosting_service.uuid))\
             .order_by(WorkflowVersion.version.desc()).all()
+
+
+# Versions are joined-inheritance rows (resource -> ro_crate -> workflow_version):
+# the `ON DELETE CASCADE` foreign keys would only remove their `workflow_version` rows,
+# so the parent `resource` rows of the versions are deleted explicitly
+def delete_version_resources(connection, workflow_ids):
+    versions = db.select([WorkflowVersion.__table__.c.id])\
+        .where(WorkflowVersion.__table__.c.workflow_id.in_(workflow_ids))
+    connection.execute(Resource.__table__.delete().where(Resource.id.in_(versions)))
+
+
+def delete_hosted_resources(connection, hosting_service_id):
+    ro_crates = db.select([ROCrate.__table__.c.id])\
+        .where(ROCrate.__table__.c.hosting_service_id == hosting_service_id)
+    connection.execute(Resource.__table__.delete().where(Resource.id.in_(ro_crates)))
+
+
+@event.listens_for(Workflow, 'before_delete')
+def _delete_workflow_versions(mapper, connection, target):
+    delete_version_resources(connection, [target.id])
+
+
+@event.listens_for(WorkflowRegistry, 'before_delete', propagate=True)
+def _delete_hosted_workflow_versions(mapper, connection, target):
+    delete_hosted_resources(connection, target.id)
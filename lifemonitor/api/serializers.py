@@ -23,6 +23,7 @@ from __future__ import annotations
 import logging
 from urllib.parse import urljoin
 
+from flask import has_request_context
 from flask.globals import request
 from lifemonitor import utils as lm_utils
 from lifemonitor.auth.serializers import UserSchema
@@ -35,6 +36,36 @@ from . import models
 logger = logging.getLogger(__name__)
 
 
+class SerializationContext:
+    """
+    Values shared by all the serializations of a request
+    (i.e., computed once and not for every serialized object)
+    """
+
+    # key of the context in the WSGI environment of the request
+    ENVIRON_KEY = "lifemonitor.serialization_context"
+
+    def __init__(self) -> None:
+        self.base_url = lm_utils.get_external_server_url()
+        self.ro_crates_url = urljoin(self.base_url, "ro_crates/")
+        if has_request_context():
+            self.path = request.path
+            self.full_path = request.full_path
+        else:
+            # when there is no active HTTP request
+            self.path = self.full_path = None
+
+    @classmethod
+    def get(cls) -> SerializationContext:
+        """ Return the context of the current request (a new one outside requests) """
+        if not has_request_context():
+            return cls()
+        context = request.environ.get(cls.ENVIRON_KEY)
+        if context is None:
+            context = request.environ[cls.ENVIRON_KEY] = cls()
+        return context
+
+
 class MetadataSchema(BaseSchema):
 
     class Meta:
@@ -46,14 +77,10 @@ class MetadataSchema(BaseSchema):
     modified = fields.DateTime(attribute='modified')
 
     def get_base_url(self, obj):
-        return lm_utils.get_external_server_url()
+        return SerializationContext.get().base_url
 
     def get_self_path(self, obj):
-        try:
-            return request.full_path
-        except RuntimeError:
-            # when there is no active HTTP request
-            return None
+        return SerializationContext.get().full_path
 
 
 class ResourceSchema(BaseSchema):
@@ -62,7 +89,7 @@ class ResourceSchema(BaseSchema):
     meta = fields.Method("get_metadata")
 
     def get_metadata(self, obj):
-        return MetadataSchema().dump(obj)
+        return MetadataSchema.get_instance().dump(obj)
 
 
 class WorkflowRegistrySchema(BaseSchema):
@@ -108,7 +135,7 @@ class VersionDetailsSchema(BaseSchema):
         return {
             'links': {
                 'external': obj.uri,
-                'download': urljoin(lm_utils.get_external_server_url(), f"ro_crates/{obj.id}/downloads")
+                'download': f"{SerializationContext.get().ro_crates_url}{obj.id}/downloads"
             }
         }
 
@@ -126,15 +153,15 @@ class WorkflowVersionSchema(ResourceSchema):
     version = fields.Method("get_version")
 
     def get_version(self, obj):
-        return VersionDetailsSchema().dump(obj)
+        return VersionDetailsSchema.get_instance().dump(obj)
 
 
 class LatestWorkflowSchema(WorkflowVersionSchema):
     previous_versions = fields.Method("get_versions")
 
     def get_versions(self, obj: models.WorkflowVersion):
-        return [VersionDetailsSchema(only=("uuid", "version", "submitter")).dump(v)
-                for v in obj.workflow.versions.values() if not v.is_latest]
+        schema = VersionDetailsSchema.get_instance(only=("uuid", "version", "submitter"))
+        return [schema.dump(v) for v in obj.workflow.versions.values() if not v.is_latest]
 
 
 class TestInstanceSchema(BaseSchema):
@@ -21,19 +21,43 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Union, Optional
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Optional, Union
 
 import lifemonitor.exceptions as lm_exceptions
+from flask import current_app
+from lifemonitor import utils as lm_utils
 from lifemonitor.api import models
+from lifemonitor.api.models.rocrate import fetch_rocrate_metadata
 from lifemonitor.auth.models import (ExternalServiceAuthorizationHeader,
                                      Permission, RoleType, User)
 from lifemonitor.auth.oauth2.client import providers
 from lifemonitor.auth.oauth2.client.models import OAuthIdentity
 from lifemonitor.auth.oauth2.server import server
+from lifemonitor.db import db, outbound_io
+from lifemonitor.scratch import scratch_space
 
 logger = logging.getLogger()
 
 
+def _init_rocrate_worker(scratch_path, operation_quota, quota):
+    # spawned workers only need the settings of the scratch space
+    scratch_space.configure(path=scratch_path, operation_quota=operation_quota, quota=quota)
+
+
+def _rocrate_process_pool(max_workers=None) -> ProcessPoolExecutor:
+    # the workers are spawned and not forked: they must not inherit
+    # the DB connections and the global state of the app
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_rocrate_worker,
+                               initargs=(str(scratch_space.path),
+                                         scratch_space.operation_quota, scratch_space.quota))
+
+
 class LifeMonitor:
     __instance = None
 
@@ -49,28 +73,30 @@ class LifeMonitor:
         self.__instance = self
 
     @staticmethod
-    def _find_and_check_shared_workflow_version(user: User, uuid, version=None) -> models.WorkflowVersion:
-        for svc in models.WorkflowRegistry.all():
+    def _find_and_check_shared_workflow_version(user: User, uuid, version=None,
+                                                profile: str = None) -> models.WorkflowVersion:
+        # check only the registries hosting the workflow (usually one)
+        for svc in models.WorkflowRegistry.find_by_workflow_uuid(uuid):
             try:
                 if svc.get_user(user.id):
-                    for w in svc.get_user_workflows(user):
-                        if str(w.uuid) == str(uuid):
-                            return w.versions[version] if version else w.latest_version
+                    w = svc.get_workflow(uuid, profile=profile)
+                    if w and svc.has_user_workflow(user, w):
+                        return w.versions[version] if version else w.latest_version
             except lm_exceptions.NotAuthorizedException as e:
                 logger.debug(e)
         return None
 
     @classmethod
-    def _find_and_check_workflow_version(cls, user: User, uuid, version=None):
+    def _find_and_check_workflow_version(cls, user: User, uuid, version=None, profile: str = None):
         w = None
         if not version:
-            _w = models.Workflow.get_user_workflow(user, uuid)
+            _w = models.Workflow.get_user_workflow(user, uuid, profile=profile)
             if _w:
                 w = _w.latest_version
         else:
-            w = models.WorkflowVersion.get_user_workflow_version(user, uuid, version)
+            w = models.WorkflowVersion.get_user_workflow_version(user, uuid, version, profile=profile)
         if not w:
-            w = cls._find_and_check_shared_workflow_version(user, uuid, version=version)
+            w = cls._find_and_check_shared_workflow_version(user, uuid, version=version, profile=profile)
 
         if w is None:
             raise lm_exceptions.EntityNotFoundException(models.WorkflowVersion, f"{uuid}_{version}")
@@ -83,21 +109,36 @@ class LifeMonitor:
             # if the user is not the submitter
             # and the workflow is associated with a registry
             # then we try to check whether the user is allowed to view the workflow
-            if w.workflow_registry is None or w.workflow not in w.workflow_registry.get_user_workflows(user):
+            if w.workflow_registry is None or not w.workflow_registry.has_user_workflow(user, w.workflow):
                 raise lm_exceptions.NotAuthorizedException(f"User {user.username} is not allowed to access workflow")
         return w
 
     @staticmethod
-    def register_workflow(roc_link, workflow_submitter: User, workflow_version,
-                          workflow_uuid=None, workflow_identifier=None,
-                          workflow_registry: Optional[models.WorkflowRegistry] = None,
-                          authorization=None, name=None):
+    def _find_workflow(workflow_submitter: User, workflow_uuid=None, workflow_identifier=None,
+                       workflow_registry: Optional[models.WorkflowRegistry] = None) -> models.Workflow:
+        if workflow_registry:
+            return workflow_registry.get_workflow(workflow_uuid or workflow_identifier)
+        return models.Workflow.get_user_workflow(workflow_submitter, workflow_uuid)
 
+    @classmethod
+    def _add_workflow_version(cls, roc_link, workflow_submitter: User, workflow_version,
+                              workflow_uuid=None, workflow_identifier=None,
+                              workflow_registry: Optional[models.WorkflowRegistry] = None,
+                              authorization=None, name=None, crate_metadata=None) -> models.WorkflowVersion:
+        # build the whole object graph before flushing it (see `register_workflow`)
+        with db.session.no_autoflush:
+            return cls._build_workflow_version(roc_link, workflow_submitter, workflow_version,
+                                               workflow_uuid=workflow_uuid, workflow_identifier=workflow_identifier,
+                                               workflow_registry=workflow_registry, authorization=authorization,
+                                               name=name, crate_metadata=crate_metadata)
+
+    @classmethod
+    def _build_workflow_version(cls, roc_link, workflow_submitter: User, workflow_version,
+                                workflow_uuid=None, workflow_identifier=None,
+                                workflow_registry: Optional[models.WorkflowRegistry] = None,
+                                authorization=None, name=None, crate_metadata=None) -> models.WorkflowVersion:
         # find or create a user workflow
-        if workflow_registry:
-            w = workflow_registry.get_workflow(workflow_uuid or workflow_identifier)
-        else:
-            w = models.Workflow.get_user_workflow(workflow_submitter, workflow_uuid)
+        w = cls._find_workflow(workflow_submitter, workflow_uuid, workflow_identifier, workflow_registry)
         if not w:
             w = models.Workflow(uuid=workflow_uuid, identifier=workflow_identifier, name=name)
             w.permissions.append(Permission(user=workflow_submitter, roles=[RoleType.owner]))
@@ -115,6 +156,8 @@ class LifeMonitor:
 
         wv = w.add_version(workflow_version, roc_link, workflow_submitter,
                            name=name, hosting_service=workflow_registry)
+        if crate_metadata:
+            wv.set_metadata(*crate_metadata)
         wv.permissions.append(Permission(user=workflow_submitter, roles=[RoleType.owner]))
         if authorization:
             auth = ExternalServiceAuthorizationHeader(workflow_submitter, header=authorization)
@@ -126,9 +169,118 @@ class LifeMonitor:
             logger.debug("Test metadata found in the crate")
             # FIXME: the test metadata can describe more than one suite
             wv.add_test_suite(workflow_submitter, wv.test_metadata)
-        w.save()
+        if workflow_registry:
+            workflow_registry.invalidate_user_workflows(workflow_submitter)
         return wv
 
+    @classmethod
+    def register_workflow(cls, roc_link, workflow_submitter: User, workflow_version,
+                          workflow_uuid=None, workflow_identifier=None,
+                          workflow_registry: Optional[models.WorkflowRegistry] = None,
+                          authorization=None, name=None):
+        wv = cls._add_workflow_version(roc_link, workflow_submitter, workflow_version,
+                                       workflow_uuid=workflow_uuid, workflow_identifier=workflow_identifier,
+                                       workflow_registry=workflow_registry,
+                                       authorization=authorization, name=name)
+        # flush and commit the whole object graph at once
+        wv.workflow.save()
+        return wv
+
+    @classmethod
+    def _prepare_workflow_submission(cls, submission: dict,
+                                     workflow_registry: Optional[models.WorkflowRegistry] = None):
+        """
+        Resolve the RO-Crate link of a submission and the list of
+        authorization headers to try (in order) to download it.
+        """
+        submitter = submission['workflow_submitter']
+        workflow_uuid = submission.get('workflow_uuid', None)
+        workflow_identifier = submission.get('workflow_identifier', None)
+        w = cls._find_workflow(submitter, workflow_uuid, workflow_identifier, workflow_registry)
+        if w and str(submission['workflow_version']) in w.versions:
+            raise lm_exceptions.WorkflowVersionConflictException(workflow_uuid, submission['workflow_version'])
+        roc_link = submission.get('roc_link', None)
+        if not roc_link:
+            if not workflow_registry:
+                raise ValueError("Missing ROC link")
+            roc_link = workflow_registry.build_ro_link(submitter, w.external_id if w else workflow_identifier)
+        # same order used by ROCrate.load_metadata
+        auth_headers = []
+        if submission.get('authorization', None):
+            auth_headers.append(submission['authorization'])
+        if workflow_registry:
+            auth_headers.extend([a.as_http_header() for a in submitter.get_authorization(workflow_registry)])
+        auth_headers.append(None)
+        return roc_link, auth_headers
+
+    @classmethod
+    def register_workflows(cls, submissions: List[dict],
+                           workflow_registry: Optional[models.WorkflowRegistry] = None,
+                           max_workers=None, chunk_size=50, processes=False) -> List[dict]:
+        """
+        Register a batch of workflow versions.
+
+        Each submission is a dict with the same keys as the parameters of `register_workflow`
+        (i.e., `roc_link`, `workflow_submitter`, `workflow_version`, `workflow_uuid`,
+        `workflow_identifier`, `authorization`, `name`).
+        RO-Crates are downloaded and parsed by a pool of `max_workers` threads or,
+        with `processes` (e.g., by CLI commands), of worker processes spawned for the batch
+        (in the current thread if `max_workers` <= 1) while the resulting workflows
+        are committed in transactions of `chunk_size` submissions.
+
+        Return a list of results in the same order of the submissions:
+        each result is either `{'workflow_version': <WorkflowVersion>}` or `{'error': <Exception>}`.
+        """
+        results = [None] * len(submissions)
+        executor = None
+        if max_workers is None or max_workers > 1:
+            executor = _rocrate_process_pool(max_workers) if processes \
+                else ThreadPoolExecutor(max_workers=max_workers)
+        pending = []
+        try:
+            # resolve RO-Crate links and schedule their download
+            for i, submission in enumerate(submissions):
+                try:
+                    roc_link, auth_headers = cls._prepare_workflow_submission(submission, workflow_registry)
+                    future = executor.submit(fetch_rocrate_metadata, roc_link, auth_headers) \
+                        if executor else None
+                    pending.append((i, roc_link, auth_headers, future))
+                except Exception as e:
+                    logger.debug(e)
+                    results[i] = {'error': e}
+            # create workflow versions as soon as their RO-Crates are available
+            for chunk in range(0, len(pending), chunk_size):
+                registered = []
+                for i, roc_link, auth_headers, future in pending[chunk:chunk + chunk_size]:
+                    try:
+                        crate_metadata = future.result() if future \
+                            else fetch_rocrate_metadata(roc_link, auth_headers)
+                        with db.session.begin_nested():
+                            wv = cls._add_workflow_version(**dict(submissions[i], roc_link=roc_link),
+                                                           workflow_registry=workflow_registry,
+                                                           crate_metadata=crate_metadata)
+                            db.session.add(wv.workflow)
+                        results[i] = {'workflow_version': wv}
+                        registered.append(i)
+                    except Exception as e:
+                        logger.debug(e)
+                        results[i] = {'error': e}
+                try:
+                    db.session.commit()
+                except Exception as e:
+                    logger.exception(e)
+                    db.session.rollback()
+                    for i in registered:
+                        results[i] = {'error': e}
+                logger.debug("Batch registration: %d of %d submissions processed",
+                             min(chunk + chunk_size, len(pending)), len(pending))
+        finally:
+            if executor:
+                for _, _, _, future in pending:
+                    future.cancel()
+                executor.shutdown()
+        return results
+
     @classmethod
     def deregister_user_workflow(cls, workflow_uuid, workflow_version, user: User):
         workflow = cls._find_and_check_workflow_version(user, workflow_uuid, workflow_version)
@@ -151,6 +303,44 @@ class LifeMonitor:
         logger.debug("Deleted workflow wf_uuid: %r - version: %r", workflow_uuid, workflow_version)
         return workflow_uuid, workflow_version
 
+    @staticmethod
+    def get_workflow_ids(submitter: User = None, registry: models.WorkflowRegistry = None,
+                         uuids: List[str] = None) -> List[int]:
+        """
+        Return the ids of the workflows with at least a version submitted by `submitter`
+        and hosted by `registry`, restricted to `uuids` if given
+        (all the workflows if no filter is set)
+        """
+        query = db.session.query(models.Workflow.id)
+        if submitter or registry:
+            query = query.join(models.WorkflowVersion, models.WorkflowVersion.workflow_id == models.Workflow.id)
+            if submitter:
+                query = query.filter(models.WorkflowVersion.submitter_id == submitter.id)
+            if registry:
+                query = query.filter(models.WorkflowVersion.hosting_service_id == registry.id)
+        if uuids:
+            query = query.filter(models.Workflow.uuid.in_([lm_utils.uuid_param(u) for u in uuids]))
+        return [row[0] for row in query.distinct().order_by(models.Workflow.id)]
+
+    @staticmethod
+    def purge_workflows(workflow_ids: List[int], batch_size=500) -> int:
+        """
+        Delete the workflows identified by `workflow_ids` (with all their versions,
+        test suites, instances and permissions) committing a transaction
+        every `batch_size` workflows.
+        Return the number of deleted workflows.
+        """
+        count = 0
+        for i in range(0, len(workflow_ids), batch_size):
+            try:
+                count += models.Workflow.purge(workflow_ids[i:i + batch_size])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            logger.info("Purged %d/%d workflows", count, len(workflow_ids))
+        return count
+
     @staticmethod
     def register_test_suite(workflow_uuid, workflow_version,
                             submitter: models.User, test_suite_metadata) -> models.TestSuite:
@@ -221,10 +411,6 @@ class LifeMonitor:
     def get_workflows() -> List[models.Workflow]:
         return models.Workflow.all()
 
-    @staticmethod
-    def get_registry_workflows(registry: models.WorkflowRegistry) -> List[models.Workflow]:
-        return registry.get_workflows()
-
     @staticmethod
     def get_registry_workflow(registry: models.WorkflowRegistry) -> models.Workflow:
         return registry.registered_workflow_versions
@@ -234,29 +420,97 @@ class LifeMonitor:
         return registry.get_workflow(uuid).versions.values()
 
     @staticmethod
-    def get_registry_workflow_version(registry: models.WorkflowRegistry, uuid, version=None) -> models.WorkflowVersion:
-        w = registry.get_workflow(uuid)
+    def get_registry_workflow_version(registry: models.WorkflowRegistry, uuid, version=None,
+                                      profile: str = None) -> models.WorkflowVersion:
+        w = registry.get_workflow(uuid, profile=profile)
         return w.latest_version if version is None else w.versions[version]
 
     @staticmethod
-    def get_user_workflows(user: User) -> List[models.Workflow]:
-        workflows = [w for w in models.Workflow.get_user_workflows(user)]
+    def _get_page(workflows, limit: int = None, horizon: int = None) -> lm_utils.Page:
+        """
+        Build a page of `workflows` (at most `limit`, sorted by id):
+        `horizon` is the highest id up to which all the sources
+        of the workflows have been scanned (None if all of them are exhausted).
+        """
+        items = sorted((w for w in workflows if horizon is None or w.id <= horizon), key=lambda w: w.id)
+        if limit and len(items) > limit:
+            items = items[:limit]
+            return lm_utils.Page(items, next_key=items[-1].id)
+        return lm_utils.Page(items, next_key=horizon)
+
+    @staticmethod
+    def get_registry_workflows(registry: models.WorkflowRegistry, profile: str = None,
+                               limit: int = None, after: int = None) -> lm_utils.Page:
+        workflows = registry.get_workflows(profile=profile, limit=limit, after=after)
+        return lm_utils.Page(workflows, next_key=workflows[-1].id if limit and len(workflows) == limit else None)
+
+    @classmethod
+    def get_user_workflows(cls, user: User, profile: str = None,
+                           limit: int = None, after: int = None) -> lm_utils.Page:
+        """
+        Return the workflows of `user` (either owned or visible on registries) sorted by id.
+        With `limit`, they are paginated by keyset:
+        `after` is the `next_key` of the previous page.
+        """
+        # each source lists at most `limit` candidates after the key:
+        # the page can't go beyond the last candidate of the truncated sources
+        horizons = []
+
+        def scanned(candidates):
+            if limit and len(candidates) == limit:
+                horizons.append(candidates[-1].id)
+            return candidates
+
+        workflows = {w.uuid: w for w in scanned(
+            models.Workflow.get_user_workflows(user, profile=profile, limit=limit, after=after))}
+        # registry queries are prepared here (they need the app context)
+        # while the remote calls run concurrently on worker threads
+        tasks = {}
         for svc in models.WorkflowRegistry.all():
             if svc.get_user(user.id):
                 try:
-                    workflows.extend([w for w in svc.get_user_workflows(user)
-                                      if w not in workflows])
+                    tasks[svc.name] = svc.prepare_user_workflows(
+                        user, scanned(svc.get_workflows(profile=profile, limit=limit, after=after)))
                 except lm_exceptions.NotAuthorizedException as e:
                     logger.debug(e)
-        return workflows
+                except Exception as e:
+                    logger.warning("Unable to get the workflows of user %r from registry %r: %s",
+                                   user.username, svc.name, e)
+        horizon = min(horizons) if horizons else None
+        if not tasks:
+            return cls._get_page(workflows.values(), limit=limit, horizon=horizon)
+        timeout = float(current_app.config.get("REGISTRY_REQUEST_TIMEOUT") or 10)
+        executor = ThreadPoolExecutor(max_workers=len(tasks))
+        try:
+            # the registries answer while the transaction of this request is released
+            with outbound_io():
+                futures = {name: executor.submit(task) for name, task in tasks.items()}
+                deadline = time.monotonic() + timeout
+                for name, future in futures.items():
+                    try:
+                        for w in future.result(timeout=max(0, deadline - time.monotonic())):
+                            workflows.setdefault(w.uuid, w)
+                    except FutureTimeoutError:
+                        logger.warning("Registry %r didn't answer within %ss: "
+                                       "its workflows are not listed for user %r", name, timeout, user.username)
+                    except lm_exceptions.NotAuthorizedException as e:
+                        logger.debug(e)
+                    except Exception as e:
+                        logger.warning("Unable to get the workflows of user %r from registry %r: %s",
+                                       user.username, name, e)
+        finally:
+            # don't wait for registries that timed out
+            executor.shutdown(wait=False)
+        return cls._get_page(workflows.values(), limit=limit, horizon=horizon)
 
     @classmethod
     def get_user_workflow(cls, user: models.User, uuid, version=None) -> models.Workflow:
         return cls._find_and_check_workflow_version(user, uuid, version).workflow
 
     @classmethod
-    def get_user_workflow_version(cls, user: models.User, uuid, version=None) -> models.WorkflowVersion:
-        return cls._find_and_check_workflow_version(user, uuid, version)
+    def get_user_workflow_version(cls, user: models.User, uuid, version=None,
+                                  profile: str = None) -> models.WorkflowVersion:
+        return cls._find_and_check_workflow_version(user, uuid, version, profile=profile)
 
     @staticmethod
     def get_workflow_registry_users(registry: models.WorkflowRegistry) -> List[User]:
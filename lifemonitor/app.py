@@ -18,18 +18,21 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hmac
 import logging
 import os
 
 import lifemonitor.config as config
-from flask import Flask, jsonify, redirect
+from flask import Flask, Response, jsonify, redirect, request
 from flask_cors import CORS
 from lifemonitor.routes import register_routes
 
 from . import commands
-from .db import db
-from .exceptions import handle_exception
-from .serializers import ma
+from .db import db, db_metrics
+from .exceptions import handle_exception, report_problem
+from .scratch import scratch_space
+from .serializers import JSONEncoder, ma
+from .utils import bool_from_string
 
 # set module level logger
 logger = logging.getLogger(__name__)
@@ -51,6 +54,8 @@ def create_app(env=None, settings=None, init_app=True, **kwargs):
     flask_app_instance_path = getattr(app_config, "FLASK_APP_INSTANCE_PATH", None)
     # create Flask app instance
     app = Flask(__name__, instance_relative_config=True, instance_path=flask_app_instance_path, **kwargs)
+    # encode JSON documents with the app encoder
+    app.json_encoder = JSONEncoder
     # enable CORS
     CORS(app)
     # register handler for app specific exception
@@ -71,6 +76,18 @@ def create_app(env=None, settings=None, init_app=True, **kwargs):
     def health():
         return jsonify("healthy")
 
+    @app.route("/metrics")
+    def metrics():
+        # exposed only when enabled and, if a token is set, to its bearers
+        if not bool_from_string(str(app.config.get("METRICS_ENABLED") or "false")):
+            return report_problem(404, "Not Found")
+        token = app.config.get("METRICS_TOKEN")
+        if token and not hmac.compare_digest(request.headers.get("Authorization", "").encode(),
+                                             f"Bearer {token}".encode()):
+            return report_problem(401, "Unauthorized", detail="Invalid metrics token")
+        return Response(db_metrics.to_prometheus(db.engine.pool),
+                        mimetype="text/plain; version=0.0.4")
+
     @app.route("/openapi.html")
     def openapi():
         return redirect('/static/apidocs.html')
@@ -83,6 +100,8 @@ def initialize_app(app, app_context):
     config.configure_logging(app)
     # configure app DB
     db.init_app(app)
+    # configure the scratch space
+    scratch_space.init_app(app)
     # configure serializer engine (Flask Marshmallow)
     ma.init_app(app)
     # configure app routes
@@ -49,7 +49,7 @@ login_manager.login_view = "auth.login"
 def show_current_user_profile():
     try:
         if current_user and not current_user.is_anonymous:
-            return serializers.UserSchema().dump(current_user)
+            return serializers.UserSchema.get_instance().dump(current_user)
         raise exceptions.Forbidden(detail="Client type unknown")
     except Exception as e:
         return exceptions.report_problem_from_exception(e)
@@ -59,7 +59,7 @@ def show_current_user_profile():
 def get_registry_users():
     try:
         if current_registry and current_user.is_anonymous:
-            return serializers.UserSchema().dump(current_registry.users, many=True)
+            return serializers.UserSchema.get_instance().dump(current_registry.users, many=True)
         raise exceptions.Forbidden(detail="Client type unknown")
     except Exception as e:
         return exceptions.report_problem_from_exception(e)
@@ -69,7 +69,7 @@ def get_registry_users():
 def get_registry_user(user_id):
     try:
         if current_registry:
-            return serializers.UserSchema().dump(current_registry.get_user(user_id))
+            return serializers.UserSchema.get_instance().dump(current_registry.get_user(user_id))
         raise exceptions.Forbidden(detail="Client type unknown")
     except Exception as e:
         return exceptions.report_problem_from_exception(e)
@@ -139,7 +139,7 @@ class ApiKey(db.Model, ModelMixin):
 
     key = db.Column(db.String, primary_key=True)
     user_id = db.Column(
-        db.Integer, db.ForeignKey('user.id', ondelete='CASCADE')
+        db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), index=True
     )
     user = db.relationship(
         'User',
@@ -184,17 +184,17 @@ class ApiKey(db.Model, ModelMixin):
 class Resource(db.Model, ModelMixin):
 
     id = db.Column('id', db.Integer, primary_key=True)
-    uuid = db.Column(UUID, default=_uuid.uuid4)
+    uuid = db.Column(UUID, default=_uuid.uuid4, index=True)
     type = db.Column(db.String, nullable=False)
     name = db.Column(db.String, nullable=True)
-    uri = db.Column(db.String, nullable=False)
+    uri = db.Column(db.String, nullable=False, index=True)
     version = db.Column(db.String, nullable=True)
     created = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     modified = db.Column(db.DateTime, default=datetime.datetime.utcnow,
                          onupdate=datetime.datetime.utcnow)
 
     permissions = db.relationship("Permission", back_populates="resource",
-                                  cascade="all, delete-orphan")
+                                  cascade="all, delete-orphan", passive_deletes=True)
 
     __mapper_args__ = {
         'polymorphic_identity': 'resource',
@@ -246,7 +246,9 @@ class RoleType:
 
 class Permission(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
-    resource_id = db.Column(db.Integer, db.ForeignKey('resource.id', ondelete='CASCADE'), primary_key=True)
+    # the primary key (user_id, resource_id) indexes the lookups by user
+    resource_id = db.Column(db.Integer, db.ForeignKey('resource.id', ondelete='CASCADE'),
+                            primary_key=True, index=True)
     roles = db.Column(db.ARRAY(db.String), nullable=True)
     user = db.relationship("User", back_populates="permissions")
     resource = db.relationship("Resource", back_populates="permissions")
@@ -269,7 +271,7 @@ class ExternalServiceAccessAuthorization(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String, nullable=False)
     user_id = db.Column('user_id', db.Integer,
-                        db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+                        db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
 
     resources = db.relationship("Resource",
                                 secondary=resource_authorization_table,
@@ -98,7 +98,10 @@ class OAuthIdentity(models.ExternalServiceAccessAuthorization, ModelMixin):
         ),
     )
 
-    __table_args__ = (db.UniqueConstraint("provider_id", "provider_user_id"),)
+    # the user of the identity is on the table of the parent class:
+    # identities of a provider are joined with their users by id
+    __table_args__ = (db.UniqueConstraint("provider_id", "provider_user_id"),
+                      db.Index("ix_oauth2_identity_provider_id_id", "provider_id", "id"))
     __tablename__ = "oauth2_identity"
     __mapper_args__ = {
         'polymorphic_identity': 'oauth2_identity'
@@ -219,7 +222,7 @@ class OAuth2Registry(OAuth):
 class OAuth2IdentityProvider(db.Model, ModelMixin):
 
     id = db.Column(db.Integer, primary_key=True)
-    _type = db.Column("type", db.String, nullable=False)
+    _type = db.Column("type", db.String, nullable=False, index=True)
     name = db.Column(db.String, nullable=False, unique=True)
     client_id = db.Column(db.String, nullable=False)
     client_secret = db.Column(db.String, nullable=False)
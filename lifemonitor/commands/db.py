@@ -37,10 +37,11 @@ def db_init():
     """
     Initialize the DB
     """
-    from lifemonitor.db import create_db, db
+    from lifemonitor.db import create_db, db, upgrade_db
     logger.debug("Initializing DB...")
     create_db(settings=current_app.config)
     db.create_all()
+    upgrade_db()
     logger.info("DB initialized")
     # create a default admin user if not exists
     admin = User.find_by_username('admin')
@@ -51,6 +52,20 @@ def db_init():
         db.session.commit()
 
 
+@blueprint.cli.command('upgrade')
+@with_appcontext
+def db_upgrade():
+    """
+    Apply the pending schema migrations
+    """
+    from lifemonitor.db import upgrade_db
+    applied = upgrade_db()
+    if applied:
+        logger.info("Applied schema migrations: %s", ", ".join(str(v) for v in applied))
+    else:
+        logger.info("DB schema up to date")
+
+
 @blueprint.cli.command('clean')
 @with_appcontext
 def db_clean():
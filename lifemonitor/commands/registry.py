@@ -176,3 +176,27 @@ def show_registry(name):
             detail = str(e)
         logger.exception(e)
         print(f"ERROR: {detail}", file=sys.stderr)
+
+
+@blueprint.cli.command('sync')
+@click.argument("name", required=False)
+@click.option("--full", is_flag=True, default=False,
+              help="Fetch the details of all the workflows (not only of the new or outdated ones)")
+@with_appcontext
+def sync_registries(name, full):
+    """ Sync the local mirror of the catalog of a workflow registry (default: all registries) """
+    try:
+        registries = [lm.get_workflow_registry_by_name(name)] if name else lm.get_workflow_registries()
+        if len(registries) == 0:
+            print("\n No Workflow Registry found !!!\n")
+        for r in registries:
+            result = r.sync_catalog(full=full)
+            print(f"{r.uuid} (name='{r.name}'): {result['workflows']} workflows, "
+                  f"{result['updated']} updated, {result['users']} users")
+    except Exception as e:
+        try:
+            detail = re.search('DETAIL:\\s*(.+)', str(e)).group(1)
+        except AttributeError:
+            detail = str(e)
+        logger.exception(e)
+        print(f"ERROR: {detail}", file=sys.stderr)
@@ -0,0 +1,47 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+
+from flask import Blueprint
+from flask.cli import with_appcontext
+from lifemonitor.scratch import scratch_space
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# define the blueprint for scratch space commands
+blueprint = Blueprint('scratch', __name__)
+
+
+@blueprint.cli.command('usage')
+@with_appcontext
+def usage():
+    """ Report the current usage of the scratch space """
+    print(json.dumps(scratch_space.get_usage(), indent=2))
+
+
+@blueprint.cli.command('cleanup')
+@with_appcontext
+def cleanup():
+    """ Remove orphaned directories of the scratch space """
+    removed = scratch_space.cleanup()
+    logger.info("Removed %d orphaned scratch directories", len(removed))
@@ -0,0 +1,140 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+import re
+import sys
+
+import click
+from flask import Blueprint
+from flask.cli import with_appcontext
+from lifemonitor.api.services import LifeMonitor
+from lifemonitor.auth.models import User
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# define the blueprint for workflow commands
+blueprint = Blueprint('workflow', __name__)
+
+# instance of LifeMonitor service
+lm = LifeMonitor.get_instance()
+
+
+@blueprint.cli.command('register-batch')
+@click.argument("filename", type=click.Path(exists=True))
+@click.option("--submitter", "username", required=True,
+              help="Username of the submitter of the workflows")
+@click.option("--registry", default=None,
+              help="Identifier of the registry (i.e., name, uri or uuid) hosting the workflows")
+@click.option("--workers", default=None, type=int,
+              help="Number of worker processes used to download RO-Crates (default: number of CPUs)")
+@click.option("--chunk-size", default=50, type=int, show_default=True,
+              help="Number of workflows committed in a single transaction")
+@with_appcontext
+def register_batch(filename, username, registry, workers, chunk_size):
+    """
+    Register a batch of workflows listed in a JSON file
+    (i.e., a list of items like the body of 'POST /workflows')
+    """
+    try:
+        submitter = User.find_by_username(username)
+        if not submitter:
+            print("User not found", file=sys.stderr)
+            sys.exit(99)
+        workflow_registry = lm.get_workflow_registry_by_generic_reference(registry) if registry else None
+        with open(filename) as f:
+            items = json.load(f)
+        if isinstance(items, dict):
+            items = items['items']
+        submissions = [{
+            'roc_link': item.get('roc_link', None),
+            'workflow_submitter': submitter,
+            'workflow_version': item['version'],
+            'workflow_uuid': item.get('uuid', None),
+            'workflow_identifier': item.get('identifier', None),
+            'name': item.get('name', None),
+            'authorization': item.get('authorization', None)
+        } for item in items]
+        results = lm.register_workflows(submissions, workflow_registry=workflow_registry,
+                                        max_workers=workers, chunk_size=chunk_size, processes=True)
+        errors = 0
+        for item, result in zip(items, results):
+            workflow_id = item.get('uuid', None) or item.get('identifier', None)
+            if 'error' in result:
+                errors += 1
+                print(f"ERROR: workflow {workflow_id} (ver.{item['version']}): {result['error']}", file=sys.stderr)
+            else:
+                w = result['workflow_version']
+                print(f"Workflow {w.workflow.uuid} (ver.{w.version}) registered")
+        print(f"{len(results) - errors} workflows registered, {errors} errors", file=sys.stderr)
+        logger.debug("Batch of %d workflows processed", len(results))
+    except Exception as e:
+        try:
+            detail = re.search('DETAIL:\\s*(.+)', str(e)).group(1)
+        except AttributeError:
+            detail = str(e)
+        logger.exception(e)
+        print(f"ERROR: {detail}", file=sys.stderr)
+
+
+@blueprint.cli.command('purge')
+@click.option("--submitter", "username", default=None,
+              help="Purge only the workflows with versions submitted by this user")
+@click.option("--registry", default=None,
+              help="Purge only the workflows with versions hosted by this registry (i.e., name, uri or uuid)")
+@click.option("--uuid", "uuids", multiple=True,
+              help="UUID of a workflow to purge (can be repeated)")
+@click.option("--all", "purge_all", is_flag=True, default=False,
+              help="Purge all the workflows when no other filter is set")
+@click.option("--batch-size", default=500, type=int, show_default=True,
+              help="Number of workflows deleted in a single transaction")
+@click.option("--yes", is_flag=True, default=False,
+              help="Do not ask for confirmation")
+@with_appcontext
+def purge(username, registry, uuids, purge_all, batch_size, yes):
+    """
+    Delete workflows with all their versions, test suites and instances
+    """
+    if not (username or registry or uuids or purge_all):
+        print("No workflow selected: use --submitter, --registry, --uuid or --all", file=sys.stderr)
+        sys.exit(99)
+    try:
+        submitter = None
+        if username:
+            submitter = User.find_by_username(username)
+            if not submitter:
+                print("User not found", file=sys.stderr)
+                sys.exit(99)
+        workflow_registry = lm.get_workflow_registry_by_generic_reference(registry) if registry else None
+        workflow_ids = lm.get_workflow_ids(submitter=submitter, registry=workflow_registry, uuids=uuids)
+        if not workflow_ids:
+            print("No workflow to purge", file=sys.stderr)
+            return
+        if not yes:
+            click.confirm(f"{len(workflow_ids)} workflows will be deleted. Continue?", abort=True)
+        count = lm.purge_workflows(workflow_ids, batch_size=batch_size)
+        print(f"{count} workflows purged")
+    except click.Abort:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        print(f"ERROR: {str(e)}", file=sys.stderr)
@@ -69,6 +69,47 @@ class BaseConfig:
     # JWT Settings
     JWT_SECRET_KEY_PATH = os.getenv("JWT_SECRET_KEY_PATH", 'certs/jwt-key')
     JWT_EXPIRATION_TIME = os.getenv("JWT_EXPIRATION_TIME", 3600)
+    # Batch registration of workflows:
+    # max number of workflows per request,
+    # number of processes used to download RO-Crates (default: number of CPUs)
+    # and number of workflows committed in a single transaction
+    WORKFLOW_BATCH_MAX_ITEMS = os.getenv("WORKFLOW_BATCH_MAX_ITEMS", 100)
+    WORKFLOW_BATCH_MAX_WORKERS = os.getenv("WORKFLOW_BATCH_MAX_WORKERS", None)
+    WORKFLOW_BATCH_CHUNK_SIZE = os.getenv("WORKFLOW_BATCH_CHUNK_SIZE", 50)
+    # Scratch space used to download and extract RO-Crates:
+    # location (default: system temp dir) and quotas in bytes (default: unlimited)
+    # of every single operation and of the whole scratch space
+    SCRATCH_PATH = os.getenv("SCRATCH_PATH", None)
+    SCRATCH_OPERATION_QUOTA = os.getenv("SCRATCH_OPERATION_QUOTA", None)
+    SCRATCH_QUOTA = os.getenv("SCRATCH_QUOTA", None)
+    # Lifetime (in seconds) of the cached workflows visible to users on registries
+    REGISTRY_USER_WORKFLOWS_CACHE_TTL = os.getenv("REGISTRY_USER_WORKFLOWS_CACHE_TTL", 300)
+    # Lifetime (in seconds) of the cached outcomes of the latest builds of test instances
+    # (used by the health checks which don't query the testing services)
+    TEST_BUILDS_CACHE_TTL = os.getenv("TEST_BUILDS_CACHE_TTL", 300)
+    # Max age (in seconds) of the data of the local mirror of registry catalogs
+    # (see 'flask registry sync'): older data are refreshed or ignored
+    REGISTRY_CATALOG_MAX_AGE = os.getenv("REGISTRY_CATALOG_MAX_AGE", 3600)
+    # Max time (in seconds) to wait for each registry when listing user workflows
+    REGISTRY_REQUEST_TIMEOUT = os.getenv("REGISTRY_REQUEST_TIMEOUT", 10)
+    # Read replicas (comma separated list of DB URIs) used by the read-only API operations
+    # and max replication lag (in seconds) tolerated on their data
+    DATABASE_REPLICA_URIS = os.getenv("DATABASE_REPLICA_URIS", None)
+    DATABASE_REPLICA_MAX_LAG = os.getenv("DATABASE_REPLICA_MAX_LAG", 5)
+    # Connection pool of each DB engine (sizes per app process: the DB must accept
+    # GUNICORN_WORKERS * (DATABASE_POOL_SIZE + DATABASE_POOL_MAX_OVERFLOW) connections)
+    DATABASE_POOL_SIZE = os.getenv("DATABASE_POOL_SIZE", 5)
+    DATABASE_POOL_MAX_OVERFLOW = os.getenv("DATABASE_POOL_MAX_OVERFLOW", 10)
+    DATABASE_POOL_TIMEOUT = os.getenv("DATABASE_POOL_TIMEOUT", 30)
+    DATABASE_POOL_RECYCLE = os.getenv("DATABASE_POOL_RECYCLE", -1)
+    DATABASE_POOL_PRE_PING = os.getenv("DATABASE_POOL_PRE_PING", "false")
+    # Max duration (in milliseconds) of every SQL statement (default: no limit)
+    DATABASE_STATEMENT_TIMEOUT = os.getenv("DATABASE_STATEMENT_TIMEOUT", None)
+    # Enable when connecting through an external pooler in transaction mode (e.g., PgBouncer)
+    DATABASE_EXTERNAL_POOLER = os.getenv("DATABASE_EXTERNAL_POOLER", "false")
+    # Expose the metrics of the app on '/metrics' (only to the bearers of METRICS_TOKEN, if set)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false")
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", None)
 
 
 class DevelopmentConfig(BaseConfig):
@@ -18,19 +18,364 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import functools
 import logging
+from contextlib import contextmanager
 import os
+import random
+import threading
+import time
 
 import psycopg2 as psy
 import psycopg2.sql as sql
-from flask_sqlalchemy import SQLAlchemy
+from flask import has_app_context
+from flask_sqlalchemy import (SignallingSession, SQLAlchemy, _EngineConnector,
+                              get_state)
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import event, inspect, orm
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.selectable import SelectBase
+
+from .utils import bool_from_string
 
 # set module level logger
 logger = logging.getLogger(__name__)
 
+# prefix of the (internal) binds of the read replicas
+REPLICA_BIND_PREFIX = "__replica__"
+
+# replication lag (in seconds) of a replica: zero when the replica has replayed all the WAL received
+REPLICA_LAG_QUERY = 'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 ' \
+    'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+
+# min interval (in seconds) between two checks of the lag of a replica
+REPLICA_LAG_CHECK_INTERVAL = 1
+
+
+class _Summary:
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_prometheus(self) -> list:
+        return [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} summary',
+            f'{self.name}_count {self.count}',
+            f'{self.name}_sum {self.sum}',
+            f'# TYPE {self.name}_max gauge',
+            f'{self.name}_max {self.max}'
+        ]
+
+
+class DBMetrics:
+    """
+    Time spent by the app waiting for connections of the DB pools
+    and by the DB connections idle in a transaction
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkout_wait = _Summary('lifemonitor_db_pool_checkout_wait_seconds',
+                                      'Time spent waiting for a DB connection')
+        self.idle_in_transaction = _Summary('lifemonitor_db_idle_in_transaction_seconds',
+                                            'Time spent by DB connections idle in a transaction')
+
+    def observe_checkout_wait(self, wait_time):
+        with self._lock:
+            self.checkout_wait.observe(wait_time)
+
+    def observe_idle_in_transaction(self, idle_time):
+        with self._lock:
+            self.idle_in_transaction.observe(idle_time)
+
+    def to_prometheus(self, pool=None) -> str:
+        """ Return the metrics in the Prometheus text format """
+        with self._lock:
+            lines = self.checkout_wait.to_prometheus() + self.idle_in_transaction.to_prometheus()
+        if isinstance(pool, QueuePool):
+            lines.extend([
+                '# TYPE lifemonitor_db_pool_size gauge',
+                f'lifemonitor_db_pool_size {pool.size()}',
+                '# TYPE lifemonitor_db_pool_checked_out gauge',
+                f'lifemonitor_db_pool_checked_out {pool.checkedout()}',
+                '# TYPE lifemonitor_db_pool_overflow gauge',
+                f'lifemonitor_db_pool_overflow {max(pool.overflow(), 0)}'
+            ])
+        return "\n".join(lines) + "\n"
+
+
+db_metrics = DBMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """ QueuePool which reports the time spent waiting for a connection to `db_metrics` """
+
+    def _do_get(self):
+        start = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            db_metrics.observe_checkout_wait(time.monotonic() - start)
+
+
+def _observe_idle_in_transaction(connection, *args):
+    idle_since = connection.info.pop('idle_since', None)
+    if idle_since is not None:
+        db_metrics.observe_idle_in_transaction(time.monotonic() - idle_since)
+
+
+def _track_idle_in_transaction(engine):
+    # a connection is idle in a transaction from the end of a statement
+    # to the beginning of the next one (or to the end of the transaction)
+    @event.listens_for(engine, 'after_cursor_execute')
+    def set_idle(connection, *args):
+        if connection.in_transaction():
+            connection.info['idle_since'] = time.monotonic()
+
+    event.listen(engine, 'before_cursor_execute', _observe_idle_in_transaction)
+    event.listen(engine, 'commit', _observe_idle_in_transaction)
+    event.listen(engine, 'rollback', _observe_idle_in_transaction)
+
+
+def _set_transaction_statement_timeout(statement_timeout):
+    def set_statement_timeout(connection):
+        connection.execute(f"SET LOCAL statement_timeout = {statement_timeout}")
+    return set_statement_timeout
+
+
+class _ReplicaConnector(_EngineConnector):
+
+    def __init__(self, sa, app, bind, uri):
+        super().__init__(sa, app, bind)
+        self._uri = uri
+        self.lag = None
+        self.lag_checked_at = 0
+
+    def get_uri(self):
+        return self._uri
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session with the transaction policy of read-only operations (see `read_only`):
+    - reads are routed to a read replica when `use_replicas` is set;
+    - transactions are `READ ONLY` when `read_only` is set;
+    - `release` ends the current read-only transaction keeping the loaded objects.
+    Writes and the reads which follow a write in the same session
+    always go to the primary, within read-write transactions.
+    """
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.db = db
+        self.use_replicas = False
+        self.read_only = False
+        self._replica = None
+        self._written = False
+        self._uncommitted_writes = False
+        self._read_only_connections = []
+
+    def _begin_write(self):
+        self._written = True
+        self._uncommitted_writes = True
+        # nothing has been written by the current read-only transactions:
+        # end them at the DBAPI level, so the next statements run in read-write transactions
+        for connection in self._read_only_connections:
+            connection.connection.commit()
+        self._read_only_connections.clear()
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            self._begin_write()
+        super().flush(objects=objects)
+
+    def release(self):
+        """
+        End the current read-only transaction (if any) and return its connections to the pool:
+        the loaded objects are kept and new connections are acquired by the next queries
+        """
+        if not self.read_only or self._uncommitted_writes or self.new or self.dirty or self.deleted:
+            return
+        expire_on_commit = self.expire_on_commit
+        self.expire_on_commit = False
+        try:
+            self.commit()
+        finally:
+            self.expire_on_commit = expire_on_commit
+
+    def get_bind(self, mapper=None, clause=None):
+        if (self.use_replicas or self.read_only) and not self._written and not self._flushing:
+            if isinstance(clause, SelectBase):
+                if self.use_replicas and self._replica is None:
+                    self._replica = self.db.get_replica_engine(self.app) or False
+                if self._replica:
+                    return self._replica
+            elif clause is not None:
+                # statements other than selects may write
+                self._begin_write()
+        return super().get_bind(mapper=mapper, clause=clause)
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _begin_read_only_transaction(session, transaction, connection):
+    if session.read_only and not session._uncommitted_writes \
+            and connection.dialect.name == 'postgresql':
+        connection.execute("SET TRANSACTION READ ONLY")
+        session._read_only_connections.append(connection)
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _end_transaction(session, transaction):
+    # the connections are released at the end of the outermost transaction
+    if transaction.parent is None:
+        session._uncommitted_writes = False
+        session._read_only_connections.clear()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    SQLAlchemy extension with a primary DB and any number of read replicas
+    (see `DATABASE_REPLICA_URIS` and `DATABASE_REPLICA_MAX_LAG`)
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        if not sa_url.drivername.startswith('postgresql'):
+            return
+        config = app.config
+        options['poolclass'] = TimedQueuePool
+        options['pool_size'] = int(config.get('DATABASE_POOL_SIZE', 5))
+        options['max_overflow'] = int(config.get('DATABASE_POOL_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = float(config.get('DATABASE_POOL_TIMEOUT', 30))
+        options['pool_recycle'] = int(config.get('DATABASE_POOL_RECYCLE', -1))
+        options['pool_pre_ping'] = bool_from_string(str(config.get('DATABASE_POOL_PRE_PING', False))) or False
+        if sa_url.get_driver_name() == 'psycopg2':
+            # send the batched INSERTs of a flush (e.g., the test instances of a suite) as a single statement
+            options['executemany_mode'] = 'values'
+        statement_timeout = config.get('DATABASE_STATEMENT_TIMEOUT', None)
+        # External poolers in transaction mode (e.g., PgBouncer) may hand every transaction
+        # to a different server connection: no session state is set (psycopg2 never uses
+        # server-side prepared statements) and the statement timeout is set per transaction
+        external_pooler = bool_from_string(str(config.get('DATABASE_EXTERNAL_POOLER', False)))
+        if statement_timeout:
+            if external_pooler:
+                options['_transaction_statement_timeout'] = int(statement_timeout)
+            else:
+                connect_args = options.setdefault('connect_args', {})
+                connect_args['options'] = f"-c statement_timeout={int(statement_timeout)}"
+
+    def create_engine(self, sa_url, engine_opts):
+        statement_timeout = engine_opts.pop('_transaction_statement_timeout', None)
+        engine = super().create_engine(sa_url, engine_opts)
+        _track_idle_in_transaction(engine)
+        if statement_timeout:
+            event.listen(engine, 'begin', _set_transaction_statement_timeout(statement_timeout))
+        return engine
+
+    @staticmethod
+    def get_replica_uris(app) -> dict:
+        uris = app.config.get('DATABASE_REPLICA_URIS', None) or ''
+        if isinstance(uris, str):
+            uris = [u.strip() for u in uris.split(',') if u.strip()]
+        return {f"{REPLICA_BIND_PREFIX}{i}": uri for i, uri in enumerate(uris)}
+
+    def make_connector(self, app=None, bind=None):
+        if bind is not None and bind.startswith(REPLICA_BIND_PREFIX):
+            app = self.get_app(app)
+            return _ReplicaConnector(self, app, bind, self.get_replica_uris(app)[bind])
+        return super().make_connector(app=app, bind=bind)
+
+    def get_replica_engine(self, app=None):
+        """
+        Return the engine of a replica whose lag is within `DATABASE_REPLICA_MAX_LAG` seconds
+        (None if there is no such replica)
+        """
+        app = self.get_app(app)
+        binds = list(self.get_replica_uris(app))
+        if not binds:
+            return None
+        max_lag = float(app.config.get('DATABASE_REPLICA_MAX_LAG', 5))
+        random.shuffle(binds)
+        for bind in binds:
+            engine = self.get_engine(app, bind=bind)
+            connector = get_state(app).connectors[bind]
+            now = time.time()
+            if now - connector.lag_checked_at > REPLICA_LAG_CHECK_INTERVAL:
+                try:
+                    with engine.connect() as connection:
+                        connector.lag = float(connection.execute(REPLICA_LAG_QUERY).scalar())
+                except Exception as e:
+                    logger.warning("Unable to check the lag of the replica %s: %s", bind, str(e))
+                    connector.lag = None
+                connector.lag_checked_at = now
+            if connector.lag is not None and connector.lag <= max_lag:
+                return engine
+            logger.debug("Replica %s skipped (lag: %r)", bind, connector.lag)
+        return None
+
+
 # set DB instance
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+
+
+def read_only(func):
+    """
+    Run `func` with the transaction policy of read-only operations:
+    queries run in `READ ONLY` transactions routed to the read replicas (if any),
+    which are released while waiting on external services (see `outbound_io`).
+    The primary is used as fallback and, with read-write transactions, after the first write.
+    The transaction already open (if it has not written anything) is ended before `func` runs.
+    The previous policy of the session is restored when `func` returns.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = db.session()
+        use_replicas, read_only = session.use_replicas, session.read_only
+        session.use_replicas = session.read_only = True
+        try:
+            if not read_only:
+                # end the transaction opened before switching the policy
+                # (e.g., by the authorization of the request):
+                # the queries of `func` run in new read-only transactions
+                session.release()
+            return func(*args, **kwargs)
+        finally:
+            try:
+                if not read_only:
+                    # end the read-only transaction: the next statements
+                    # of the session run on the primary in read-write transactions
+                    session.release()
+            except SQLAlchemyError as e:
+                logger.debug(e)
+                session.rollback()
+            finally:
+                session.use_replicas, session.read_only = use_replicas, read_only
+    return wrapper
+
+
+@contextmanager
+def outbound_io():
+    """
+    Release the DB connections of the current read-only session (if any)
+    while waiting on an external service (e.g., a registry or a testing service)
+    """
+    if has_app_context():
+        db.session().release()
+    yield
 
 
 def get_db_connection_param(name, settings=None):
@@ -127,3 +472,83 @@ def drop_db(conn_params=None, settings=None):
         logger.debug('database %s dropped', conn_params['dbname'])
     finally:
         con.close()
+
+
+def _cascade_deletes(connection):
+    # the names of the constraints depend on how the tables have been created:
+    # replace the existing foreign keys, whatever their name
+    inspector = inspect(connection)
+    for table, column, ref_table, ref_column in [
+            ('workflow', 'id', 'resource', 'id'),
+            ('ro_crate', 'id', 'resource', 'id'),
+            ('ro_crate', 'hosting_service_id', 'resource', 'id'),
+            ('workflow_version', 'id', 'ro_crate', 'id'),
+            ('workflow_version', 'workflow_id', 'workflow', 'id'),
+            ('test_suite', 'workflow_version_id', 'workflow_version', 'id'),
+            ('test_instance', 'test_suite_uuid', 'test_suite', 'uuid'),
+            ('testing_service', 'uuid', 'test_instance', 'uuid')]:
+        drops = ''.join(f'DROP CONSTRAINT "{fk["name"]}", ' for fk in inspector.get_foreign_keys(table)
+                        if fk['constrained_columns'] == [column] and fk['referred_table'] == ref_table)
+        connection.execute(f'ALTER TABLE {table} {drops}'
+                           f'ADD CONSTRAINT {table}_{column}_fkey FOREIGN KEY ({column}) '
+                           f'REFERENCES {ref_table} ({ref_column}) ON DELETE CASCADE')
+
+
+# Schema migrations of existing DBs:
+# `db.create_all()` creates the missing tables but it doesn't alter the existing ones.
+# Migrations are applied in order and tracked on the `schema_migration` table;
+# their steps (i.e., SQL statements or functions of the connection) must be idempotent,
+# since they also run on DBs just created from the current models.
+SCHEMA_MIGRATIONS = [
+    (1, "Index the hot lookups", [
+        'CREATE INDEX IF NOT EXISTS ix_resource_uuid ON resource (uuid)',
+        'CREATE INDEX IF NOT EXISTS ix_resource_uri ON resource (uri)',
+        'CREATE INDEX IF NOT EXISTS ix_permission_resource_id ON permission (resource_id)',
+        'CREATE INDEX IF NOT EXISTS ix_api_key_user_id ON api_key (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_external_service_access_authorization_user_id '
+        'ON external_service_access_authorization (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_oauth2_identity_provider_type ON oauth2_identity_provider (type)',
+        'CREATE INDEX IF NOT EXISTS ix_oauth2_identity_provider_id_id ON oauth2_identity (provider_id, id)',
+        'CREATE INDEX IF NOT EXISTS ix_ro_crate_hosting_service_id ON ro_crate (hosting_service_id)',
+        'CREATE INDEX IF NOT EXISTS ix_workflow_version_workflow_id ON workflow_version (workflow_id)',
+        'CREATE INDEX IF NOT EXISTS ix_workflow_version_submitter_id ON workflow_version (submitter_id)',
+        'CREATE INDEX IF NOT EXISTS ix_test_suite_workflow_version_id ON test_suite (workflow_version_id)',
+        'CREATE INDEX IF NOT EXISTS ix_test_instance_test_suite_uuid ON test_instance (test_suite_uuid)',
+        'CREATE INDEX IF NOT EXISTS ix_testing_service_type ON testing_service (type)',
+    ]),
+    (2, "Cascade the deletes of workflows and test suites", [_cascade_deletes]),
+]
+
+
+def get_applied_migrations(connection) -> set:
+    connection.execute('CREATE TABLE IF NOT EXISTS schema_migration ('
+                       'version INTEGER PRIMARY KEY, description VARCHAR, '
+                       'applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)')
+    return {row[0] for row in connection.execute('SELECT version FROM schema_migration')}
+
+
+def upgrade_db(engine=None) -> list:
+    """
+    Apply the pending schema migrations
+    :return: the versions of the applied migrations
+    """
+    engine = engine or db.engine
+    applied = []
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        with engine.begin() as connection:
+            if version in get_applied_migrations(connection):
+                continue
+            # serialize concurrent upgrades (e.g., replicated init jobs)
+            connection.execute('LOCK TABLE schema_migration IN EXCLUSIVE MODE')
+            if version in get_applied_migrations(connection):
+                continue
+            logger.info("Applying schema migration %d: %s", version, description)
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(statement)
+            connection.execute('INSERT INTO schema_migration (version, description) VALUES (%s, %s)',
+                               (version, description))
+            applied.append(version)
+    return applied
@@ -48,7 +48,7 @@ class LifeMonitorException(Exception):
         return f"[{self.status}] {self.title}: {self.detail}"
 
     def to_json(self):
-        return serializers.ProblemDetailsSchema().dumps(self)
+        return serializers.ProblemDetailsSchema.get_instance().dumps(self)
 
 
 class NotImplementedException(LifeMonitorException):
@@ -133,6 +133,14 @@ class NotValidROCrateException(LifeMonitorException):
                          detail=detail, status=status, **kwargs)
 
 
+class ScratchQuotaExceededException(LifeMonitorException):
+
+    def __init__(self, detail="Scratch space quota exceeded",
+                 type="about:blank", status=507, instance=None, **kwargs):
+        super().__init__(title="Insufficient storage",
+                         detail=detail, status=status, **kwargs)
+
+
 class WorkflowRegistryNotSupportedException(LifeMonitorException):
 
     def __init__(self, detail="Workflow Registry not supported",
@@ -200,7 +208,7 @@ def report_problem(status, title, detail=None, type=None, instance=None, extra_i
     if extra_info:
         problem_response['extra_info'] = extra_info
 
-    return Response(response=serializers.ProblemDetailsSchema().dumps(problem_response),
+    return Response(response=serializers.ProblemDetailsSchema.get_instance().dumps(problem_response),
                     status=status, mimetype="application/problem+json")
 
 
@@ -52,3 +52,5 @@ unauthorized_user_with_expired_registry_token = ("The current token issued by th
                                                  "to start the authorization flow")
 invalid_log_offset = "Invalid offset: it should be a positive integer"
 invalid_log_limit = "Invalid limit: it should be a positive integer"
+invalid_cursor = "Invalid cursor: it should be the one of a previous page"
+too_many_batch_items = "Too many items: at most {} workflows can be registered with a single request"
@@ -0,0 +1,232 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import shutil
+import socket
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from .exceptions import ScratchQuotaExceededException
+
+# set module level logger
+logger = logging.getLogger(__name__)
+
+# prefix of the directories of scratch operations
+OPERATION_PREFIX = "lm-scratch"
+# name of the file tracking the space reserved by a scratch operation
+USAGE_FILENAME = ".usage"
+# name of the file locked by the process running a scratch operation
+OWNER_FILENAME = ".owner"
+# space reserved at once by scratch operations (to limit lock contention)
+RESERVATION_BLOCK_SIZE = 1 << 20
+
+
+def _to_bytes(value):
+    return int(value) if value not in (None, '') else None
+
+
+class ScratchOperation:
+    """
+    A private directory of the scratch space, used by a single operation
+    (e.g., the download and extraction of an RO-Crate), whose size is bounded
+    by both the per-operation and the global quota of the scratch space.
+    """
+
+    def __init__(self, space: ScratchSpace, path: Path) -> None:
+        self.space = space
+        self.path = path
+        self.used = 0
+        self.reserved = 0
+
+    def __repr__(self) -> str:
+        return f"<ScratchOperation {self.path}: used={self.used}, reserved={self.reserved}>"
+
+    def reserve(self, size):
+        """ Account `size` bytes before writing them to the scratch space """
+        if self.used + size > self.reserved:
+            needed = self.used + size - self.reserved
+            quota = self.space.operation_quota
+            if quota is not None and self.used + size > quota:
+                raise ScratchQuotaExceededException(
+                    detail=f"Scratch operation quota exceeded ({quota} bytes)")
+            block = max(needed, RESERVATION_BLOCK_SIZE)
+            if quota is not None:
+                block = min(block, quota - self.reserved)
+            self.reserved = self.space._reserve(self, block, needed)
+        self.used += size
+
+    def writer(self, output_stream):
+        """ Wrap `output_stream` to enforce quotas on the written data """
+        return _QuotaWriter(self, output_stream)
+
+
+class _QuotaWriter:
+
+    def __init__(self, operation: ScratchOperation, output_stream) -> None:
+        self.operation = operation
+        self.output_stream = output_stream
+
+    def write(self, data):
+        self.operation.reserve(len(data))
+        return self.output_stream.write(data)
+
+
+class ScratchSpace:
+    """
+    Managed scratch space used to store temporary data, e.g., downloaded RO-Crates.
+
+    The space is shared by all the processes of the application:
+    every operation works on its own directory and the space it uses
+    is tracked on the filesystem, so that the global quota can be
+    enforced across processes. The process running an operation
+    holds a lock on its directory until the operation completes,
+    so that orphaned directories left by crashed processes
+    can be detected (even if their pid has been reused) and removed.
+    """
+
+    def __init__(self, path=None, operation_quota=None, quota=None) -> None:
+        self.configure(path=path, operation_quota=operation_quota, quota=quota)
+
+    def configure(self, path=None, operation_quota=None, quota=None):
+        self.path = Path(path or tempfile.gettempdir())
+        self.operation_quota = _to_bytes(operation_quota)
+        self.quota = _to_bytes(quota)
+
+    def init_app(self, app):
+        self.configure(path=app.config.get("SCRATCH_PATH"),
+                       operation_quota=app.config.get("SCRATCH_OPERATION_QUOTA"),
+                       quota=app.config.get("SCRATCH_QUOTA"))
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.cleanup()
+
+    @property
+    def _lock_path(self):
+        return self.path / f".{OPERATION_PREFIX}.lock"
+
+    @contextmanager
+    def _lock(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _operation_paths(self):
+        return [p for p in self.path.glob(f"{OPERATION_PREFIX}-*") if p.is_dir()]
+
+    @staticmethod
+    def _read_usage(path: Path):
+        try:
+            with open(path / USAGE_FILENAME) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _reserve(self, operation: ScratchOperation, size, min_size):
+        with self._lock():
+            if self.quota is not None:
+                available = self.quota - self._get_reserved()
+                if available < min_size:
+                    raise ScratchQuotaExceededException(
+                        detail=f"Scratch space quota exceeded ({self.quota} bytes)")
+                size = min(size, available)
+            reserved = operation.reserved + size
+            with open(operation.path / USAGE_FILENAME, "w") as f:
+                f.write(str(reserved))
+            return reserved
+
+    def _get_reserved(self):
+        return sum(self._read_usage(p) for p in self._operation_paths())
+
+    @contextmanager
+    def operation(self):
+        """ Create a scratch operation whose directory is removed on exit """
+        self.path.mkdir(parents=True, exist_ok=True)
+        # the directory is created and locked atomically with respect to `cleanup`
+        with self._lock():
+            path = Path(tempfile.mkdtemp(
+                prefix=f"{OPERATION_PREFIX}-{socket.gethostname()}-{os.getpid()}-", dir=self.path))
+            owner = open(path / OWNER_FILENAME, "w")
+            fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        logger.debug("Scratch operation started @ %s", path)
+        try:
+            yield ScratchOperation(self, path)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            owner.close()
+            logger.debug("Scratch operation @ %s completed", path)
+
+    @staticmethod
+    def _is_orphaned(path: Path):
+        # the lock on the owner file is released by the OS when its process terminates
+        try:
+            with open(path / OWNER_FILENAME, "a") as owner:
+                fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(owner, fcntl.LOCK_UN)
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            logger.debug("Unable to check the owner of the scratch directory %s: %s", path, e)
+            return False
+        return True
+
+    def cleanup(self):
+        """
+        Remove the directories of scratch operations
+        left by terminated processes of this host.
+        Return the list of removed directories.
+        """
+        removed = []
+        hostname = socket.gethostname()
+        with self._lock():
+            for path in self._operation_paths():
+                try:
+                    host, _, _ = path.name[len(OPERATION_PREFIX) + 1:].rsplit('-', 2)
+                except ValueError:
+                    continue
+                if host != hostname or not self._is_orphaned(path):
+                    continue
+                logger.info("Removing orphaned scratch directory %s", path)
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+        return removed
+
+    def get_usage(self):
+        """ Report the current usage of the scratch space """
+        operations = self._operation_paths()
+        return {
+            "path": str(self.path),
+            "operations": len(operations),
+            "reserved": sum(self._read_usage(p) for p in operations),
+            "quota": self.quota,
+            "operation_quota": self.operation_quota,
+            "free": shutil.disk_usage(self.path).free
+        }
+
+
+# default scratch space of the application
+scratch_space = ScratchSpace()
@@ -18,21 +18,91 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from __future__ import annotations
+
 import logging
 
+import flask
+from connexion.apis.flask_api import FlaskApi
+from connexion.jsonifier import Jsonifier
 from flask_marshmallow import Marshmallow
 from marshmallow import fields, post_dump, post_load, pre_load
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 ma = Marshmallow()
 
+# shared schema instances (see `BaseSchema.get_instance`)
+_schema_instances = {}
+
+
+def _hashable(value):
+    # lists and sets of field names (e.g., `only`, `exclude`) as cache key parts
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+class JSONEncoder(flask.json.JSONEncoder):
+    """
+    JSON encoder of the app: the documents are encoded by orjson, when available,
+    falling back to the encoder of Flask for the pretty-printed ones
+    """
+
+    def __init__(self, **kwargs):
+        if kwargs.get('indent') is None and kwargs.get('separators') is None:
+            kwargs['separators'] = (',', ':')
+        super().__init__(**kwargs)
+
+    def encode(self, o):
+        if orjson is None or self.indent is not None:
+            return super().encode(o)
+        # dates and dataclasses are left to `default`
+        # to be encoded as by the Flask encoder
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+
+class Api(FlaskApi):
+    """ Connexion API which encodes its responses with the JSON encoder of the app """
+
+    @classmethod
+    def _set_jsonifier(cls):
+        # compact documents: the Connexion default is indent=2
+        cls.jsonifier = Jsonifier(flask.json)
+
 
 class BaseSchema(ma.SQLAlchemySchema):
     # Custom options
     __envelope__ = {"single": None, "many": None}
     __model__ = None
 
+    @classmethod
+    def get_instance(cls, **kwargs) -> BaseSchema:
+        """
+        Return an instance of the schema built with `kwargs` (e.g., `only`),
+        created on first use and shared by the following serializations
+        (options that cannot be hashed, e.g., `context`, get a new instance)
+        """
+        try:
+            key = (cls, tuple(sorted((name, _hashable(value)) for name, value in kwargs.items())))
+            hash(key)
+        except TypeError:
+            return cls(**kwargs)
+        schema = _schema_instances.get(key)
+        if schema is None:
+            schema = _schema_instances.setdefault(key, cls(**kwargs))
+        return schema
+
     def get_envelope_key(self, many):
         """Helper to get the envelope key."""
         return self.__envelope__.get("many", None) if many\
@@ -24,8 +24,10 @@ Test metadata support.
 Specs: https://github.com/crs4/life_monitor/wiki/Test-Metadata-Draft-Spec
 """
 
+import hashlib
 import json
-from collections import Mapping
+import threading
+from collections import Mapping, OrderedDict
 from pathlib import Path
 
 import yaml
@@ -44,6 +46,49 @@ _TO_OLD_TYPES = {
 }
 
 
+class TestSuiteDefinition:
+    """\
+    Compiled test definition of a test suite: tests are also indexed by name.
+    """
+
+    __slots__ = ('tests', 'by_name')
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(tuple(Test.from_json(_) for _ in data["test"]))
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.by_name = {t.name: t for t in tests}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}{self.tests}"
+
+
+_COMPILED_CACHE_SIZE = 1024
+_compiled_definitions = OrderedDict()
+_compiled_definitions_lock = threading.Lock()
+
+
+def compile_test_definition(data):
+    """\
+    Return the (shared and read-only) TestSuiteDefinition of the JSON
+    test definition `data`, memoized by the hash of its content.
+    """
+    key = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    with _compiled_definitions_lock:
+        definition = _compiled_definitions.get(key)
+        if definition is not None:
+            _compiled_definitions.move_to_end(key)
+            return definition
+    definition = TestSuiteDefinition.from_json(data)
+    with _compiled_definitions_lock:
+        _compiled_definitions[key] = definition
+        if len(_compiled_definitions) > _COMPILED_CACHE_SIZE:
+            _compiled_definitions.popitem(last=False)
+    return definition
+
+
 # TODO: check if this is a solved problem somewhere
 def norm_abs_path(path, ref_path):
     """\
@@ -68,6 +113,8 @@ def paths_to_abs(data, ref_path):
 
 class Service:
 
+    __slots__ = ('type', 'url', 'resource')
+
     @classmethod
     def from_json(cls, data):
         return cls(data["type"], data["url"], data["resource"])
@@ -83,6 +130,8 @@ class Service:
 
 class Instance:
 
+    __slots__ = ('name', 'service')
+
     @classmethod
     def from_json(cls, data):
         if not data:
@@ -99,6 +148,8 @@ class Instance:
 
 class TestEngine:
 
+    __slots__ = ('type', 'version')
+
     @classmethod
     def from_json(cls, data):
         return cls(data["type"], data["version"])
@@ -114,6 +165,8 @@ class TestEngine:
 
 class TestDefinition:
 
+    __slots__ = ('engine', 'path')
+
     @classmethod
     def from_json(cls, data):
         if not data:
@@ -131,18 +184,22 @@ class TestDefinition:
 
 class Test:
 
+    __slots__ = ('name', 'instance', 'definition', 'specification')
+
     @classmethod
     def from_json(cls, data):
         return cls(
             data["name"],
             [Instance.from_json(_) for _ in data.get("instance", [])],
-            TestDefinition.from_json(data.get("definition", {}))
+            TestDefinition.from_json(data.get("definition", {})),
+            data.get("specification")
         )
 
-    def __init__(self, name, instance, definition):
+    def __init__(self, name, instance, definition, specification=None):
         self.name = name
         self.instance = instance
         self.definition = definition
+        self.specification = specification
 
     def __repr__(self):
         return f"{self.__class__.__name__}{self.name, self.instance, self.definition}"
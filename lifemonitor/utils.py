@@ -18,25 +18,36 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import base64
 import glob
+import hashlib
+import hmac
 import json
 import logging
+import mmap
+import os
 import random
 import shutil
 import socket
 import string
 import tempfile
+import threading
+import time
 import urllib
 import uuid
 import functools
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
 from os.path import basename, dirname, isfile, join
+from typing import List, Optional
 
 import flask
 import requests
 
-from .exceptions import NotAuthorizedException, NotValidROCrateException
+from .exceptions import (NotAuthorizedException, NotValidROCrateException,
+                         ScratchQuotaExceededException)
 
 logger = logging.getLogger()
 
@@ -58,6 +69,30 @@ def uuid_param(uuid_value) -> uuid.UUID:
     return uuid_value
 
 
+class Page(list):
+    """
+    A page of a keyset-paginated listing:
+    `next_key` is the key after which the next page starts (None on the last page)
+    """
+
+    def __init__(self, items=(), next_key=None):
+        super().__init__(items)
+        self.next_key = next_key
+
+
+def encode_cursor(key) -> str:
+    """ Encode a pagination key as an opaque cursor """
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """ Decode the pagination key of an opaque cursor """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'") from e
+
+
 def to_camel_case(snake_str) -> str:
     """
     Convert snake_case string to a camel_case string
@@ -67,6 +102,12 @@ def to_camel_case(snake_str) -> str:
     return ''.join(x.title() for x in snake_str.split('_'))
 
 
+@functools.lru_cache(maxsize=None)
+def get_host_address():
+    """ Return the address of this host, resolved once per process """
+    return socket.gethostbyname(socket.gethostname())
+
+
 def get_base_url():
     server_name = None
     try:
@@ -74,7 +115,7 @@ def get_base_url():
     except RuntimeError as e:
         logger.warning(str(e))
     if server_name is None:
-        server_name = f"{socket.gethostbyname(socket.gethostname())}:8000"
+        server_name = f"{get_host_address()}:8000"
     return f"https://{server_name}"
 
 
@@ -93,37 +134,189 @@ def _download_from_remote(url, output_stream, authorization=None):
             session.headers['Authorization'] = authorization
         with session.get(url, stream=True) as r:
             if r.status_code == 401 or r.status_code == 403:
-                raise NotAuthorizedException(details=r.content)
+                raise NotAuthorizedException(details=r.content, status=r.status_code)
             r.raise_for_status()
             for chunk in r.iter_content(chunk_size=8192):
                 output_stream.write(chunk)
 
 
-def download_url(url, target_path=None, authorization=None):
+def download_url(url, target_path=None, authorization=None, scratch_operation=None):
     if not target_path:
         target_path = tempfile.mktemp()
     parsed_url = urllib.parse.urlparse(url)
     if parsed_url.scheme == '' or parsed_url.scheme == 'file':
+        if scratch_operation:
+            scratch_operation.reserve(os.path.getsize(parsed_url.path))
         shutil.copyfile(parsed_url.path, target_path)
     else:
         with open(target_path, 'wb') as fd:
-            _download_from_remote(url, fd, authorization)
+            _download_from_remote(url, scratch_operation.writer(fd) if scratch_operation else fd,
+                                  authorization)
     return target_path
 
 
-def extract_zip(archive_path, target_path=None):
+def _get_url_host(url):
+    return urllib.parse.urlparse(url).netloc
+
+
+class ValidAuthorizations:
+    """
+    Per-host memory of the authorization header known to grant access to the host.
+
+    Only a keyed digest of the header is stored (i.e., an identifier of the credential,
+    not the credential itself): entries expire after TTL seconds and
+    only the MAX_SIZE most recently used hosts are remembered.
+    """
+
+    TTL = 600
+    MAX_SIZE = 1024
+
+    def __init__(self) -> None:
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, authorization) -> Optional[str]:
+        if authorization is None:
+            return None
+        return hmac.new(self._key, authorization.encode(), hashlib.sha256).hexdigest()
+
+    def remember(self, url, authorization):
+        with self._lock:
+            host = _get_url_host(url)
+            self._entries.pop(host, None)
+            self._entries[host] = (self._digest(authorization), time.monotonic() + self.TTL)
+            while len(self._entries) > self.MAX_SIZE:
+                self._entries.popitem(last=False)
+
+    def forget(self, url):
+        with self._lock:
+            self._entries.pop(_get_url_host(url), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def find(self, url, authorizations: List) -> int:
+        """ Return the index of the authorization known to be valid for the host of `url` (or -1) """
+        host = _get_url_host(url)
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None:
+                return -1
+            if entry[1] < time.monotonic():
+                del self._entries[host]
+                return -1
+            self._entries.move_to_end(host)
+        digests = [self._digest(a) for a in authorizations]
+        return digests.index(entry[0]) if entry[0] in digests else -1
+
+
+valid_authorizations = ValidAuthorizations()
+
+
+def remember_authorization(url, authorization):
+    valid_authorizations.remember(url, authorization)
+
+
+def forget_authorization(url):
+    valid_authorizations.forget(url)
+
+
+def probe_url(url, authorization=None, timeout=10):
+    """
+    Check whether `url` can be accessed with the given authorization header
+    without downloading its content (i.e., through a HEAD request or a 1-byte range GET).
+    Return the HTTP status code or None if the remote server cannot be reached.
+    """
+    headers = {'Authorization': authorization} if authorization else {}
+    try:
+        with requests.Session() as session:
+            r = session.head(url, headers=headers, allow_redirects=True, timeout=timeout)
+            if r.status_code in (405, 501):
+                headers['Range'] = 'bytes=0-0'
+                with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                    pass
+            return r.status_code
+    except requests.RequestException as e:
+        logger.debug(e)
+        return None
+
+
+def probe_authorizations(url, authorizations):
+    """
+    Return the authorization headers to be used (in order) to download `url`.
+
+    If one of the `authorizations` is already known to be valid for the host of `url`
+    it is returned first; otherwise all the `authorizations` are probed concurrently and
+    the first one (wrt the given order) which grants access to `url` is returned.
+    An empty list means that none of the `authorizations` grants access to `url`,
+    while the original list is returned when probing is not conclusive.
+    """
+    authorizations = list(authorizations)
+    parsed_url = urllib.parse.urlparse(url)
+    if parsed_url.scheme in ('', 'file') or len(authorizations) == 0:
+        return authorizations[:1]
+    known = valid_authorizations.find(url, authorizations)
+    if known >= 0:
+        logger.debug("Using known authorization for %s", parsed_url.netloc)
+        return [authorizations[known]] + authorizations[:known] + authorizations[known + 1:]
+    with ThreadPoolExecutor(max_workers=len(authorizations)) as executor:
+        status_codes = list(executor.map(lambda a: probe_url(url, a), authorizations))
+    logger.debug("Probed authorizations for %s: %r", url, status_codes)
+    for authorization, status_code in zip(authorizations, status_codes):
+        if status_code is not None and 200 <= status_code < 300:
+            return [authorization]
+    if all(status_code in (401, 403) for status_code in status_codes):
+        return []
+    return authorizations
+
+
+def extract_zip(archive_path, target_path=None, scratch_operation=None):
     logger.debug("Archive path: %r", archive_path)
     logger.debug("Target path: %r", target_path)
     try:
         if not target_path:
             target_path = tempfile.mkdtemp()
         with zipfile.ZipFile(archive_path, "r") as zip_ref:
+            if scratch_operation:
+                # members cannot be extracted beyond their declared size
+                scratch_operation.reserve(sum(m.file_size for m in zip_ref.infolist()))
             zip_ref.extractall(target_path)
         return target_path
+    except ScratchQuotaExceededException:
+        raise
     except Exception as e:
         raise NotValidROCrateException(e)
 
 
+def get_local_path(url):
+    """ Return the local filesystem path referenced by `url` or None if `url` is not local """
+    parsed_url = urllib.parse.urlparse(url)
+    if parsed_url.scheme == '' or parsed_url.scheme == 'file':
+        return urllib.parse.unquote(parsed_url.path)
+    return None
+
+
+class _MemoryMappedFile(mmap.mmap):
+    # file-like interface required by zipfile
+    def seekable(self):
+        return True
+
+
+def extract_local_zip(archive_path, target_path=None, scratch_operation=None):
+    """
+    Extract a local ZIP archive reading its members in place,
+    i.e., through a read-only memory map of the archive file.
+    """
+    try:
+        with open(archive_path, "rb") as f, \
+                _MemoryMappedFile(f.fileno(), 0, access=mmap.ACCESS_READ) as archive:
+            return extract_zip(archive, target_path=target_path, scratch_operation=scratch_operation)
+    except (OSError, ValueError) as e:
+        raise NotValidROCrateException(e)
+
+
 def load_test_definition_filename(filename):
     with open(filename) as f:
         return json.load(f)
@@ -0,0 +1,102 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Bulk seeding of synthetic datasets for the benchmarks
+"""
+
+import uuid
+from datetime import datetime
+
+from lifemonitor.api.models import (ROCrate, TestInstance, TestingService,
+                                    TestSuite, Workflow, WorkflowVersion, db)
+from lifemonitor.auth.models import (ExternalServiceAccessAuthorization,
+                                     Permission, Resource, User)
+from lifemonitor.auth.oauth2.client.models import OAuthIdentity
+
+VERSIONS_PER_WORKFLOW = 10
+WORKFLOWS_PER_USER = 10
+
+
+def next_id(table):
+    return (db.session.execute(f"SELECT COALESCE(MAX(id), 0) FROM \"{table}\"").scalar() or 0) + 1
+
+
+def populate(registry, submitter, num_versions, permissions=False, suites=False):
+    """
+    Add `num_versions` workflow versions to the registry (and their users) with bulk inserts.
+    With `permissions`, each user owns its workflows;
+    with `suites`, each version gets a test suite with one test instance.
+    :return: (uuid of the first workflow, id of the last workflow, id of the last user)
+    """
+    num_workflows = num_versions // VERSIONS_PER_WORKFLOW
+    resource_id = next_id("resource")
+    user_id = next_id("user")
+    auth_id = next_id("external_service_access_authorization")
+    resources, workflows, crates, versions = [], [], [], []
+    users, auths, identities = [], [], []
+    permission_rows, suite_rows, instances, services = [], [], [], []
+    now = datetime.utcnow()
+    for i in range(num_workflows):
+        w_id = resource_id
+        resource_id += 1
+        identifier = f"{w_id}"
+        resources.append({"id": w_id, "uuid": uuid.uuid4(), "type": "workflow",
+                          "uri": f"{Workflow.external_ns}{identifier}", "created": now, "modified": now})
+        workflows.append({"id": w_id})
+        for v in range(VERSIONS_PER_WORKFLOW):
+            resources.append({"id": resource_id, "uuid": uuid.uuid4(), "type": "workflow_version",
+                              "uri": f"https://registry.org/workflows/{identifier}/{v}",
+                              "version": str(v), "created": now, "modified": now})
+            crates.append({"id": resource_id, "hosting_service_id": registry.id})
+            versions.append({"id": resource_id, "submitter_id": submitter.id, "workflow_id": w_id})
+            if permissions:
+                permission_rows.append({"user_id": user_id, "resource_id": resource_id, "roles": ["owner"]})
+            if suites:
+                suite_uuid, instance_uuid = uuid.uuid4(), uuid.uuid4()
+                suite_rows.append({"uuid": suite_uuid, "workflow_version_id": resource_id,
+                                   "test_definition": {}, "submitter_id": submitter.id})
+                instances.append({"uuid": instance_uuid, "test_suite_uuid": suite_uuid, "name": "test",
+                                  "resource": f"job/{instance_uuid}", "submitter_id": submitter.id})
+                services.append({"uuid": instance_uuid, "type": "jenkins_testing_service",
+                                 "url": f"https://ci.org/{instance_uuid}"})
+            resource_id += 1
+        if permissions:
+            permission_rows.append({"user_id": user_id, "resource_id": w_id, "roles": ["owner"]})
+        if (i + 1) % WORKFLOWS_PER_USER == 0 or i == num_workflows - 1:
+            users.append({"id": user_id, "username": f"user{user_id}"})
+            auths.append({"id": auth_id, "type": "oauth2_identity", "user_id": user_id})
+            identities.append({"id": auth_id, "provider_user_id": str(user_id),
+                               "provider_id": registry._server_id, "created_at": now})
+            user_id += 1
+            auth_id += 1
+    for model, rows in ((Resource, resources), (Workflow, workflows), (ROCrate, crates),
+                        (WorkflowVersion, versions), (User, users),
+                        (ExternalServiceAccessAuthorization, auths), (OAuthIdentity, identities),
+                        (Permission, permission_rows), (TestSuite, suite_rows),
+                        (TestInstance, instances), (TestingService, services)):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+    for table in ("resource", "user", "external_service_access_authorization"):
+        db.session.execute(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                           f"(SELECT MAX(id) FROM \"{table}\"))")
+    db.session.commit()
+    db.session.execute("ANALYZE")
+    return resources[0]["uuid"], workflows[-1]["id"], users[-1]["id"]
@@ -0,0 +1,126 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Query plans of the hot lookups of the LifeMonitor service:
+on a large catalog they should scan the large tables only through indexes.
+
+Run with: RUN_BENCHMARKS=1 pytest tests/benchmarks
+"""
+
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+import pytest
+from lifemonitor.api import models
+from lifemonitor.api.services import LifeMonitor
+from lifemonitor.auth.models import User
+from lifemonitor.db import upgrade_db
+from sqlalchemy import event
+from tests.benchmarks.seed import populate
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"),
+                                reason="set RUN_BENCHMARKS to run benchmarks")
+
+NUMBER_OF_VERSIONS = int(os.getenv("BENCHMARK_VERSIONS", 50000))
+
+# tables which grow with the catalog
+LARGE_TABLES = {
+    "resource", "workflow", "ro_crate", "workflow_version", "permission",
+    "user", "external_service_access_authorization", "oauth2_identity",
+    "test_suite", "test_instance", "testing_service"
+}
+
+
+@contextmanager
+def _captured_queries():
+    queries = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            queries.append((statement, parameters))
+
+    event.listen(models.db.engine, "before_cursor_execute", capture)
+    try:
+        yield queries
+    finally:
+        event.remove(models.db.engine, "before_cursor_execute", capture)
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _sequential_scans(statement, parameters):
+    connection = models.db.engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    plan = plan if isinstance(plan, list) else json.loads(plan)
+    return [node["Relation Name"] for node in _plan_nodes(plan[0]["Plan"])
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES]
+
+
+@pytest.fixture
+def catalog(app_client, fake_registry, admin_user):
+    upgrade_db()
+    _, workflow_id, user_id = populate(fake_registry, admin_user, NUMBER_OF_VERSIONS,
+                                       permissions=True, suites=True)
+    workflow = models.Workflow.query.get(workflow_id)
+    return {"registry": fake_registry, "workflow": workflow,
+            "user": User.query.get(user_id)}
+
+
+def test_service_lookups_use_indexes(catalog):
+    lm = LifeMonitor.get_instance()
+    registry, workflow, user = catalog["registry"], catalog["workflow"], catalog["user"]
+    lookups = {
+        "get_user_workflow_version": lambda: lm.get_user_workflow_version(
+            user, workflow.uuid, "0", profile=models.LoadingProfile.STATUS),
+        "get_user_workflow (latest)": lambda: lm.get_user_workflow_version(
+            user, workflow.uuid, profile=models.LoadingProfile.DETAIL),
+        "Workflow.get_user_workflows": lambda: models.Workflow.get_user_workflows(user, limit=10),
+        "get_registry_workflow_version": lambda: lm.get_registry_workflow_version(
+            registry, workflow.uuid, profile=models.LoadingProfile.DETAIL),
+        "WorkflowRegistry.get_workflow(identifier)": lambda: registry.get_workflow(workflow.external_id),
+        "WorkflowRegistry.get_user": lambda: registry.get_user(user.id),
+        "WorkflowRegistry.find_by_workflow_uuid": lambda: models.WorkflowRegistry.find_by_workflow_uuid(
+            workflow.uuid),
+    }
+    failures = {}
+    for name, lookup in lookups.items():
+        models.db.session.expire_all()
+        with _captured_queries() as queries:
+            lookup()
+        logger.debug("%s: %d queries", name, len(queries))
+        for statement, parameters in queries:
+            scans = _sequential_scans(statement, parameters)
+            if scans:
+                failures.setdefault(name, []).append((scans, statement))
+    assert not failures, f"Sequential scans of large tables: {failures}"
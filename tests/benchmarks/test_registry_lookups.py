@@ -0,0 +1,70 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmark of the lookups of WorkflowRegistry:
+their cost should not depend on the size of the registry catalog.
+
+Run with: RUN_BENCHMARKS=1 pytest tests/benchmarks
+"""
+
+import logging
+import os
+import statistics
+import time
+
+import pytest
+from lifemonitor.api.models import db
+from tests.benchmarks.seed import populate
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"),
+                                reason="set RUN_BENCHMARKS to run benchmarks")
+
+# max accepted slowdown of lookups when the catalog grows 100x
+MAX_SLOWDOWN = 3
+
+
+def _measure(func, repeat=50):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        db.session.expire_all()
+    return statistics.median(timings)
+
+
+def _measure_lookups(registry, workflow_uuid, workflow_identifier, user_id):
+    return {
+        "get_workflow(uuid)": _measure(lambda: registry.get_workflow(workflow_uuid)),
+        "get_workflow(identifier)": _measure(lambda: registry.get_workflow(str(workflow_identifier))),
+        "get_user": _measure(lambda: registry.get_user(user_id))
+    }
+
+
+def test_registry_lookups_at_scale(app_client, fake_registry, admin_user):
+    small = _measure_lookups(fake_registry, *populate(fake_registry, admin_user, 1000))
+    large = _measure_lookups(fake_registry, *populate(fake_registry, admin_user, 99000))
+    for lookup, timing in small.items():
+        logger.info("%s: %.3f ms (1k versions), %.3f ms (100k versions)",
+                    lookup, timing * 1000, large[lookup] * 1000)
+        assert large[lookup] < timing * MAX_SLOWDOWN, f"{lookup} doesn't scale"
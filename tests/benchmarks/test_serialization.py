@@ -0,0 +1,101 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmark of the encoding of the responses of the workflow list and status endpoints:
+shared schema instances and the app JSON encoder vs. per-call schemas
+and the pretty-printed documents of the Connexion default encoder.
+
+Run with: RUN_BENCHMARKS=1 pytest tests/benchmarks
+"""
+
+import json
+import logging
+import os
+import statistics
+import time
+
+import flask
+import pytest
+from lifemonitor.api import models, serializers
+from lifemonitor.api.models.services.jenkins import (JenkinsTestBuild,
+                                                     JenkinsTestingService)
+from tests.benchmarks.seed import populate
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"),
+                                reason="set RUN_BENCHMARKS to run benchmarks")
+
+NUMBER_OF_VERSIONS = int(os.getenv("BENCHMARK_VERSIONS", 5000))
+# versions whose status is encoded
+NUMBER_OF_STATUSES = 100
+
+BUILD_METADATA = {
+    "number": 1, "building": False, "result": "SUCCESS", "timestamp": 1609459200000,
+    "duration": 60000, "url": "https://ci.org/job/test/1/",
+    "actions": [{"lastBuiltRevision": {"SHA1": "0" * 40}}]
+}
+
+
+def _measure(func, repeat=10):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _legacy_encode(schema_class, data, many=False):
+    return json.dumps(schema_class().dump(data, many=many), indent=2, cls=flask.json.JSONEncoder)
+
+
+def _encode(schema_class, data, many=False):
+    return flask.json.dumps(schema_class.get_instance().dump(data, many=many))
+
+
+@pytest.fixture
+def fake_builds(mocker):
+    mocker.patch.object(JenkinsTestingService, "get_last_test_build",
+                        lambda self, instance: JenkinsTestBuild(self, instance, BUILD_METADATA))
+    mocker.patch.object(JenkinsTestingService, "get_test_build_output",
+                        lambda self, instance, build_number, offset, limit: "Finished: SUCCESS")
+
+
+def test_response_encoding(app_client, fake_registry, admin_user, fake_builds):
+    populate(fake_registry, admin_user, NUMBER_OF_VERSIONS, suites=True)
+    workflows = models.Workflow.query.options(
+        *models.get_loading_options(models.Workflow, models.LoadingProfile.LIST)).all()
+    statuses = [models.WorkflowStatus(v) for v in models.WorkflowVersion.query.options(
+        *models.get_loading_options(models.WorkflowVersion, models.LoadingProfile.STATUS))
+        .limit(NUMBER_OF_STATUSES)]
+    payloads = {
+        "list": (serializers.WorkflowSchema, workflows, True),
+        "status": (serializers.WorkflowStatusSchema, statuses, True)
+    }
+    for name, (schema_class, data, many) in payloads.items():
+        assert json.loads(_encode(schema_class, data, many)) == \
+            json.loads(_legacy_encode(schema_class, data, many)), f"{name}: different documents"
+        legacy = _measure(lambda: _legacy_encode(schema_class, data, many))
+        encoded = _measure(lambda: _encode(schema_class, data, many))
+        logger.info("%s: %.3f ms (per-call schemas, stdlib), %.3f ms (shared schemas, app encoder)",
+                    name, legacy * 1000, encoded * 1000)
+        assert encoded < legacy, f"{name}: encoding is not faster"
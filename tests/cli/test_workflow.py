@@ -0,0 +1,59 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+
+from lifemonitor.api import models
+from lifemonitor.commands import workflow as workflow_commands
+from tests import utils
+
+logger = logging.getLogger(__name__)
+
+
+def test_workflow_register_batch(cli_runner, user1, client_credentials_registry, valid_workflow, tmp_path):
+    workflow = utils.pick_workflow(user1, valid_workflow)
+    batch = tmp_path / "batch.json"
+    batch.write_text(json.dumps([
+        {'uuid': workflow['uuid'], 'version': workflow['version'], 'name': workflow['name']},
+        # the duplicate submission must not break the batch
+        {'uuid': workflow['uuid'], 'version': workflow['version']}
+    ]))
+    result = cli_runner.invoke(workflow_commands.register_batch, [
+        str(batch),
+        "--submitter", user1['user'].username,
+        "--registry", client_credentials_registry.name,
+        "--workers", "2"
+    ])
+    logger.info(result.output)
+    assert result.exit_code == 0, f"Unexpected exit code: {result.exit_code}"
+    assert f"Workflow {workflow['uuid']} (ver.{workflow['version']}) registered" in result.output, \
+        "Workflow not registered"
+    assert "1 workflows registered, 1 errors" in result.output, "Unexpected summary of the batch"
+    assert models.WorkflowVersion.get_user_workflow_version(
+        user1['user'], workflow['uuid'], workflow['version']) is not None, "Workflow version not registered"
+
+
+def test_workflow_register_batch_unknown_submitter(cli_runner, tmp_path):
+    batch = tmp_path / "batch.json"
+    batch.write_text(json.dumps([]))
+    result = cli_runner.invoke(workflow_commands.register_batch, [str(batch), "--submitter", "unknown"])
+    assert result.exit_code == 99, f"Unexpected exit code: {result.exit_code}"
+    assert "User not found" in result.output, "Missing error message"
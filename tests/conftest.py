@@ -29,8 +29,9 @@ from unittest.mock import MagicMock
 
 import lifemonitor.db as lm_db
 import pytest
-from lifemonitor import auth
-from lifemonitor.api.models import TestSuite, User
+from lifemonitor import auth, utils
+from lifemonitor.api.models import TestSuite, User, latest_builds_cache
+from lifemonitor.api.models.registries import registry
 from lifemonitor.api.services import LifeMonitor
 
 from . import conftest_helpers as helpers
@@ -64,6 +65,19 @@ def headers():
     return helpers.get_headers()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # process-wide caches keyed by DB ids: their entries must not leak to other tests
+    def clear():
+        registry.user_workflows_cache.clear()
+        registry.access_token_cache.clear()
+        latest_builds_cache.invalidate()
+        utils.valid_authorizations.clear()
+    clear()
+    yield
+    clear()
+
+
 @pytest.fixture(autouse=True)
 def initialize(app_settings, request_context):
     helpers.clean_db()
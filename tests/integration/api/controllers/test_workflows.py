@@ -20,14 +20,17 @@
 
 import json
 import logging
+import urllib.parse
 import uuid
 
 import pytest
-from lifemonitor.api import models
+from lifemonitor.api import controllers, models
 from lifemonitor.api.models import WorkflowVersion
 from lifemonitor.auth import current_user
 from lifemonitor.auth.models import ApiKey
 from lifemonitor.auth.oauth2.server.models import Token
+from lifemonitor.db import db
+from lifemonitor.utils import Page
 from tests import utils
 from tests.conftest_types import ClientAuthenticationMethod
 
@@ -88,6 +91,24 @@ def test_empty_workflows(app_client, client_auth_method, user1, user1_auth):
     assert len(data['items']) == 0, "Invalid number of workflows"
 
 
+@pytest.mark.parametrize("client_auth_method", [
+    ClientAuthenticationMethod.API_KEY,
+    ClientAuthenticationMethod.REGISTRY_CODE_FLOW
+], indirect=True)
+def test_read_only_transactions(app_client, client_auth_method, user1, user1_auth, mocker):
+    # the authorization of the request queries the DB before the handler
+    states = []
+
+    def get_workflows(*args, **kwargs):
+        states.append(db.session.execute('SHOW transaction_read_only').scalar())
+        return Page()
+    for name in ("get_user_workflows", "get_registry_workflows"):
+        mocker.patch.object(controllers.lm, name, side_effect=get_workflows)
+    response = app_client.get(utils.build_workflow_path(), headers=user1_auth)
+    utils.assert_status_code(200, response.status_code)
+    assert states == ['on'], "The handler should run in a read-only transaction"
+
+
 @pytest.mark.parametrize("client_auth_method", [
     ClientAuthenticationMethod.CLIENT_CREDENTIALS,
     ClientAuthenticationMethod.REGISTRY_CODE_FLOW
@@ -115,6 +136,31 @@ def test_workflow_registration(app_client, client_auth_method,
         "Response should be equal to the workflow UUID"
 
 
+@pytest.mark.parametrize("client_auth_method", [
+    ClientAuthenticationMethod.CLIENT_CREDENTIALS,
+    ClientAuthenticationMethod.REGISTRY_CODE_FLOW
+], indirect=True)
+def test_workflow_batch_registration(app_client, client_auth_method,
+                                     user1, user1_auth, client_credentials_registry, valid_workflow):
+    workflow = utils.pick_workflow(user1, valid_workflow)
+    if client_auth_method == ClientAuthenticationMethod.CLIENT_CREDENTIALS:  # ClientCredentials case
+        workflow['submitter_id'] = \
+            list(user1["user"].oauth_identity.values())[0].provider_user_id
+    # the second submission of the same version must not break the batch
+    response = app_client.post(f"{utils.build_workflow_path()}/batch",
+                               json={'items': [workflow, dict(workflow)]}, headers=user1_auth)
+    logger.debug("The actual response: %r", response.data)
+    utils.assert_status_code(200, response.status_code)
+    items = json.loads(response.data)['items']
+    assert [i['index'] for i in items] == [0, 1], "Unexpected order of the batch results"
+    assert items[0]['status'] == 201, f"Unexpected result: {items[0]}"
+    assert items[0]['wf_uuid'] == workflow['uuid'] and items[0]['wf_version'] == workflow['version'], \
+        "Result should contain the workflow UUID and version"
+    assert items[1]['status'] == 409, f"Unexpected result of the duplicate submission: {items[1]}"
+    assert models.WorkflowVersion.get_user_workflow_version(
+        user1['user'], workflow['uuid'], workflow['version']) is not None, "Workflow version not registered"
+
+
 @pytest.mark.parametrize("client_auth_method", [
     ClientAuthenticationMethod.CLIENT_CREDENTIALS,
     ClientAuthenticationMethod.REGISTRY_CODE_FLOW
@@ -435,6 +481,38 @@ def test_get_workflows_scope(app_client, client_auth_method,
         assert len(user2_workflows) < len(user1_workflows), "Unexpected number of workflows"
 
 
+@pytest.mark.parametrize("client_auth_method", [
+    #    ClientAuthenticationMethod.BASIC,
+    ClientAuthenticationMethod.API_KEY,
+    ClientAuthenticationMethod.CLIENT_CREDENTIALS
+], indirect=True)
+@pytest.mark.parametrize("user1", [True], indirect=True)
+def test_get_workflows_pages(app_client, client_auth_method, user1, user1_auth):
+    response = app_client.get(utils.build_workflow_path(), headers=user1_auth)
+    assert response.status_code == 200, "Error getting workflows"
+    data = json.loads(response.data)
+    assert 'links' not in data, "Unexpected links of an unpaginated listing"
+    workflows = [w['uuid'] for w in data['items']]
+    assert len(workflows) > 1, "Unexpected number of workflows"
+
+    # follow the 'next' links of the pages
+    paginated_workflows = []
+    path = f"{utils.build_workflow_path()}?limit=1"
+    while path:
+        response = app_client.get(path, headers=user1_auth)
+        assert response.status_code == 200, "Error getting a page of workflows"
+        data = json.loads(response.data)
+        assert len(data['items']) <= 1, "Unexpected number of workflows in the page"
+        paginated_workflows.extend([w['uuid'] for w in data['items']])
+        next_link = data.get('links', {}).get('next')
+        path = None if not next_link else \
+            "{0.path}?{0.query}".format(urllib.parse.urlparse(next_link))
+    assert paginated_workflows == workflows, "Unexpected workflows in the pages"
+
+    response = app_client.get(f"{utils.build_workflow_path()}?limit=1&cursor=invalid!", headers=user1_auth)
+    assert response.status_code == 400, "Invalid cursor should be rejected"
+
+
 @pytest.mark.parametrize("client_auth_method", [
     #    ClientAuthenticationMethod.BASIC,
     ClientAuthenticationMethod.API_KEY,
@@ -18,6 +18,7 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import copy
 import os
 import uuid
 import pytest
@@ -27,6 +28,8 @@ from tests import utils
 from lifemonitor.api.services import LifeMonitor
 import lifemonitor.api.models as models
 import lifemonitor.exceptions as lm_exceptions
+import lifemonitor.test_metadata as tm
+from sqlalchemy import event, inspect
 
 this_dir = os.path.dirname(os.path.abspath(__file__))
 tests_root_dir = pathlib.Path(this_dir).parent
@@ -62,6 +65,32 @@ def test_workflow_registration(app_client, user1, valid_workflow):
     assert isinstance(service, testing_service_type), "Unexpected type for service"
 
 
+def test_workflow_batch_registration(app_client, user1):
+    lm = LifeMonitor.get_instance()
+    workflows = user1['workflows']
+    registry = models.WorkflowRegistry.find_by_uri(workflows[0]['registry_uri'])
+    submissions = [{
+        'roc_link': w['roc_link'],
+        'workflow_submitter': user1['user'],
+        'workflow_version': w['version'],
+        'workflow_uuid': w['uuid'],
+        'name': w['name']
+    } for w in workflows]
+    # submit the first workflow twice to check per-item errors
+    submissions.append(submissions[0].copy())
+    results = lm.register_workflows(submissions, workflow_registry=registry, max_workers=2, chunk_size=2)
+    assert len(results) == len(submissions), "Unexpected number of results"
+    for w, result in zip(workflows, results):
+        assert 'workflow_version' in result, f"Workflow {w['uuid']} not registered: {result.get('error')}"
+        workflow = result['workflow_version']
+        assert isinstance(workflow, models.WorkflowVersion), "Object is not an instance of WorkflowVersion"
+        assert (str(workflow.workflow.uuid), workflow.version) == (w['uuid'], w['version']), \
+            "Unexpected workflow ID"
+    assert isinstance(results[-1]['error'], lm_exceptions.WorkflowVersionConflictException), \
+        "The duplicated submission should raise a conflict"
+    assert len(models.WorkflowVersion.all()) == len(workflows), "Unexpected number of workflow_versions"
+
+
 def test_workflow_registration_same_workflow_by_different_users(app_client, user1, user2):  # , valid_workflow):
 
     lm = LifeMonitor.get_instance()
@@ -255,6 +284,26 @@ def test_workflow_deregistration(app_client, user1, valid_workflow):
     assert w is None, "Workflow must not be in the DB"
 
 
+def test_workflow_purge(app_client, user1, valid_workflow):
+    lm = LifeMonitor.get_instance()
+    # pick and register one workflow
+    wf_data, workflow = utils.pick_and_register_workflow(user1, valid_workflow)
+    suites = [s.uuid for s in workflow.test_suites]
+    instances = [i.uuid for s in workflow.test_suites for i in s.test_instances]
+    assert len(suites) > 0 and len(instances) > 0, "Unexpected number of suites and instances"
+    workflow_ids = lm.get_workflow_ids(submitter=user1["user"], uuids=[wf_data['uuid']])
+    assert workflow_ids == [workflow.workflow.id], "Unexpected workflows to purge"
+    assert lm.purge_workflows(workflow_ids, batch_size=1) == 1, "Unexpected number of purged workflows"
+    # the whole workflow graph must be removed
+    assert models.Workflow.find_by_uuid(wf_data['uuid']) is None, "Workflow must not be in the DB"
+    assert models.WorkflowVersion.get_user_workflow_version(
+        user1["user"], wf_data['uuid'], wf_data['version']) is None, "Workflow version must not be in the DB"
+    for suite_uuid in suites:
+        assert models.TestSuite.find_by_uuid(suite_uuid) is None, "Test suite must not be in the DB"
+    for instance_uuid in instances:
+        assert models.TestInstance.find_by_uuid(instance_uuid) is None, "Test instance must not be in the DB"
+
+
 def test_workflow_deregistration_exception(app_client, user1, random_workflow_id):
     with pytest.raises(lm_exceptions.EntityNotFoundException):
         LifeMonitor.get_instance().deregister_user_workflow(random_workflow_id['uuid'],
@@ -284,6 +333,71 @@ def test_suite_registration(app_client, user1, test_suite_metadata, valid_workfl
         logger.debug("- test instance: %r --> Service: %r,%s", t, t.testing_service, t.testing_service.url)
 
 
+def test_suite_registration_statements(app_client, user1, test_suite_metadata, valid_workflow):
+    lm = LifeMonitor.get_instance()
+    _, workflow = utils.pick_and_register_workflow(user1, valid_workflow)
+    # a suite with many instances of the same service
+    instance = test_suite_metadata['test'][0]['instance'][0]
+    test_suite_metadata['test'] = [
+        {'name': f"test_{i}", 'instance': [{'name': f"instance_{i}", 'service': instance['service']}]}
+        for i in range(20)
+    ]
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args, **kwargs):
+        statements.append(statement)
+
+    event.listen(models.db.engine, 'before_cursor_execute', count_statement)
+    try:
+        suite = lm.register_test_suite(workflow.workflow.uuid, workflow.version,
+                                       user1['user'], test_suite_metadata)
+    finally:
+        event.remove(models.db.engine, 'before_cursor_execute', count_statement)
+    assert len(suite.test_instances) == 20, "Unexpected number of test instances"
+    # the services are resolved with a single query and the instances inserted in a batch
+    assert len([s for s in statements if 'FROM testing_service' in s]) <= 1, "Unexpected service lookups"
+    assert len(statements) < 20, "Unexpected number of statements"
+
+
+def _renamed_tests(test_definition, name):
+    test_definition = copy.deepcopy(test_definition)
+    test_definition['test'][0]['name'] = name
+    return test_definition
+
+
+def test_compiled_test_definitions(test_suite_metadata):
+    definition = tm.compile_test_definition(test_suite_metadata)
+    assert tm.compile_test_definition(copy.deepcopy(test_suite_metadata)) is definition, \
+        "Identical test definitions should be compiled once"
+    assert tm.compile_test_definition(_renamed_tests(test_suite_metadata, "other")) is not definition, \
+        "Different test definitions should be compiled again"
+    for obj in (definition, definition.tests[0], definition.tests[0].instance[0]):
+        assert not hasattr(obj, '__dict__'), f"{obj.__class__.__name__} should only use __slots__"
+
+
+def test_suite_tests_cache(app_client, user1, test_suite_metadata, valid_workflow):
+    lm = LifeMonitor.get_instance()
+    _, workflow = utils.pick_and_register_workflow(user1, valid_workflow)
+    suite = lm.register_test_suite(workflow.workflow.uuid, workflow.version,
+                                   user1['user'], test_suite_metadata)
+    tests = suite.tests
+    assert suite.tests is tests, "Tests should be compiled once"
+    assert not hasattr(tests['test'], '__dict__'), "Tests should only use __slots__"
+    # new definition
+    suite.test_definition = _renamed_tests(test_suite_metadata, "changed")
+    assert set(suite.tests) == {"changed"}, "Tests not compiled after a change of the test definition"
+    models.db.session.commit()
+    # the definition is changed on the database and reloaded
+    table = models.TestSuite.__table__
+    for name, reload in (("refreshed", lambda: models.db.session.refresh(suite)),
+                         ("expired", lambda: models.db.session.expire(suite, ['test_definition']))):
+        models.db.session.execute(table.update().where(table.c.uuid == suite.uuid)
+                                  .values(test_definition=_renamed_tests(test_suite_metadata, name)))
+        assert set(suite.tests) != {name}, "Tests should be cached until the test definition is reloaded"
+        reload()
+        assert set(suite.tests) == {name}, f"Tests not compiled after the test definition is {name}"
+
+
 def test_suite_registration_workflow_not_found_exception(
         app_client, user1, random_workflow_id, test_suite_metadata):
     with pytest.raises(lm_exceptions.EntityNotFoundException):
@@ -352,3 +466,36 @@ def test_workflow_latest_version(app_client, user1, random_valid_uuid):
     logger.debug("Previous versions: %r", w.previous_versions)
     assert w.version == "2", "Unexpected version number"
     assert "1" in w.previous_versions, "Version '1' not found as previous version"
+
+
+def test_workflow_version_status_loading_profile(app_client, user1):
+    workflow = utils.pick_workflow(user1, "sort-and-change-case")
+    utils.register_workflow(user1, workflow)
+    models.db.session.expunge_all()
+
+    u = models.User.find_by_username(user1['user'].username)
+    w = LifeMonitor.get_instance().get_user_workflow_version(
+        u, workflow['uuid'], workflow['version'], profile=models.LoadingProfile.STATUS)
+    # the whole graph must be loaded by the query of the workflow version
+    assert 'submitter' not in inspect(w).unloaded, "Submitter not loaded"
+    assert 'versions' not in inspect(w.workflow).unloaded, "Workflow versions not loaded"
+    assert 'test_suites' not in inspect(w).unloaded, "Test suites not loaded"
+    for suite in w.test_suites:
+        assert 'test_instances' not in inspect(suite).unloaded, "Test instances not loaded"
+        for instance in suite.test_instances:
+            assert 'testing_service' not in inspect(instance).unloaded, "Testing service not loaded"
+        assert 'test_definition' in inspect(suite).unloaded, "Test definition must be deferred"
+    assert '_metadata' in inspect(w).unloaded, "RO-Crate metadata must be deferred"
+
+
+def test_workflow_version_suites_loading_profile(app_client, user1):
+    workflow = utils.pick_workflow(user1, "sort-and-change-case")
+    utils.register_workflow(user1, workflow)
+    models.db.session.expunge_all()
+
+    u = models.User.find_by_username(user1['user'].username)
+    w = LifeMonitor.get_instance().get_user_workflow_version(
+        u, workflow['uuid'], workflow['version'], profile=models.LoadingProfile.SUITES)
+    assert len(w.test_suites) > 0, "Unexpected number of test suites"
+    for suite in w.test_suites:
+        assert 'test_definition' not in inspect(suite).unloaded, "Test definition not loaded"
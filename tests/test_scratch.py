@@ -0,0 +1,40 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import socket
+
+from lifemonitor.scratch import OPERATION_PREFIX, ScratchSpace
+
+
+def test_scratch_cleanup(tmp_path):
+    scratch_space = ScratchSpace(path=tmp_path)
+    # directory left by a terminated process whose pid is now in use (e.g., after a container restart)
+    orphan = tmp_path / f"{OPERATION_PREFIX}-{socket.gethostname()}-{os.getpid()}-orphan"
+    orphan.mkdir()
+    # directory of another host sharing the scratch space
+    other = tmp_path / f"{OPERATION_PREFIX}-other.host-{os.getpid()}-other"
+    other.mkdir()
+    with scratch_space.operation() as operation:
+        assert scratch_space.cleanup() == [orphan], "Unexpected removed directories"
+        assert operation.path.exists(), "Directory of a running operation removed"
+        assert other.exists(), "Directory of another host removed"
+        assert not orphan.exists(), "Orphaned directory not removed"
+    assert not operation.path.exists(), "Directory of a completed operation not removed"
@@ -0,0 +1,77 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+import uuid
+from datetime import datetime
+
+import flask
+from lifemonitor import serializers
+from lifemonitor.api import serializers as api_serializers
+
+logger = logging.getLogger()
+
+
+def test_json_encoder(app_context):
+    data = {"uuid": uuid.uuid4(), "created": datetime(2021, 1, 1), "name": "w\u00f2rkflow", "items": [1, None]}
+    encoded = flask.json.dumps(data)
+    logger.debug("Encoded document: %s", encoded)
+    assert '": ' not in encoded, "Unexpected separators in the compact encoding"
+    assert json.loads(encoded) == json.loads(json.dumps(data, cls=flask.json.JSONEncoder)), \
+        "Unexpected encoding"
+    assert "\n" in flask.json.dumps(data, indent=2), "Unexpected pretty-printed encoding"
+
+
+def test_shared_schema_instances():
+    schema = api_serializers.VersionDetailsSchema.get_instance()
+    assert schema is api_serializers.VersionDetailsSchema.get_instance(), "Schema instance not shared"
+    partial = api_serializers.VersionDetailsSchema.get_instance(only=("uuid", "version"))
+    assert partial is not schema, "Schema instances with different options should differ"
+    assert set(partial.fields) == {"uuid", "version"}, "Unexpected schema fields"
+    assert isinstance(schema, serializers.BaseSchema)
+
+
+def test_shared_schema_instances_with_list_options():
+    partial = api_serializers.VersionDetailsSchema.get_instance(only=["uuid", "version"])
+    assert partial is api_serializers.VersionDetailsSchema.get_instance(only=["uuid", "version"]), \
+        "Schema instance not shared"
+    assert set(partial.fields) == {"uuid", "version"}, "Unexpected schema fields"
+    excluded = api_serializers.VersionDetailsSchema.get_instance(exclude={"uuid"})
+    assert excluded is api_serializers.VersionDetailsSchema.get_instance(exclude={"uuid"}), \
+        "Schema instance not shared"
+    assert "uuid" not in excluded.fields, "Excluded field serialized"
+    context = {"key": "value"}
+    schema = api_serializers.VersionDetailsSchema.get_instance(context=context)
+    assert schema.context == context, "Unexpected schema context"
+
+
+def test_serialization_context(app_context, mocker):
+    get_url = mocker.patch("lifemonitor.utils.get_external_server_url", return_value="https://lm.org/")
+    with app_context.app.test_request_context("/workflows?limit=10"):
+        context = api_serializers.SerializationContext.get()
+        assert context is api_serializers.SerializationContext.get(), "Context not shared within the request"
+        assert context.base_url == "https://lm.org/", "Unexpected base URL"
+        assert context.ro_crates_url == "https://lm.org/ro_crates/", "Unexpected RO-Crate URL"
+        assert context.path == "/workflows", "Unexpected request path"
+        assert context.full_path == "/workflows?limit=10", "Unexpected request full path"
+    with app_context.app.test_request_context("/registries"):
+        assert api_serializers.SerializationContext.get().path == "/registries", "Context shared across requests"
+    assert get_url.call_count == 2, "Base URL not computed once per request"
@@ -0,0 +1,117 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+from lifemonitor import exceptions as lm_exceptions
+from lifemonitor import utils
+from lifemonitor.api.models.rocrate import ROCrate
+
+logger = logging.getLogger()
+
+AUTHORIZATIONS = ["Bearer first", "Bearer second", "Bearer third", None]
+
+
+@pytest.fixture
+def probe(mocker):
+    status_codes = {}
+    probe_url = mocker.patch.object(utils, "probe_url",
+                                    side_effect=lambda url, authorization: status_codes[authorization])
+    probe_url.status_codes = status_codes
+    return probe_url
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = MagicMock()
+    clock.monotonic.return_value = 1000.0
+    mocker.patch.object(utils, "time", clock)
+    return clock
+
+
+def test_probe_authorizations_order(probe):
+    probe.status_codes.update({"Bearer first": 403, "Bearer second": 200, "Bearer third": 200, None: 401})
+    assert utils.probe_authorizations("https://probe-order.org/crate.zip", AUTHORIZATIONS) == ["Bearer second"], \
+        "The first valid authorization (wrt the given order) should be returned"
+    assert probe.call_count == len(AUTHORIZATIONS), "All the authorizations should be probed"
+
+
+def test_probe_authorizations_fallback(probe):
+    url = "https://probe-fallback.org/crate.zip"
+    probe.status_codes.update({"Bearer first": 403, "Bearer second": 401, "Bearer third": 403, None: 401})
+    assert utils.probe_authorizations(url, AUTHORIZATIONS) == [], "No authorization should be valid"
+    # not conclusive probes (e.g., unreachable hosts, errors)
+    probe.status_codes.update({"Bearer second": None, None: 500})
+    assert utils.probe_authorizations(url, AUTHORIZATIONS) == AUTHORIZATIONS, \
+        "All the authorizations should be tried when probing is not conclusive"
+    assert utils.probe_authorizations("/local/crate.zip", AUTHORIZATIONS) == AUTHORIZATIONS[:1], \
+        "Local paths should not be probed"
+
+
+def test_known_authorization(probe, clock):
+    url = "https://probe-known.org/crate.zip"
+    utils.remember_authorization(url, "Bearer third")
+    assert utils.probe_authorizations(url, AUTHORIZATIONS) == \
+        ["Bearer third", "Bearer first", "Bearer second", None], "The known authorization should be tried first"
+    assert probe.call_count == 0, "Authorizations should not be probed"
+    assert "third" not in repr(utils.valid_authorizations._entries), "Credentials should not be stored"
+    # known authorizations are not used after their expiration
+    clock.monotonic.return_value += utils.ValidAuthorizations.TTL + 1
+    probe.status_codes.update({"Bearer first": 200, "Bearer second": 200, "Bearer third": 200, None: 200})
+    assert utils.probe_authorizations(url, AUTHORIZATIONS) == ["Bearer first"], "Unexpected authorizations"
+    assert probe.call_count == len(AUTHORIZATIONS), "Authorizations should be probed"
+
+
+def test_known_authorizations_bound(probe, mocker):
+    mocker.patch.object(utils.ValidAuthorizations, "MAX_SIZE", 2)
+    urls = [f"https://probe-bound-{i}.org/crate.zip" for i in range(3)]
+    for url in urls:
+        utils.remember_authorization(url, None)
+    assert utils.valid_authorizations.find(urls[0], AUTHORIZATIONS) == -1, "The oldest host should be forgotten"
+    assert utils.valid_authorizations.find(urls[2], AUTHORIZATIONS) == len(AUTHORIZATIONS) - 1, \
+        "Anonymous access should be remembered"
+    utils.forget_authorization(urls[2])
+    assert utils.valid_authorizations.find(urls[2], AUTHORIZATIONS) == -1, "Authorization not forgotten"
+
+
+def test_download_metadata_fallback(probe, mocker):
+    url = "https://probe-download.org/crate.zip"
+    probe.status_codes.update({"Bearer first": 200, "Bearer second": None, "Bearer third": 500, None: 500})
+    # the download is not authorized (e.g., the credential is revoked) although probing was
+    load = mocker.patch.object(ROCrate, "load_metadata_files", side_effect=lm_exceptions.NotAuthorizedException())
+    with pytest.raises(lm_exceptions.NotAuthorizedException):
+        ROCrate.download_metadata(url, AUTHORIZATIONS)
+    assert [c[1]['authorization_header'] for c in load.call_args_list] == ["Bearer first"], \
+        "Only the authorization granting access should be tried"
+    # the download is tried with all the authorizations if probing is not conclusive
+    probe.status_codes["Bearer first"] = 500
+
+    def load_metadata_files(url, authorization_header=None):
+        if authorization_header != "Bearer third":
+            raise lm_exceptions.NotAuthorizedException()
+        return "metadata"
+    load.side_effect = load_metadata_files
+    load.reset_mock()
+    assert ROCrate.download_metadata(url, AUTHORIZATIONS) == "metadata", "Unexpected metadata"
+    assert [c[1]['authorization_header'] for c in load.call_args_list] == AUTHORIZATIONS[:3], \
+        "Authorizations should be tried in order"
+    assert utils.valid_authorizations.find(url, AUTHORIZATIONS) == 2, "The valid authorization should be remembered"
@@ -28,6 +28,7 @@ import lifemonitor.api.models as models
 import lifemonitor.auth as auth
 import lifemonitor.exceptions as lm_exceptions
 import lifemonitor.lang.messages as messages
+import lifemonitor.utils as lm_utils
 import pytest
 from flask import Response
 from tests.utils import assert_status_code
@@ -335,3 +336,26 @@ def test_get_instance_build_by_registry(m, request_context, mock_registry):
     response = controllers.instances_builds_get_by_id(instance['uuid'], build.id)
     m.get_test_instance.assert_called_once()
     assert isinstance(response, dict), "Unexpected response type"
+
+
+@patch("lifemonitor.api.controllers.lm")
+def test_get_instance_builds_cursor(m, request_context, mock_registry):
+    assert auth.current_registry, "Unexpected registry in session"
+    workflow = {'uuid': '11111'}
+    instance = MagicMock()
+    instance.uuid = '12345'
+    instance.get_test_builds.return_value = []
+    instance.test_suite.workflow = workflow
+    m.get_test_instance.return_value = instance
+    mock_registry.registered_workflow_versions = [workflow]
+    # build ids are reported as strings by some testing services
+    for key in (5, "5"):
+        response = controllers.instances_get_builds(instance.uuid, 10, cursor=lm_utils.encode_cursor(key))
+        assert not isinstance(response, Response), "Unexpected response type"
+        instance.get_test_builds.assert_called_with(limit=10, after=5)
+    instance.get_test_builds.reset_mock()
+    for key in ("not a build", 1.5, True):
+        response = controllers.instances_get_builds(instance.uuid, 10, cursor=lm_utils.encode_cursor(key))
+        assert isinstance(response, Response), "Unexpected response type"
+        assert_status_code(400, response.status_code)
+    instance.get_test_builds.assert_not_called()
@@ -245,6 +245,17 @@ def test_post_workflow_by_registry_not_authorized(m, request_context, mock_regis
         .format(mock_registry.name) in response.data.decode()
 
 
+@patch("lifemonitor.api.controllers.lm")
+def test_post_workflow_batch_too_many_items(m, request_context, mock_registry):
+    item = {"uuid": "1212121212121212", "version": "1.0", "submitter_id": "1"}
+    with patch.dict(request_context.app.config, {"WORKFLOW_BATCH_MAX_ITEMS": 2}):
+        response = controllers.workflows_post_batch(body={"items": [dict(item) for _ in range(3)]})
+    logger.debug("Response: %r", response)
+    assert_status_code(413, response.status_code)
+    assert messages.too_many_batch_items.format(2) in response.data.decode(), "Unexpected error detail"
+    m.register_workflows.assert_not_called()
+
+
 @patch("lifemonitor.api.controllers.lm")
 def test_get_workflow_by_id_error_not_found(m, request_context, mock_registry):
     assert auth.current_user.is_anonymous, "Unexpected user in session"
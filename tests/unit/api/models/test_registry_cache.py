@@ -0,0 +1,115 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from flask import Flask
+from lifemonitor.api.models.registries import registry as registry_module
+from lifemonitor.api.models.registries.registry import UserWorkflowsCache
+from lifemonitor.api.models.registries.seek import SeekWorkflowRegistryClient
+
+logger = logging.getLogger(__name__)
+
+TTL = 100
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = MagicMock()
+    clock.monotonic.return_value = 1000.0
+    mocker.patch.object(registry_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache():
+    app = Flask(__name__)
+    app.config["REGISTRY_USER_WORKFLOWS_CACHE_TTL"] = TTL
+    with app.app_context():
+        yield UserWorkflowsCache()
+
+
+def _entity(id):
+    entity = MagicMock()
+    entity.id = id
+    return entity
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_user_workflows_cache_expiration(cache, clock):
+    registry, user = _entity(1), _entity(2)
+    loader_factory = MagicMock(return_value=lambda: {"1", "2"})
+    assert cache.get(registry, user, loader_factory) == {"1", "2"}, "Unexpected workflows"
+    clock.monotonic.return_value += TTL / 2
+    assert cache.lookup(registry, user, loader_factory) == {"1", "2"}, "Entry should be cached"
+    assert loader_factory.call_count == 1, "Workflows should be loaded once"
+    clock.monotonic.return_value += TTL
+    assert cache.lookup(registry, user, loader_factory) is None, "Entry should be expired"
+
+
+def test_user_workflows_cache_background_refresh(cache, clock):
+    registry, user = _entity(1), _entity(2)
+    cache.get(registry, user, lambda: lambda: {"1"})
+    clock.monotonic.return_value += TTL * UserWorkflowsCache.REFRESH_RATIO
+    loader_factory = MagicMock(return_value=lambda: {"1", "2"})
+    assert cache.lookup(registry, user, loader_factory) == {"1"}, "Cached entry should be returned while refreshing"
+    assert loader_factory.call_count == 1, "The loader should be prepared in the caller thread"
+    assert _wait_for(lambda: cache.lookup(registry, user, loader_factory) == {"1", "2"}), \
+        "Entry not refreshed in background"
+
+
+def test_user_workflows_cache_invalidate(cache, clock):
+    registry, other_registry = _entity(1), _entity(2)
+    user, other_user = _entity(3), _entity(4)
+    for r in (registry, other_registry):
+        for u in (user, other_user):
+            cache.get(r, u, lambda: lambda: {"1"})
+    cache.invalidate(registry, user)
+    assert cache.lookup(registry, user, MagicMock()) is None, "Entry should be invalidated"
+    assert cache.lookup(registry, other_user, MagicMock()) is not None, "Entry of other users should be kept"
+    cache.invalidate(registry)
+    assert cache.lookup(registry, other_user, MagicMock()) is None, "Entries of the registry should be invalidated"
+    assert cache.lookup(other_registry, user, MagicMock()) is not None, "Entries of other registries should be kept"
+    cache.clear()
+    assert cache.lookup(other_registry, user, MagicMock()) is None, "Cache should be empty"
+
+
+def test_seek_workflows_listing_detached_from_registry():
+    client = SeekWorkflowRegistryClient.__new__(SeekWorkflowRegistryClient)
+    client._registry = MagicMock()
+    client._registry.uri = "https://seek.org"
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"data": [{"id": 1}], "links": {}}
+    client._session = MagicMock()
+    client._session.get.return_value = response
+    workflows = client._iter_workflows({})
+    # the registry instance is no longer usable (e.g., on a background thread)
+    client._registry = None
+    assert [w["id"] for w in workflows] == [1], "Unexpected workflows"
+    assert client._session.get.call_args[0][0] == "https://seek.org/workflows?format=json", "Unexpected URL"
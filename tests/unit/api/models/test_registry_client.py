@@ -0,0 +1,95 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import MagicMock
+
+import lifemonitor.exceptions as lm_exceptions
+import pytest
+from lifemonitor.api.models.registries.registry import (
+    WorkflowRegistryClient, get_registry_session)
+from lifemonitor.auth.oauth2.client.models import OAuthIdentity
+
+logger = logging.getLogger(__name__)
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.received_cookies.append(self.headers.get('Cookie'))
+        self.send_response(200)
+        self.send_header('Set-Cookie', f'session={self.path.strip("/")}; Path=/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+@pytest.fixture
+def http_server():
+    server = HTTPServer(('127.0.0.1', 0), CookieHandler)
+    server.received_cookies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_registry_session_rejects_cookies(http_server):
+    registry = MagicMock()
+    registry.uri = f"http://127.0.0.1:{http_server.server_port}"
+    session = get_registry_session(registry)
+    assert session is get_registry_session(registry), "The registry session should be shared"
+    session.get(f"{registry.uri}/user1")
+    session.get(f"{registry.uri}/user2")
+    assert len(session.cookies) == 0, "The shared session should not store cookies"
+    assert http_server.received_cookies == [None, None], "Cookies sent with the requests of other users"
+
+
+@pytest.fixture
+def oauth_client():
+    client = MagicMock()
+    client._get_user_authorization.return_value = MagicMock(spec=OAuthIdentity)
+    client._refresh_access_token.return_value = {"access_token": "new-token"}
+    return client
+
+
+def test_registry_request_refresh_on_unauthorized(oauth_client):
+    response = MagicMock()
+    oauth_client._request.side_effect = [lm_exceptions.NotAuthorizedException(status=401), response]
+    assert WorkflowRegistryClient._get(oauth_client, MagicMock(), "https://registry.org/workflows") is response
+    oauth_client._refresh_access_token.assert_called_once()
+    assert oauth_client._request.call_args[0][0] == {'Authorization': 'Bearer new-token'}, \
+        "The request should be retried with the refreshed token"
+
+
+def test_registry_request_no_refresh_on_forbidden(oauth_client):
+    oauth_client._request.side_effect = lm_exceptions.NotAuthorizedException(status=403)
+    with pytest.raises(lm_exceptions.NotAuthorizedException) as e:
+        WorkflowRegistryClient._get(oauth_client, MagicMock(), "https://registry.org/workflows")
+    assert e.value.status == 403, "Unexpected status"
+    oauth_client._refresh_access_token.assert_not_called()
+    assert oauth_client._request.call_count == 1, "Forbidden requests should not be retried"
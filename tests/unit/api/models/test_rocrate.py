@@ -0,0 +1,78 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import logging
+import zipfile
+from unittest.mock import patch
+
+import lifemonitor.api.models as models
+import lifemonitor.exceptions as lm_exceptions
+import pytest
+from lifemonitor.scratch import ScratchSpace
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def crate_dir(tmp_path):
+    path = tmp_path / "crate"
+    path.mkdir()
+    with open(path / "ro-crate-metadata.json", "w") as f:
+        json.dump({
+            "@context": "https://w3id.org/ro/crate/1.1/context",
+            "@graph": [
+                {"@id": "ro-crate-metadata.json", "@type": "CreativeWork",
+                 "about": {"@id": "./"}, "conformsTo": {"@id": "https://w3id.org/ro/crate/1.1"}},
+                {"@id": "./", "@type": "Dataset", "name": "Local crate", "hasPart": []}
+            ]
+        }, f)
+    return path
+
+
+@pytest.fixture
+def crate_archive(tmp_path, crate_dir):
+    path = tmp_path / "crate.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.write(crate_dir / "ro-crate-metadata.json", "ro-crate-metadata.json")
+    return path
+
+
+def test_load_local_crate_archive(crate_archive):
+    for roc_link in (crate_archive.as_posix(), crate_archive.as_uri()):
+        crate, metadata, _ = models.ROCrate.load_metadata_files(roc_link)
+        assert crate.name == "Local crate"
+        assert len(metadata["@graph"]) == 2
+
+
+def test_load_unpacked_local_crate(crate_dir):
+    crate, _, _ = models.ROCrate.load_metadata_files(crate_dir.as_uri())
+    assert crate.name == "Local crate"
+    # the crate has been used in place and must not be removed
+    assert (crate_dir / "ro-crate-metadata.json").exists()
+
+
+def test_scratch_operation_quota(tmp_path, crate_archive):
+    scratch_space = ScratchSpace(path=tmp_path / "scratch", operation_quota=10)
+    with patch("lifemonitor.api.models.rocrate.scratch_space", scratch_space):
+        with pytest.raises(lm_exceptions.ScratchQuotaExceededException):
+            models.ROCrate.download_metadata(crate_archive.as_posix())
+    # scratch directories are removed on failure
+    assert scratch_space.get_usage()["operations"] == 0
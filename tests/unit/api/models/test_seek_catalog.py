@@ -0,0 +1,183 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import re
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+from lifemonitor.api.models.registries.seek import SeekWorkflowRegistryClient
+from lifemonitor.auth.models import User
+from lifemonitor.commands import registry as registry_commands
+from lifemonitor.db import db
+from lifemonitor.exceptions import NotAuthorizedException
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSeek:
+    """ Catalog of a Seek instance and visibility of its workflows to users """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.workflows = {}
+        self.visibility = {}
+        self.requests = []
+        self.unavailable = set()
+
+    def add_workflow(self, _id, version=1):
+        self.workflows[str(_id)] = {'uuid': str(uuid.uuid4()), 'version': version}
+        return self.workflows[str(_id)]
+
+    def ro_link(self, _id):
+        return f"{self.base_url}/workflows/{_id}/content_blobs/{_id}/download"
+
+    def request(self, headers, url, **kwargs):
+        username = headers['Authorization'].replace('Bearer ', '')
+        self.requests.append((username, url))
+        if username in self.unavailable:
+            raise RuntimeError(f"ERROR: unable to get workflows of {username}")
+        response = MagicMock(status_code=200)
+        match = re.match(f"{self.base_url}/workflows/(\\w+)\\?format=json", url)
+        if match:
+            if match.group(1) not in self.visibility[username]:
+                raise NotAuthorizedException(status=403)
+            w = self.workflows[match.group(1)]
+            response.json.return_value = {'data': {
+                'id': match.group(1), 'meta': {'uuid': w['uuid']},
+                'attributes': {'latest_version': w['version'], 'content_blobs': [
+                    {'link': self.ro_link(match.group(1))[:-len('/download')]}]}}}
+        else:
+            response.json.return_value = {'data': [{'id': _id} for _id in sorted(self.visibility[username])],
+                                          'links': {}}
+        return response
+
+    def details_requests(self):
+        return sorted(url.split('/')[-1].split('?')[0] for _, url in self.requests if '/workflows/' in url)
+
+
+@pytest.fixture
+def users(app_context):
+    users = [User(f"seek_user_{i}") for i in range(2)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+@pytest.fixture
+def seek(fake_registry, users, mocker):
+    seek = FakeSeek(fake_registry.uri)
+    for _id in range(1, 4):
+        seek.add_workflow(_id)
+    seek.visibility[users[0].username] = {"1", "2"}
+    seek.visibility[users[1].username] = {"2", "3"}
+    client = SeekWorkflowRegistryClient.__new__(SeekWorkflowRegistryClient)
+    client._registry = fake_registry
+    mocker.patch.object(client, "_request", side_effect=seek.request)
+    mocker.patch.object(client, "_get_http_headers",
+                        side_effect=lambda user: {'Authorization': f'Bearer {user.username}'})
+    mocker.patch.object(fake_registry, "get_users", return_value=users)
+    fake_registry._client = client
+    return seek
+
+
+def test_sync_catalog(fake_registry, users, seek):
+    result = fake_registry.sync_catalog()
+    assert result == {"users": 2, "workflows": 3, "updated": 3}, f"Unexpected result: {result}"
+    assert seek.details_requests() == ["1", "2", "3"], "The details of every workflow should be fetched once"
+    for _id, w in seek.workflows.items():
+        entry = fake_registry.get_catalog_entry(_id)
+        assert entry and str(entry['uuid']) == w['uuid'], f"Workflow {_id} not mirrored"
+        assert entry['version'] == str(w['version']), f"Unexpected version of workflow {_id}"
+        assert entry['ro_link'] == seek.ro_link(_id), f"Unexpected RO-Crate link of workflow {_id}"
+    assert fake_registry.get_indexed_workflows() == {"1", "2", "3"}, "Workflows should be indexed"
+    for user in users:
+        assert fake_registry.get_visible_workflows(user, 3600) == seek.visibility[user.username], \
+            f"Unexpected visibility of the workflows to {user}"
+
+
+def test_sync_catalog_incremental(fake_registry, users, seek):
+    fake_registry.sync_catalog()
+    seek.requests.clear()
+    # nothing changed: only the listings are fetched
+    result = fake_registry.sync_catalog()
+    assert result == {"users": 2, "workflows": 3, "updated": 0}, f"Unexpected result: {result}"
+    assert seek.details_requests() == [], "No details should be fetched"
+    # a new workflow and a removed one
+    seek.add_workflow(4)
+    seek.visibility[users[1].username] = {"2", "4"}
+    result = fake_registry.sync_catalog()
+    assert result == {"users": 2, "workflows": 3, "updated": 1}, f"Unexpected result: {result}"
+    assert seek.details_requests() == ["4"], "Only the details of the new workflow should be fetched"
+    assert set(fake_registry.get_catalog()) == {"1", "2", "4"}, "Unlisted workflows should be removed"
+    assert fake_registry.get_visible_workflows(users[1], 3600) == {"2", "4"}, "Visibility not updated"
+    # full sync
+    seek.requests.clear()
+    seek.workflows["1"]['version'] = 2
+    result = fake_registry.sync_catalog(full=True)
+    assert result == {"users": 2, "workflows": 3, "updated": 3}, f"Unexpected result: {result}"
+    assert seek.details_requests() == ["1", "2", "4"], "The details of all the workflows should be fetched"
+    assert fake_registry.get_catalog_entry("1")['version'] == "2", "Workflow details not updated"
+
+
+def test_sync_catalog_unavailable_user(fake_registry, users, seek):
+    fake_registry.sync_catalog()
+    seek.unavailable.add(users[1].username)
+    seek.visibility[users[0].username] = {"1"}
+    result = fake_registry.sync_catalog()
+    assert result == {"users": 1, "workflows": 1, "updated": 0}, f"Unexpected result: {result}"
+    # the listing is not complete: workflows are not removed
+    assert set(fake_registry.get_catalog()) == {"1", "2", "3"}, "Workflows should not be removed"
+    assert fake_registry.get_visible_workflows(users[0], 3600) == {"1"}, "Visibility not updated"
+    assert fake_registry.get_visible_workflows(users[1], 3600) == {"2", "3"}, \
+        "The visibility of the user should not be changed"
+
+
+def test_lookups_from_mirror(fake_registry, users, seek):
+    fake_registry.sync_catalog()
+    seek.requests.clear()
+    user = users[0]
+    client = fake_registry.client
+    w = seek.workflows["1"]
+    assert client.get_external_uuid("1", None, user) == w['uuid'], "Unexpected UUID"
+    assert client.get_external_id(w['uuid'], None, user) == "1", "Unexpected identifier"
+    assert client.build_ro_link(user, "1") == seek.ro_link("1"), "Unexpected RO-Crate link"
+    workflows = [MagicMock(spec=['external_id'], external_id=_id) for _id in ("1", "3")]
+    assert client.filter_by_user(workflows, user) == workflows[:1], "Only workflow 1 should be visible to the user"
+    assert seek.requests == [], "Lookups should be served by the mirror"
+    # workflows not visible to the user are looked up on the registry
+    with pytest.raises(NotAuthorizedException):
+        client.get_external_uuid("3", None, user)
+    assert seek.requests == [(user.username, f"{seek.base_url}/workflows/3?format=json")], \
+        "Workflows not visible to the user should be requested to the registry"
+    # an outdated visibility is not used
+    seek.requests.clear()
+    fake_registry.invalidate_user_workflows(user)
+    assert client.get_external_uuid("1", None, user) == w['uuid'], "Unexpected UUID"
+    assert len(seek.requests) == 1, "Lookups with an outdated mirror should be served by the registry"
+
+
+def test_registry_sync_command(cli_runner, fake_registry, users, seek):
+    result = cli_runner.invoke(registry_commands.sync_registries, [fake_registry.name])
+    logger.info(result.output)
+    assert f"{fake_registry.uuid} (name='{fake_registry.name}'): 3 workflows, 3 updated, 2 users" \
+        in result.output, "Unexpected output"
+    assert fake_registry.get_visible_workflows(users[0], 3600) == {"1", "2"}, "Catalog not synced"
@@ -0,0 +1,145 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import uuid
+from unittest.mock import MagicMock
+
+import pytest
+from lifemonitor.api.models.registries.seek import (SeekWorkflowIndexEntry,
+                                                    SeekWorkflowRegistryClient)
+from lifemonitor.auth.models import User
+from lifemonitor.db import db
+from lifemonitor.exceptions import EntityNotFoundException
+
+logger = logging.getLogger(__name__)
+
+# identifiers of the workflows listed on each page
+PAGES = [["1", "2"], ["3"], ["4"]]
+
+
+class PaginatedSeek:
+    """ Seek instance listing its workflows on multiple pages """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.uuids = {_id: str(uuid.uuid4()) for page in PAGES for _id in page}
+        self.requests = []
+
+    def page_url(self, page):
+        # the first page is requested by the client, the other ones follow the 'next' links
+        return f"{self.base_url}/workflows?format=json" if page == 0 \
+            else f"{self.base_url}/workflows?page={page + 1}"
+
+    def request(self, headers, url, **kwargs):
+        self.requests.append(url)
+        response = MagicMock(status_code=200)
+        for page, identifiers in enumerate(PAGES):
+            if url == self.page_url(page):
+                # relative and absolute links
+                links = {}
+                if page + 1 < len(PAGES):
+                    links['next'] = f"/workflows?page={page + 2}" if page == 0 \
+                        else self.page_url(page + 1)
+                response.json.return_value = {'data': [{'id': _id} for _id in identifiers], 'links': links}
+                return response
+        _id = url.split('/')[-1].split('?')[0]
+        response.json.return_value = {'data': {'id': _id, 'meta': {'uuid': self.uuids[_id]}}}
+        return response
+
+    def pages_requested(self):
+        return [url for url in self.requests if '/workflows?' in url]
+
+    def details_requested(self):
+        return [url.split('/')[-1].split('?')[0] for url in self.requests if '/workflows/' in url]
+
+
+@pytest.fixture
+def user(app_context):
+    user = User("seek_index_user")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def seek(fake_registry, mocker):
+    seek = PaginatedSeek(fake_registry.uri)
+    client = SeekWorkflowRegistryClient.__new__(SeekWorkflowRegistryClient)
+    client._registry = fake_registry
+    # details are fetched one at a time
+    client.max_workers = 1
+    mocker.patch.object(client, "_request", side_effect=seek.request)
+    mocker.patch.object(client, "_get_http_headers", return_value={'Authorization': 'Bearer token'})
+    fake_registry._client = client
+    return seek
+
+
+def _index_rows(registry):
+    return {e.external_id: str(e.uuid) for e in SeekWorkflowIndexEntry.query.filter_by(registry_id=registry.id)}
+
+
+def test_iter_workflows_follows_next_links(fake_registry, seek):
+    workflows = fake_registry.client._iter_workflows({})
+    assert [w['id'] for w in workflows] == ["1", "2", "3", "4"], "Unexpected workflows"
+    assert seek.pages_requested() == [seek.page_url(page) for page in range(len(PAGES))], \
+        "Unexpected pages requested"
+
+
+def test_iter_workflows_fetches_pages_on_demand(fake_registry, seek):
+    workflows = fake_registry.client._iter_workflows({})
+    assert [next(workflows)['id'], next(workflows)['id']] == ["1", "2"], "Unexpected workflows"
+    assert seek.pages_requested() == [seek.page_url(0)], "Only the first page should be requested"
+
+
+def test_index_workflows(fake_registry, seek):
+    fake_registry.index_workflows({"1": seek.uuids["1"], "2": seek.uuids["2"]})
+    # indexed workflows are skipped
+    fake_registry.index_workflows({"2": seek.uuids["2"], "3": seek.uuids["3"]})
+    assert _index_rows(fake_registry) == {_id: seek.uuids[_id] for _id in ("1", "2", "3")}, \
+        "Unexpected index rows"
+    assert fake_registry.find_indexed_workflow(seek.uuids["3"]) == "3", "Unexpected identifier"
+    assert fake_registry.find_indexed_workflow(str(uuid.uuid4())) is None, "Workflow should not be indexed"
+
+
+def test_get_external_id_indexed_workflow(fake_registry, user, seek):
+    fake_registry.index_workflows({"2": seek.uuids["2"]})
+    assert fake_registry.get_external_id(seek.uuids["2"], None, user) == "2", "Unexpected identifier"
+    # the listing stops as soon as the indexed workflow is found
+    assert seek.pages_requested() == [seek.page_url(0)], "Only the first page should be requested"
+    assert seek.details_requested() == [], "No details should be requested"
+
+
+def test_get_external_id_stops_at_match(fake_registry, user, seek):
+    fake_registry.index_workflows({"1": seek.uuids["1"]})
+    assert fake_registry.get_external_id(seek.uuids["3"], None, user) == "3", "Unexpected identifier"
+    assert seek.pages_requested() == [seek.page_url(page) for page in range(len(PAGES))], \
+        "All the pages should be requested"
+    assert seek.details_requested()[:2] == ["2", "3"], "Only the details of not indexed workflows should be requested"
+    # the workflows fetched up to the match are indexed
+    assert _index_rows(fake_registry) == {_id: seek.uuids[_id] for _id in ("1", "2", "3")}, \
+        "Unexpected index rows"
+
+
+def test_get_external_id_not_found(fake_registry, user, seek):
+    with pytest.raises(EntityNotFoundException):
+        fake_registry.get_external_id(str(uuid.uuid4()), None, user)
+    assert seek.details_requested() == ["1", "2", "3", "4"], "The details of all the workflows should be requested"
+    assert _index_rows(fake_registry) == seek.uuids, "All the fetched workflows should be indexed"
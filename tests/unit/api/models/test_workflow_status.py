@@ -25,6 +25,7 @@ from unittest.mock import MagicMock
 import lifemonitor.api.models as models
 import lifemonitor.exceptions as lm_exceptions
 import pytest
+from flask import Flask
 
 logger = logging.getLogger(__name__)
 
@@ -230,3 +231,50 @@ def test_status_some_build_passing_check_issues(workflow, suite, error_descripti
     assert len(status.latest_builds) == 6, "The number of builds should be 5"
     assert len(status.availability_issues) == 1, "One issue should be reported"
     assert error_description in status.availability_issues[0]['issue'], "Invalid issue"
+
+
+def _build_checks(suite):
+    return sum(i.last_test_build.is_successful.call_count for i in suite.test_instances)
+
+
+@pytest.mark.parametrize("suite", [(3, 2, 1)], indirect=True)
+def test_health_is_lazy(workflow, suite, error_description):
+    workflow.test_suites.append(suite)
+    data = workflow.to_dict()
+    assert "isHealthy" not in data, "Health should be serialized only on request"
+    health = workflow.get_health()
+    assert _build_checks(suite) == 0, "Testing services should be queried on first access"
+    assert health.healthy == models.WorkflowHealth.UNKNOWN, "Unexpected health"
+    assert health.issues == [error_description], "Unexpected health issues"
+    assert _build_checks(suite) == 6, "Testing services should be queried once"
+    data = workflow.to_dict(health=True)
+    assert data["isHealthy"] == models.WorkflowHealth.UNKNOWN, "Unexpected serialized health"
+
+
+@pytest.mark.parametrize("suite", [(3, 2, 0)], indirect=True)
+def test_health_shares_builds_with_status(workflow, suite):
+    workflow.test_suites.append(suite)
+    with Flask(__name__).test_request_context("/workflows"):
+        assert workflow.get_health().healthy is False, "Unexpected health"
+        assert workflow.status.aggregated_status == models.AggregateTestStatus.SOME_PASSING, \
+            "Unexpected status"
+        assert _build_checks(suite) == 5, "Latest builds should be fetched once per request"
+    with Flask(__name__).test_request_context("/workflows"):
+        assert workflow.get_health().healthy is False, "Unexpected health"
+        assert _build_checks(suite) == 10, "Latest builds should not be shared across requests"
+
+
+@pytest.mark.parametrize("suite", [(2, 0, 0)], indirect=True)
+def test_health_cached_only(workflow, suite):
+    workflow.test_suites.append(suite)
+    health = workflow.get_health(cached_only=True)
+    assert health.healthy == models.WorkflowHealth.UNKNOWN, "Health without cached builds should be unknown"
+    assert len(health.issues) == 2, "Unexpected number of health issues"
+    assert workflow.get_health().healthy is True, "Unexpected health"
+    checks = _build_checks(suite)
+    health = workflow.get_health(cached_only=True)
+    assert health.healthy is True, "Unexpected cached health"
+    assert _build_checks(suite) == checks, "Testing services should not be queried"
+    models.latest_builds_cache.invalidate()
+    assert workflow.get_health(cached_only=True).healthy == models.WorkflowHealth.UNKNOWN, \
+        "Unexpected health after the invalidation of the cache"
@@ -0,0 +1,69 @@
+# Copyright (c) 2020-2021 CRS4
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import logging
+import threading
+from unittest.mock import MagicMock
+
+import lifemonitor.api.models as models
+from lifemonitor.api.services import LifeMonitor
+
+logger = logging.getLogger(__name__)
+
+
+def _workflow(id):
+    return MagicMock(id=id, uuid=f"uuid-{id}")
+
+
+def _registry(name, task):
+    registry = MagicMock()
+    registry.name = name
+    registry.get_workflows.return_value = []
+    registry.prepare_user_workflows.return_value = task
+    return registry
+
+
+def test_get_user_workflows_from_registries(app_context, mocker):
+    owned, listed = _workflow(1), _workflow(2)
+    # both the registries must be queried at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    threads = set()
+
+    def list_workflows():
+        threads.add(threading.get_ident())
+        barrier.wait()
+        return [listed, owned]
+
+    def fail():
+        threads.add(threading.get_ident())
+        barrier.wait()
+        raise RuntimeError("Registry not available")
+
+    registries = [_registry("available", list_workflows), _registry("failing", fail)]
+    mocker.patch.object(models.Workflow, "get_user_workflows", return_value=[owned])
+    mocker.patch.object(models.WorkflowRegistry, "all", return_value=registries)
+    user = MagicMock(id=1, username="user")
+    page = LifeMonitor.get_instance().get_user_workflows(user)
+    assert list(page) == [owned, listed], "The workflows of the available registry should be listed"
+    assert len(threads) == 2 and threading.get_ident() not in threads, \
+        "Registries should be queried concurrently on worker threads"
+    for registry in registries:
+        registry.get_user.assert_called_once_with(user.id)
+        registry.prepare_user_workflows.assert_called_once_with(user, [])